@@ -1,64 +1,279 @@
 """"
 
-    Use the psycopg2 module to grab data from the CLDN data from the database
-    tunnel onto the remote machine using paramiko and sshtunnel
+    Mirror the remote cldn_strikes table into a local Parquet archive
+    so training, validation and holdover queries stay off the database.
+
+    Layout (partitioned by UTC day and spatial tile):
+        ARCHIVE/day=YYYY-MM-DD/tile={lat0}_{lon0}.parquet
+        ARCHIVE/day=YYYY-MM-DD/_SUCCESS   <- day fully synced (written even with no strikes)
+
+    Each tile file is sorted by time and written in row groups, so Parquet keeps
+    min/max statistics on rep_date/lat/lon per row group. A query for a
+    bounding box + time window only opens the day folders in the window and
+    the tiles that intersect the box, then lets pyarrow skip row groups
+    from their statistics.
+
+    Sync is incremental: only days without a _SUCCESS marker are pulled, and
+    consecutive missing days are pulled with one query. A day is only pulled
+    once it ended INGEST_LAG_HOURS ago, so strikes still being ingested into
+    cldn_strikes are not left out of a day marked complete.
 
     liam.buchart@nrcan-rncan.gc.ca
     September 3, 2025
 
 """
 #%%
-import psycopg2
-import paramiko
+import os
 import json
+import shutil
+import psycopg2
+import sshtunnel
 
-from sshtunnel import SSHTunnelForwarder
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-# open the .keys json file
-with open('./.keys.json', 'r') as f:
-    keys = json.load(f)
+from pathlib import Path
+from datetime import datetime, timedelta
 
-# dagan info
-hostname = keys["dagan"]["full_name"]
-user = keys["dagan"]["user"]
-pw = keys["dagan"]["pw"]
+#%%
+ARCHIVE_DIR = Path(__file__).parent / "ARCHIVE"
+KEYS_FILE = "./.keys.json"
 
-# database info
-d_hostname = keys["database"]["hostname"]
-d_username = keys["database"]["user"]
-db_name = keys["database"]["name"]
-d_pw = keys["database"]["pw"]
+TILE_DEG = 5  # tile size in degrees
+INGEST_LAG_HOURS = 6  # hours after the end of a UTC day before it is considered complete in the database
+ROW_GROUP_SIZE = 20000
 
-portnum = 22  # just lookedup in my putty session
+SCHEMA = pa.schema([
+    ("rep_date", pa.timestamp("s")),
+    ("lat", pa.float32()),
+    ("lon", pa.float32()),
+    ("peak_current", pa.float32()),
+    ("mult_flash", pa.int16()),
+])
 
 #%%
-# ssh tunnel into s-edm-daagan
-client = paramiko.SSHClient()
-client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-client.connect(hostname, port=portnum, username=user, password=pw)
+def fetch_strikes(dstart, dend, keys_file=KEYS_FILE):
+    """
+    Pull every strike from dstart 00:00:00 to dend 23:59:59 (UTC days, YYYY-MM-DD)
+    from the remote cldn_strikes table with a single query.
+    Output: pandas dataframe
+    """
+    # open the .keys json file
+    with open(keys_file, 'r') as f:
+        keys = json.load(f)
 
-#%%
-def cldn_query(cursor, year, month, day):
-    # all configuratation is based on testing inside the cldn_strikes table
-    cursor.execute("set search_path to bt;")
+    # dagan info
+    hostname = keys["dagan"]["full_name"]
+    user = keys["dagan"]["user"]
+    pw = keys["dagan"]["pw"]
 
-#%%
-conn = psycopg2.connect(
-    host=d_hostname,
-    port=5432,  # defauly postgreSQL port
-    database=db_name,
-    user=d_username,
-    password=d_pw
-)
+    # database info
+    d_hostname = keys["database"]["hostname"]
+    d_username = keys["database"]["user"]
+    db_name = keys["database"]["name"]
+    d_pw = keys["database"]["pw"]
 
-# need a cursor to perform database operations
-cur = conn.cursor()
+    portnum = 22  # just lookedup in my putty session
 
-#%%
-# close the cursor and leave the database
-cur.close()
-conn.close()
+    query = (
+        "SELECT rep_date, lat, lon, peak_current, mult_flash FROM cldn_strikes "
+        f"WHERE rep_date BETWEEN '{dstart} 00:00:00' and '{dend} 23:59:59' "
+        "ORDER BY rep_date;"
+    )
 
-#%%
-# get out of the ssh tunnel
-client.close()
+    with sshtunnel.open_tunnel(
+        (hostname, portnum),
+        ssh_username=user,
+        ssh_password=pw,
+        remote_bind_address=(d_hostname, 5432)
+    ) as tunnel:
+        print("SSH tunnel established")
+        conn = psycopg2.connect(
+            host=d_hostname,
+            port=5432,
+            database=db_name,
+            user=d_username,
+            password=d_pw
+        )
+        cur = conn.cursor()
+        cur.execute("set search_path to bt;")
+        cur.execute(query)
+        rows = cur.fetchall()
+        colnames = [desc[0] for desc in cur.description]
+        cur.close()
+        conn.close()
+
+    print(f"Fetched {len(rows)} strikes from {dstart} to {dend}")
+    return pd.DataFrame(rows, columns=colnames)
+
+
+def tile_key(lat, lon, tile_deg=TILE_DEG):
+    # lower-left corner of the tile holding each point
+    lat0 = (np.floor(np.asarray(lat, dtype=float) / tile_deg) * tile_deg).astype(int)
+    lon0 = (np.floor(np.asarray(lon, dtype=float) / tile_deg) * tile_deg).astype(int)
+    return lat0, lon0
+
+
+def day_dir(day, archive_dir=ARCHIVE_DIR):
+    return Path(archive_dir) / f"day={day}"
+
+
+def day_complete(day, archive_dir=ARCHIVE_DIR):
+    return (day_dir(day, archive_dir) / "_SUCCESS").exists()
+
+
+def to_table(df):
+    # typed arrow table in the archive schema
+    return pa.Table.from_pandas(
+        pd.DataFrame({
+            "rep_date": pd.to_datetime(df["rep_date"]).astype("datetime64[s]"),
+            "lat": df["lat"].astype("float32"),
+            "lon": df["lon"].astype("float32"),
+            "peak_current": df["peak_current"].astype("float32"),
+            "mult_flash": df["mult_flash"].fillna(0).astype("int16"),
+        }),
+        schema=SCHEMA,
+        preserve_index=False,
+    )
+
+
+def write_day(day, df, archive_dir=ARCHIVE_DIR, tile_deg=TILE_DEG):
+    """
+    Write one UTC day of strikes as one Parquet file per tile, then mark it complete.
+    The day is written to a temporary folder and renamed so readers never see half a day.
+    """
+    final_dir = day_dir(day, archive_dir)
+    tmp_dir = final_dir.with_name(final_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    if not df.empty:
+        lat0, lon0 = tile_key(df["lat"], df["lon"], tile_deg)
+        df = df.assign(_lat0=lat0, _lon0=lon0)
+        for (t_lat, t_lon), tile in df.groupby(["_lat0", "_lon0"]):
+            tile = tile.sort_values("rep_date")
+            pq.write_table(
+                to_table(tile),
+                tmp_dir / f"tile={t_lat}_{t_lon}.parquet",
+                row_group_size=ROW_GROUP_SIZE,
+                compression="zstd",
+                write_statistics=True,
+            )
+
+    (tmp_dir / "_SUCCESS").touch()
+    if final_dir.exists():
+        shutil.rmtree(final_dir)
+    os.replace(tmp_dir, final_dir)
+
+
+def missing_days(dstart, dend, archive_dir=ARCHIVE_DIR):
+    days = pd.date_range(dstart, dend, freq="D").strftime("%Y-%m-%d")
+    return [d for d in days if not day_complete(d, archive_dir)]
+
+
+def contiguous_runs(days):
+    # group sorted YYYY-MM-DD strings into (first, last) runs of consecutive days
+    runs = []
+    for d in sorted(days):
+        day = datetime.strptime(d, "%Y-%m-%d")
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+
+    return [(a.strftime("%Y-%m-%d"), b.strftime("%Y-%m-%d")) for a, b in runs]
+
+
+def last_complete_day(lag_hours=INGEST_LAG_HOURS):
+    # latest UTC day that ended at least lag_hours ago
+    return (datetime.utcnow() - timedelta(hours=lag_hours) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def sync(dstart, dend, archive_dir=ARCHIVE_DIR, fetch=fetch_strikes):
+    """
+    Mirror every complete UTC day between dstart and dend (inclusive) that is not
+    already in the archive. Days that ended less than INGEST_LAG_HOURS ago
+    (and today) are never marked complete.
+    Returns the list of days written.
+    """
+    last_day = last_complete_day()
+    todo = [d for d in missing_days(dstart, dend, archive_dir) if d <= last_day]
+
+    written = []
+    for run_start, run_end in contiguous_runs(todo):
+        strikes = fetch(run_start, run_end)
+        strikes["day"] = pd.to_datetime(strikes["rep_date"]).dt.strftime("%Y-%m-%d") if not strikes.empty else []
+        by_day = dict(tuple(strikes.groupby("day")))
+
+        for day in pd.date_range(run_start, run_end, freq="D").strftime("%Y-%m-%d"):
+            write_day(day, by_day.get(day, strikes.iloc[0:0]), archive_dir)
+            written.append(day)
+        print(f"Archived {run_start} to {run_end}")
+
+    return written
+
+
+def sync_recent(days_back=3, archive_dir=ARCHIVE_DIR):
+    """
+    Daily incremental sync: the last few complete UTC days.
+    """
+    end = datetime.strptime(last_complete_day(), "%Y-%m-%d")
+    start = end - timedelta(days=days_back - 1)
+    return sync(start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"), archive_dir)
+
+
+def query_strikes(tstart, tend, bbox=None, columns=None, archive_dir=ARCHIVE_DIR):
+    """
+    Read strikes with tstart <= rep_date <= tend inside bbox from the local archive.
+
+    tstart, tend: anything pandas can parse ("2025-07-01 12:00:00")
+    bbox: (min_lon, min_lat, max_lon, max_lat) or None for everywhere
+    Only day folders inside the window and tiles touching the box are opened;
+    the time/space filters are pushed down to the Parquet row-group statistics.
+    """
+    tstart = pd.Timestamp(tstart)
+    tend = pd.Timestamp(tend)
+
+    filters = [("rep_date", ">=", tstart.to_pydatetime()), ("rep_date", "<=", tend.to_pydatetime())]
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        filters += [("lat", ">=", min_lat), ("lat", "<=", max_lat),
+                    ("lon", ">=", min_lon), ("lon", "<=", max_lon)]
+
+    tables = []
+    for day in pd.date_range(tstart.normalize(), tend.normalize(), freq="D").strftime("%Y-%m-%d"):
+        for path in sorted(day_dir(day, archive_dir).glob("tile=*.parquet")):
+            if bbox is not None:
+                t_lat, t_lon = (int(v) for v in path.stem.split("=")[1].split("_"))
+                if (t_lat > max_lat or t_lat + TILE_DEG < min_lat
+                        or t_lon > max_lon or t_lon + TILE_DEG < min_lon):
+                    continue
+            tables.append(pq.read_table(path, columns=columns, filters=filters, schema=SCHEMA))
+
+    if not tables:
+        return SCHEMA.empty_table().to_pandas() if columns is None else pd.DataFrame(columns=columns)
+
+    return pa.concat_tables(tables).to_pandas()
+
+
+def local_strikes(tstart, tend, bbox=None, columns=None, archive_dir=ARCHIVE_DIR):
+    """
+    Same as query_strikes but returns None unless every UTC day touched by the
+    window is fully synced, so callers know when to fall back to the database.
+    """
+    tstart = pd.Timestamp(tstart)
+    tend = pd.Timestamp(tend)
+    if missing_days(tstart.normalize(), tend.normalize(), archive_dir):
+        return None
+
+    return query_strikes(tstart, tend, bbox=bbox, columns=columns, archive_dir=archive_dir)
+
+
+if __name__ == "__main__":
+    # backfill the fire seasons used for training then keep up with recent days
+    for year in range(2018, datetime.utcnow().year + 1):
+        sync(f"{year}-05-01", f"{year}-09-30")
+    sync_recent()
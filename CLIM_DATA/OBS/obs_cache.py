@@ -0,0 +1,299 @@
+"""
+
+    Local cache of the hourly station observation tables
+    (can_hly2010s, can_hly2020s, usa_hly2010s, usa_hly2020s) shared by the
+    downloads, the validation and the climatology.
+
+    Layout (one file per table and UTC day, every station in the file):
+        ARCHIVE/table={table}/year=YYYY/day=YYYY-MM-DD.parquet
+
+    A day file only exists once the day has been fully pulled (written to a
+    temporary file then renamed), empty days are written too, and days that
+    ended less than INGEST_LAG_HOURS ago (and today, UTC) are never cached,
+    so late hourly rows are not frozen out (read_obs pulls those days from
+    the database on every call). Missing days are pulled with one all-station query per
+    run of consecutive days, so a per-station season pull and an all-station
+    single-day pull hit the database once and are local afterwards.
+
+    daily_accumulation turns hourly rows into 12Z-12Z totals per station
+    with a single groupby.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pathlib import Path
+from datetime import datetime, timedelta
+
+#%%
+ARCHIVE_DIR = Path(__file__).parent / "ARCHIVE"
+KEYS_FILE = "./.keys.json"
+
+MAX_RUN_DAYS = 31  # longest run of days pulled with one query
+INGEST_LAG_HOURS = 6  # hours after the end of a UTC day before its hourly rows are considered complete
+COLUMNS = ["rep_date", "wmo", "precip", "pcp_period", "sog"]
+
+SCHEMA = pa.schema([
+    ("rep_date", pa.timestamp("s")),
+    ("wmo", pa.string()),
+    ("precip", pa.float32()),
+    ("pcp_period", pa.float32()),
+    ("sog", pa.float32()),
+])
+
+#%%
+def obs_table(country, year):
+    """
+    Name of the hourly table holding a year, same split as station_precip_query.py
+    country: "can" or "usa"
+    """
+    if 2009 < int(year) < 2020:
+        return f"{country}_hly2010s"
+    return f"{country}_hly2020s"
+
+
+def fetch_obs(table, dstart, dend, keys_file=KEYS_FILE):
+    """
+    Every hourly row of every station from dstart 00:00:00 to dend 23:59:59
+    (UTC days, YYYY-MM-DD) with a single query.
+    Output: pandas dataframe
+    """
+    import psycopg2
+    import sshtunnel
+
+    with open(keys_file, 'r') as f:
+        keys = json.load(f)
+
+    # dagan info
+    hostname = keys["dagan"]["full_name"]
+    user = keys["dagan"]["user"]
+    pw = keys["dagan"]["pw"]
+
+    # database info
+    d_hostname = keys["database"]["hostname"]
+    d_username = keys["database"]["user"]
+    db_name = keys["database"]["name"]
+    d_pw = keys["database"]["pw"]
+
+    portnum = 22
+
+    query = (
+        f"SELECT {', '.join(COLUMNS)} FROM {table} "
+        f"WHERE rep_date BETWEEN '{dstart} 00:00:00' AND '{dend} 23:59:59' "
+        "ORDER BY rep_date;"
+    )
+
+    with sshtunnel.open_tunnel(
+        (hostname, portnum),
+        ssh_username=user,
+        ssh_password=pw,
+        remote_bind_address=(d_hostname, 5432)
+    ) as tunnel:
+        print("SSH tunnel established")
+        conn = psycopg2.connect(
+            host=d_hostname,
+            port=5432,
+            database=db_name,
+            user=d_username,
+            password=d_pw
+        )
+        cur = conn.cursor()
+        cur.execute("set search_path to bt;")
+        cur.execute(query)
+        rows = cur.fetchall()
+        colnames = [desc[0] for desc in cur.description]
+        cur.close()
+        conn.close()
+
+    print(f"Fetched {len(rows)} rows from {table} for {dstart} to {dend}")
+    return pd.DataFrame(rows, columns=colnames)
+
+
+def day_path(table, day, archive_dir=ARCHIVE_DIR):
+    return Path(archive_dir) / f"table={table}" / f"year={day[:4]}" / f"day={day}.parquet"
+
+
+def to_table(df):
+    # typed arrow table in the cache schema
+    return pa.Table.from_pandas(
+        pd.DataFrame({
+            "rep_date": pd.to_datetime(df["rep_date"]).astype("datetime64[s]"),
+            "wmo": df["wmo"].astype(str).str.strip(),
+            "precip": pd.to_numeric(df["precip"], errors="coerce").astype("float32"),
+            "pcp_period": pd.to_numeric(df["pcp_period"], errors="coerce").astype("float32"),
+            "sog": pd.to_numeric(df["sog"], errors="coerce").astype("float32"),
+        }),
+        schema=SCHEMA,
+        preserve_index=False,
+    )
+
+
+def write_day(table, day, df, archive_dir=ARCHIVE_DIR):
+    """
+    Write one UTC day of one table. The file appears only once it is complete.
+    """
+    path = day_path(table, day, archive_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".parquet.tmp")
+
+    pq.write_table(to_table(df.sort_values(["wmo", "rep_date"])), tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def missing_days(table, days, archive_dir=ARCHIVE_DIR):
+    return [d for d in days if not day_path(table, d, archive_dir).exists()]
+
+
+def contiguous_runs(days, max_days=MAX_RUN_DAYS):
+    # group sorted YYYY-MM-DD strings into (first, last) runs of at most max_days consecutive days
+    runs = []
+    for d in sorted(days):
+        day = datetime.strptime(d, "%Y-%m-%d")
+        if runs and day - runs[-1][1] == timedelta(days=1) and (day - runs[-1][0]).days < max_days:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+
+    return [(a.strftime("%Y-%m-%d"), b.strftime("%Y-%m-%d")) for a, b in runs]
+
+
+def utc_days(tstart, tend):
+    tstart = pd.Timestamp(tstart)
+    tend = pd.Timestamp(tend)
+    return pd.date_range(tstart.normalize(), tend.normalize(), freq="D").strftime("%Y-%m-%d").tolist()
+
+
+def last_complete_day(lag_hours=INGEST_LAG_HOURS):
+    # latest UTC day that ended at least lag_hours ago
+    return (datetime.utcnow() - timedelta(hours=lag_hours) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def sync(country, dstart, dend, archive_dir=ARCHIVE_DIR, fetch=fetch_obs):
+    """
+    Cache every complete UTC day between dstart and dend (inclusive) that is not
+    cached yet. Days that ended less than INGEST_LAG_HOURS ago are left out.
+    Days are split by table (decade) before being pulled.
+    Returns the list of (table, day) written.
+    """
+    last_day = last_complete_day()
+    days = [d for d in utc_days(dstart, dend) if d <= last_day]
+
+    by_table = {}
+    for d in days:
+        by_table.setdefault(obs_table(country, d[:4]), []).append(d)
+
+    written = []
+    for table, table_days in by_table.items():
+        for run_start, run_end in contiguous_runs(missing_days(table, table_days, archive_dir)):
+            obs = fetch(table, run_start, run_end)
+            if obs.empty:
+                obs = pd.DataFrame(columns=COLUMNS)
+            obs["day"] = pd.to_datetime(obs["rep_date"]).dt.strftime("%Y-%m-%d")
+            by_day = dict(tuple(obs.groupby("day")))
+
+            for day in utc_days(run_start, run_end):
+                write_day(table, day, by_day.get(day, obs.iloc[0:0]), archive_dir)
+                written.append((table, day))
+            print(f"Cached {table} {run_start} to {run_end}")
+
+    return written
+
+
+def read_obs(country, tstart, tend, stations=None, archive_dir=ARCHIVE_DIR, sync_missing=True, fetch=fetch_obs):
+    """
+    Hourly rows with tstart <= rep_date <= tend from the cache.
+
+    stations: iterable of WMO ids (int or str) or None for every station
+    sync_missing: pull missing days from the database first, otherwise
+                  return None when any day of the window is not cached
+    Days that are still not cached after the sync (today and the days inside
+    the ingest lag, which are never cached) are pulled from the database for
+    this call only.
+    """
+    tstart = pd.Timestamp(tstart)
+    tend = pd.Timestamp(tend)
+    days = utc_days(tstart, tend)
+
+    if sync_missing:
+        sync(country, days[0], days[-1], archive_dir, fetch)
+
+    filters = [("rep_date", ">=", tstart.to_pydatetime()), ("rep_date", "<=", tend.to_pydatetime())]
+    station_ids = [str(s).strip() for s in stations] if stations is not None else None
+    if station_ids is not None:
+        filters.append(("wmo", "in", station_ids))
+
+    tables, uncached = [], []
+    for day in days:
+        path = day_path(obs_table(country, day[:4]), day, archive_dir)
+        if not path.exists():
+            uncached.append(day)
+            continue
+        tables.append(pq.read_table(path, filters=filters, schema=SCHEMA))
+
+    if uncached and not sync_missing:
+        return None
+    for run_start, run_end in contiguous_runs(uncached):
+        # partial day, returned but not written to the cache
+        obs = to_table(fetch(obs_table(country, run_start[:4]), run_start, run_end)).to_pandas()
+        keep = (obs["rep_date"] >= tstart) & (obs["rep_date"] <= tend)
+        if station_ids is not None:
+            keep &= obs["wmo"].isin(station_ids)
+        tables.append(pa.Table.from_pandas(obs[keep], schema=SCHEMA, preserve_index=False))
+
+    if not tables:
+        return SCHEMA.empty_table().to_pandas()
+
+    return pa.concat_tables(tables).to_pandas()
+
+
+def station_season(country, wmo, start, end, archive_dir=ARCHIVE_DIR):
+    """
+    One station from start 00:00 to end 23:00 (YYYY-MM-DD), in the same
+    columns as station_precip_query.py writes (rep_date, precip, pcp_period, sog).
+    """
+    obs = read_obs(country, f"{start} 00:00:00", f"{end} 23:00:00", stations=[wmo], archive_dir=archive_dir)
+    return obs.drop(columns="wmo").sort_values("rep_date").reset_index(drop=True)
+
+
+def all_station_window(country, dstart, dend, stations=None, archive_dir=ARCHIVE_DIR):
+    """
+    Every (or the listed) station for the 12Z dstart to 12Z dend window,
+    the pull made by the validation scripts.
+    """
+    obs = read_obs(country, f"{dstart} 12:00:00", f"{dend} 11:59:59", stations=stations, archive_dir=archive_dir)
+    return obs.sort_values(["wmo", "rep_date"]).reset_index(drop=True)
+
+
+def daily_accumulation(obs, value_col="precip"):
+    """
+    12Z-12Z totals per station and forecast day.
+    The forecast day of an hour is the UTC date 12 hours earlier.
+    Output: dataframe with wmo, day, precip (NaN when nothing reported) and n_hours
+    """
+    if obs.empty:
+        return pd.DataFrame(columns=["wmo", "day", value_col, "n_hours"])
+
+    day = (pd.to_datetime(obs["rep_date"]) - pd.Timedelta(hours=12)).dt.strftime("%Y-%m-%d")
+    values = obs[value_col].astype(float)
+
+    grouped = values.groupby([obs["wmo"].rename("wmo"), day.rename("day")])
+    return pd.DataFrame({
+        value_col: grouped.sum(min_count=1),
+        "n_hours": grouped.count(),
+    }).reset_index()
+
+
+if __name__ == "__main__":
+    # fill the fire seasons used for training, then the last few days
+    for year in range(2018, datetime.utcnow().year + 1):
+        sync("can", f"{year}-05-01", f"{year}-10-01")
+    end = datetime.utcnow() - timedelta(days=1)
+    sync("can", (end - timedelta(days=3)).strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
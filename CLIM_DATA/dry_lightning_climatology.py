@@ -0,0 +1,338 @@
+"""
+
+    Gridded dry lightning climatology built from the CLDN archive
+    and hourly station precipitation.
+
+    Every forecast day (12Z to 12Z) of every season is streamed one at a time:
+    - strikes come from the local CLDN Parquet archive (CLDN/cldn_etl.py),
+      synced for the season first; days still missing from it are left out
+      of n_days rather than counted as days without lightning
+    - hourly station precipitation comes from the local observation cache
+      (OBS/obs_cache.py), reduced a month at a time to 12Z-12Z station totals
+    Each grid cell takes the precipitation of its nearest station (within
+    MAX_STATION_KM), and lightning in the cell is dry when that total is
+    <= PRECIP_CUTOFF (same rule as PROCESS/combine_dataset.py).
+
+    Counts are accumulated with np.bincount into fixed size arrays
+    (day-of-season bin, lat, lon) so memory does not grow with the number of
+    strikes or years. Each year is written to CLIMATOLOGY/year_{year}.nc and
+    years run in parallel in a process pool; finished years are skipped.
+    merge_years sums the years into climatology.nc with the frequencies:
+    - lightning_freq: fraction of days with lightning in the cell
+    - dry_freq: fraction of days with dry lightning (over days with a reporting station)
+    - dry_fraction: fraction of lightning days that were dry
+
+    The grid is the forecast raster grid (0.09 deg, EPSG:4326) built from the
+    bounds of UTILS/MODEL/grid_{model}_ecozones.csv.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from context import utils_dir
+from CLDN.cldn_etl import local_strikes, sync as sync_strikes
+from OBS.obs_cache import all_station_window, daily_accumulation
+
+#%%
+BASE_DIR = Path(__file__).parent
+CLIM_DIR = BASE_DIR / "CLIMATOLOGY"
+
+PRECIP_CUTOFF = 2.54  # mm, dry lightning at or below
+RESOLUTION = 0.09  # degrees, same as the forecast raster
+MAX_STATION_KM = 75  # cells further than this from any station are not classified
+SEASON_START = (5, 1)
+SEASON_END = (9, 30)
+DOY_BIN_DAYS = 7  # day-of-season bin width
+CHUNK_DAYS = 31  # days of hourly precip held in memory at once
+EARTH_RADIUS_KM = 6371.0
+
+COUNT_VARS = ["lightning_days", "dry_days", "moist_days", "covered_days"]
+
+
+def output_grid(model="hrdps", resolution=RESOLUTION):
+    """
+    Regular lat/lon grid matching the forecast raster.
+    Returns cell centre latitudes (north to south), longitudes (west to east)
+    and the (xmin, ymax) origin.
+    """
+    grid = pd.read_csv(f"{utils_dir}MODEL/grid_{model}_ecozones.csv", usecols=["lat", "lon"])
+    xmin, xmax = grid["lon"].min(), grid["lon"].max()
+    ymin, ymax = grid["lat"].min(), grid["lat"].max()
+
+    width = int(np.ceil((xmax - xmin) / resolution))
+    height = int(np.ceil((ymax - ymin) / resolution))
+
+    lats = ymax - (np.arange(height) + 0.5) * resolution
+    lons = xmin + (np.arange(width) + 0.5) * resolution
+
+    return lats, lons, (xmin, ymax)
+
+
+def season_days(year):
+    start = datetime(year, *SEASON_START)
+    end = datetime(year, *SEASON_END)
+    return pd.date_range(start, end, freq="D").strftime("%Y-%m-%d").tolist()
+
+
+def next_day(day):
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def doy_bin(day):
+    # day-of-season bin, same bins every year
+    d = datetime.strptime(day, "%Y-%m-%d")
+    return (d - datetime(d.year, *SEASON_START)).days // DOY_BIN_DAYS
+
+
+def n_doy_bins():
+    n_days = (datetime(2001, *SEASON_END) - datetime(2001, *SEASON_START)).days + 1
+    return int(np.ceil(n_days / DOY_BIN_DAYS))
+
+
+def to_xyz(lats, lons):
+    # unit vectors so KD-tree distances are chord lengths on the sphere
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def load_stations():
+    """
+    WMO id, latitude and longitude of the SWOB stations (same list as the validation).
+    """
+    stations = pd.read_csv(f"{utils_dir}swob-xml_station_list.csv")
+    stations = stations.drop_duplicates(subset=["WMO_ID"])
+    stations = stations[stations["WMO_ID"].notna()]
+
+    return pd.DataFrame({
+        "wmo": stations["WMO_ID"].astype(int).to_numpy(),
+        "lat": stations["Latitude"].astype(float).to_numpy(),
+        "lon": stations["Longitude"].astype(float).to_numpy(),
+    })
+
+
+def nearest_station(lats, lons, stations, max_km=MAX_STATION_KM):
+    """
+    Index into stations of the nearest station to every grid cell, -1 when
+    the nearest one is further than max_km. Shape (len(lats), len(lons)).
+    """
+    from scipy.spatial import cKDTree
+
+    tree = cKDTree(to_xyz(stations["lat"], stations["lon"]))
+    lon2d, lat2d = np.meshgrid(lons, lats)
+    max_chord = 2 * np.sin(max_km / EARTH_RADIUS_KM / 2)
+
+    dist, idx = tree.query(to_xyz(lat2d.ravel(), lon2d.ravel()), distance_upper_bound=max_chord)
+    idx = np.where(np.isfinite(dist), idx, -1)
+
+    return idx.reshape(lat2d.shape).astype(np.int32)
+
+
+def daily_station_precip(year, chunk_days=CHUNK_DAYS):
+    """
+    12Z-12Z precip totals per station and forecast day for one season, read
+    from the local observation cache (OBS/obs_cache.py) chunk_days at a time.
+    Output: dataframe indexed by (day, wmo) with a precip column
+    """
+    days = season_days(year)
+    partial = []
+    for i in range(0, len(days), chunk_days):
+        first, last = days[i], days[min(i + chunk_days, len(days)) - 1]
+        obs = all_station_window("can", first, next_day(last))
+        daily = daily_accumulation(obs)
+        daily = daily[daily["day"].between(first, last) & daily["precip"].notna()].copy()
+        daily["wmo"] = pd.to_numeric(daily["wmo"], errors="coerce")
+        partial.append(daily.dropna(subset=["wmo"]).astype({"wmo": int}))
+
+    daily = pd.concat(partial, ignore_index=True)
+    return daily.set_index(["day", "wmo"])[["precip"]]
+
+
+def strike_cells(day, lats, lons, origin, resolution=RESOLUTION):
+    """
+    Strike count per grid cell for the 12Z-12Z window of one forecast day,
+    None when either UTC day of the window is not in the CLDN archive.
+    """
+    xmin, ymax = origin
+    ny, nx = len(lats), len(lons)
+    bbox = (xmin, ymax - ny * resolution, xmin + nx * resolution, ymax)
+
+    strikes = local_strikes(f"{day} 12:00:00", f"{next_day(day)} 11:59:59", bbox=bbox, columns=["lat", "lon"])
+    if strikes is None:
+        return None
+    if strikes.empty:
+        return np.zeros(ny * nx, dtype=np.int64)
+
+    rows = np.floor((ymax - strikes["lat"].to_numpy(dtype=float)) / resolution).astype(np.int64)
+    cols = np.floor((strikes["lon"].to_numpy(dtype=float) - xmin) / resolution).astype(np.int64)
+    inside = (rows >= 0) & (rows < ny) & (cols >= 0) & (cols < nx)
+
+    return np.bincount(rows[inside] * nx + cols[inside], minlength=ny * nx)
+
+
+def accumulate_year(year, model="hrdps", out_dir=CLIM_DIR, overwrite=False):
+    """
+    Count lightning, dry, moist and covered (station reported) days per cell and
+    day-of-season bin for one season and write them to out_dir/year_{year}.nc
+    """
+    import xarray as xr
+
+    out_path = Path(out_dir) / f"year_{year}.nc"
+    if out_path.exists() and not overwrite:
+        print(f"{out_path.name} exists, skipping")
+        return out_path
+
+    lats, lons, origin = output_grid(model)
+    ny, nx = len(lats), len(lons)
+    n_bins = n_doy_bins()
+
+    stations = load_stations()
+    cell_station = nearest_station(lats, lons, stations).ravel()
+    has_station = cell_station >= 0
+    cell_station = np.where(has_station, cell_station, 0)
+
+    station_precip = daily_station_precip(year)
+    precip_by_day = {d: g.droplevel("day")["precip"] for d, g in station_precip.groupby(level="day")}
+    station_pos = pd.Series(np.arange(len(stations)), index=stations["wmo"])
+
+    counts = {v: np.zeros((n_bins, ny * nx), dtype=np.uint16) for v in COUNT_VARS}
+    strike_total = np.zeros((n_bins, ny * nx), dtype=np.uint32)
+    n_days = np.zeros(n_bins, dtype=np.uint16)
+
+    # make sure the CLDN archive holds the season, a day that is not synced
+    # would otherwise count as a day without lightning
+    days = season_days(year)
+    sync_strikes(days[0], next_day(days[-1]))
+
+    skipped = []
+    for day in days:
+        b = doy_bin(day)
+        n_strikes = strike_cells(day, lats, lons, origin)
+        if n_strikes is None:
+            skipped.append(day)
+            continue
+        lightning = n_strikes > 0
+
+        # precip of every station that reported on the day, NaN otherwise
+        precip = np.full(len(stations), np.nan)
+        if day in precip_by_day:
+            day_precip = precip_by_day[day]
+            pos = station_pos.reindex(day_precip.index)
+            known = pos.notna().to_numpy()
+            precip[pos[known].astype(int).to_numpy()] = day_precip.to_numpy()[known]
+
+        cell_precip = np.where(has_station, precip[cell_station], np.nan)
+        covered = np.isfinite(cell_precip)
+        dry = lightning & covered & (cell_precip <= PRECIP_CUTOFF)
+        moist = lightning & covered & (cell_precip > PRECIP_CUTOFF)
+
+        counts["lightning_days"][b] += lightning
+        counts["dry_days"][b] += dry
+        counts["moist_days"][b] += moist
+        counts["covered_days"][b] += covered
+        strike_total[b] += n_strikes.astype(np.uint32)
+        n_days[b] += 1
+
+        print(f"{day}: {int(lightning.sum())} lightning cells, {int(dry.sum())} dry")
+
+    if skipped:
+        print(f"{year}: {len(skipped)} days not in the CLDN archive were left out ({skipped[0]} to {skipped[-1]})")
+
+    coords = {"doy_bin": np.arange(n_bins), "lat": lats, "lon": lons}
+    dims = ("doy_bin", "lat", "lon")
+    ds = xr.Dataset(
+        {v: (dims, counts[v].reshape(n_bins, ny, nx)) for v in COUNT_VARS},
+        coords=coords,
+    )
+    ds["strike_count"] = (dims, strike_total.reshape(n_bins, ny, nx))
+    ds["n_days"] = (("doy_bin",), n_days)
+    ds.attrs.update({
+        "year": year,
+        "model": model,
+        "resolution_deg": RESOLUTION,
+        "precip_cutoff_mm": PRECIP_CUTOFF,
+        "max_station_km": MAX_STATION_KM,
+        "doy_bin_days": DOY_BIN_DAYS,
+        "season_start": f"{SEASON_START[0]:02d}-{SEASON_START[1]:02d}",
+    })
+
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(".nc.tmp")
+    encoding = {v: {"zlib": True, "complevel": 4} for v in COUNT_VARS + ["strike_count"]}
+    ds.to_netcdf(tmp_path, encoding=encoding)
+    os.replace(tmp_path, out_path)
+    print(f"Saved {out_path}")
+
+    return out_path
+
+
+def build_years(years, model="hrdps", max_workers=None, out_dir=CLIM_DIR, overwrite=False):
+    """
+    Accumulate several seasons in parallel, one process per year.
+    """
+    max_workers = max_workers or min(len(years), os.cpu_count() or 1)
+    done = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(accumulate_year, y, model, out_dir, overwrite): y for y in years}
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                done.append(future.result())
+            except Exception as e:
+                print(f"Climatology for {year} failed: {e}")
+
+    return sorted(done)
+
+
+def merge_years(out_dir=CLIM_DIR, out_name="climatology.nc"):
+    """
+    Sum every year_*.nc (one file open at a time) and add the frequency grids.
+    """
+    import xarray as xr
+
+    files = sorted(Path(out_dir).glob("year_*.nc"))
+    if not files:
+        raise FileNotFoundError(f"No yearly climatology files in {out_dir}")
+
+    total = None
+    for f in files:
+        with xr.open_dataset(f) as ds:
+            counts = ds[COUNT_VARS + ["strike_count", "n_days"]].astype("uint32").load()
+        total = counts if total is None else total + counts
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total["lightning_freq"] = (total["lightning_days"] / total["n_days"]).astype("float32")
+        total["dry_freq"] = (total["dry_days"] / total["covered_days"]).where(total["covered_days"] > 0).astype("float32")
+        total["moist_freq"] = (total["moist_days"] / total["covered_days"]).where(total["covered_days"] > 0).astype("float32")
+        total["dry_fraction"] = (
+            total["dry_days"] / (total["dry_days"] + total["moist_days"])
+        ).where(total["dry_days"] + total["moist_days"] > 0).astype("float32")
+
+    total.attrs = {
+        "years": ",".join(f.stem.split("_")[1] for f in files),
+        "resolution_deg": RESOLUTION,
+        "precip_cutoff_mm": PRECIP_CUTOFF,
+        "doy_bin_days": DOY_BIN_DAYS,
+    }
+
+    out_path = Path(out_dir) / out_name
+    total.to_netcdf(out_path)
+    print(f"Saved {out_path} from {len(files)} seasons")
+
+    return out_path
+
+
+if __name__ == "__main__":
+    years = list(range(2018, datetime.utcnow().year))
+    build_years(years)
+    merge_years()
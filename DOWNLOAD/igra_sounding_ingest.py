@@ -0,0 +1,250 @@
+"""
+
+    Bulk sounding ingest from the IGRA2 station archives as an
+    alternative to the per-day Wyoming requests in uw_sounding_query.py
+
+    One IGRA2 file holds the full period of record for a station, so every
+    season of a station is a single (zipped) file read instead of ~150 HTTP
+    calls per season. The file is parsed as a stream: header records are
+    checked first and the level records of soundings outside the requested
+    years, months and hour are skipped without being parsed.
+
+    Profiles are written in the same layout as download_soundings
+    (./OUTPUT/{id}/{id}_{year}_all_soundings.csv and the sounding_store.py
+    ragged arrays) with the Wyoming units (hPa, m, degC, knots) so
+    combine_dataset reads them unchanged.
+
+    IGRA2 ids are the country code, "M" (WMO) and the zero padded WMO id:
+    CAM00071109 (Port Hardy), USM00072797 (Quillayute)
+
+    Local archives (e.g. fixtures or a manual download) can be read by
+    passing their path to read_station_seasons.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import io
+import os
+import json
+import zipfile
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from context import utils_dir
+from sounding_store import write_store
+
+#%%
+IGRA_URL = "https://www.ncei.noaa.gov/data/integrated-global-radiosonde-archive/access/data-por/"
+IGRA_DIR = Path(__file__).parent / "IGRA"
+OUTPUT_DIR = Path(__file__).parent / "OUTPUT"
+
+MISSING = (-9999, -8888)  # missing and removed by QC
+MS_TO_KNOTS = 1.943844
+
+COUNTRY_CODES = {"Canada": "CA", "USA": "US"}
+
+# same columns as a WyomingUpperAir request
+COLUMNS = ["pressure", "height", "temperature", "dewpoint", "direction", "speed",
+           "u_wind", "v_wind", "station", "station_number", "time",
+           "latitude", "longitude", "elevation"]
+
+#%%
+def igra_station_id(station_info):
+    """
+    IGRA2 id from a unique_ecozone_stations.json entry.
+    """
+    country = COUNTRY_CODES[station_info.get("country", "Canada")]
+    return f"{country}M000{int(station_info['id']):05d}"
+
+
+def fetch_station_archive(igra_id, igra_dir=IGRA_DIR, refresh=False):
+    """
+    Download {igra_id}-data.txt.zip once into igra_dir.
+    Output: path to the local zip
+    """
+    igra_dir = Path(igra_dir)
+    igra_dir.mkdir(parents=True, exist_ok=True)
+    path = igra_dir / f"{igra_id}-data.txt.zip"
+    if path.exists() and not refresh:
+        return path
+
+    url = f"{IGRA_URL}{path.name}"
+    print(f"Downloading {url}")
+    tmp_path = path.with_suffix(".zip.tmp")
+    urllib.request.urlretrieve(url, tmp_path)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def archive_lines(path):
+    """
+    Iterate the text lines of an IGRA2 data file (plain text or zipped).
+    """
+    path = Path(path)
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            name = [n for n in zf.namelist() if n.endswith(".txt")][0]
+            with zf.open(name) as raw:
+                for line in io.TextIOWrapper(raw, encoding="ascii", errors="replace"):
+                    yield line
+    else:
+        with open(path, "r", encoding="ascii", errors="replace") as f:
+            for line in f:
+                yield line
+
+
+def parse_header(line):
+    """
+    IGRA2 header record (fixed width, 1-based columns from the format description).
+    """
+    return {
+        "id": line[1:12].strip(),
+        "year": int(line[13:17]),
+        "month": int(line[18:20]),
+        "day": int(line[21:23]),
+        "hour": int(line[24:26]),
+        "numlev": int(line[32:36]),
+        "lat": int(line[55:62]) / 10000.0,
+        "lon": int(line[63:71]) / 10000.0,
+    }
+
+
+def parse_levels(lines):
+    """
+    Level records of one sounding to arrays in Wyoming units.
+    """
+    def field(start, end):
+        values = np.array([int(l[start:end]) if l[start:end].strip() else MISSING[0] for l in lines], dtype=float)
+        values[np.isin(values, MISSING)] = np.nan
+        return values
+
+    pressure = field(9, 15) / 100.0  # Pa -> hPa
+    height = field(16, 21)
+    temperature = field(22, 27) / 10.0
+    dpd = field(34, 39) / 10.0  # dewpoint depression
+    direction = field(40, 45)
+    speed = field(46, 51) / 10.0 * MS_TO_KNOTS  # tenths of m/s -> knots
+
+    rad = np.deg2rad(direction)
+    return {
+        "pressure": pressure,
+        "height": height,
+        "temperature": temperature,
+        "dewpoint": temperature - dpd,
+        "direction": direction,
+        "speed": speed,
+        "u_wind": -speed * np.sin(rad),
+        "v_wind": -speed * np.cos(rad),
+    }
+
+
+def iter_soundings(lines, years=None, months=None, hours=(12,)):
+    """
+    Stream (header, levels) for the soundings matching years, months and hours.
+    Level records of every other sounding are skipped unparsed.
+    """
+    years = set(years) if years is not None else None
+    months = set(months) if months is not None else None
+    hours = set(hours) if hours is not None else None
+
+    lines = iter(lines)
+    for line in lines:
+        if not line.startswith("#"):
+            continue
+        header = parse_header(line)
+        wanted = ((years is None or header["year"] in years)
+                  and (months is None or header["month"] in months)
+                  and (hours is None or header["hour"] in hours))
+
+        levels = [next(lines) for _ in range(header["numlev"])]
+        if wanted:
+            yield header, parse_levels(levels)
+
+
+def sounding_frame(header, levels, station, station_number, elevation):
+    """
+    One profile as a dataframe in the download_soundings layout.
+    Levels without a pressure are dropped (Wyoming only lists pressure levels).
+    """
+    df = pd.DataFrame(levels)
+    df = df[df["pressure"].notna()].sort_values("pressure", ascending=False)
+
+    df["station"] = station
+    df["station_number"] = station_number
+    df["time"] = f"{header['year']:04d}-{header['month']:02d}-{header['day']:02d} {header['hour']:02d}:00:00"
+    df["latitude"] = header["lat"]
+    df["longitude"] = header["lon"]
+    df["elevation"] = elevation
+    df["ddmmyyyy"] = int(f"{header['day']:02d}{header['month']:02d}{header['year']:04d}")
+
+    return df[COLUMNS + ["ddmmyyyy"]]
+
+
+def read_station_seasons(station_info, years, mstart=5, mend=9, hour=12, archive_path=None):
+    """
+    All hour-Z profiles of a station for the given years and months from a
+    single pass over its IGRA2 archive.
+    Output: {year: dataframe}
+    """
+    igra_id = igra_station_id(station_info)
+    if archive_path is None:
+        archive_path = fetch_station_archive(igra_id)
+
+    frames = {y: [] for y in years}
+    for header, levels in iter_soundings(archive_lines(archive_path), years=years,
+                                         months=range(mstart, mend + 1), hours=(hour,)):
+        frames[header["year"]].append(
+            sounding_frame(header, levels, igra_id, station_info["id"], station_info.get("elevation_m", np.nan))
+        )
+
+    seasons = {}
+    for year, year_frames in frames.items():
+        seasons[year] = pd.concat(year_frames, ignore_index=True) if year_frames else pd.DataFrame(columns=COLUMNS + ["ddmmyyyy"])
+        print(f"{igra_id} {year}: {len(year_frames)} soundings")
+
+    return seasons
+
+
+def write_season(df, id, year, out_dir=OUTPUT_DIR, overwrite=False):
+    """
+    Save one season as {out_dir}/{id}/{id}_{year}_all_soundings.csv
+    """
+    out_path = Path(out_dir) / f"{id}" / f"{id}_{year}_all_soundings.csv"
+    if out_path.exists() and not overwrite:
+        print(f"{out_path} exists, skipping")
+        return out_path
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(out_path, sep=',')
+    print(f"Saved {len(df)} levels to {out_path}")
+    if not df.empty:
+        write_store(df, id, year, out_dir)
+
+    return out_path
+
+
+def ingest_station(station_info, years, mstart=5, mend=9, out_dir=OUTPUT_DIR, overwrite=False, archive_path=None):
+    """
+    Read a station archive once and write every requested season.
+    """
+    seasons = read_station_seasons(station_info, years, mstart, mend, archive_path=archive_path)
+    return [write_season(df, station_info["id"], year, out_dir, overwrite) for year, df in seasons.items()]
+
+
+#%%
+if __name__ == "__main__":
+    with open(utils_dir + 'unique_ecozone_stations.json', 'r') as f:
+        stations = json.load(f)
+
+    years = list(range(2018, 2026))
+    for name, station_info in stations.items():
+        try:
+            ingest_station(station_info, years)
+        except Exception as e:
+            print(f"IGRA ingest failed for {name}: {e}")
@@ -8,6 +8,7 @@ January 20, 2026
 import os
 import json
 from context import utils_dir
+import pandas as pd
 import geopandas as gpd
 
 # open the stations json file
@@ -26,6 +27,7 @@ station_select = "INUVIK+UA"  #all_stations[28]  # e.g., "Port Hardy"
 years = range(2018, 2026)  # 2018 to 2025
 time = 12  # which sounding do we want: 12Z
 timestep = 1  # iterate every day
+sounding_source = "igra"  # ["igra", "wyoming"] igra reads the whole station archive once
 
 if station_select in all_stations:
     print(f"station {station_select} is valid...")
@@ -47,6 +49,16 @@ else:
 ##### END USER INPUT #####
 ##########
 
+#%%
+# bulk soundings: every season from one pass over the station's IGRA2 archive
+igra_seasons = {}
+if sounding_source == "igra":
+    from igra_sounding_ingest import read_station_seasons
+    try:
+        igra_seasons = read_station_seasons(station_info, years=list(years))
+    except Exception as e:
+        print(f"IGRA ingest failed, falling back to Wyoming requests: {e}")
+
 #%%
 # loop through years and run the download scripts
 for year in years:
@@ -77,15 +89,19 @@ for year in years:
         continue
 
     # get precipitation data
-    from station_precip_query import can_set_query, usa_set_query, db_query
+    from station_precip_query import can_set_query, usa_set_query, db_query, cached_station_query
     from shapefile_utils import point_in_shapefile, load_simplified_shapefile
     if point_in_shapefile(shapefile_path=census_shapefile, lat=lat, lon=lon, buffer_km=0):
         print(f"{station_select} is in Canada, using Canadian precipitation query...")
+        country = "can"
         query = can_set_query(start_date, end_date, cwfis_id)
     else:
         print(f"{station_select} is in the USA, using USA precipitation query...")
+        country = "usa"
         query = usa_set_query(start_date, end_date, cwfis_id)
-    db_query(query=query, csv_output=f"./OUTPUT/{id}/{id}_{year}_precip_output.csv")
+    precip_csv = f"./OUTPUT/{id}/{id}_{year}_precip_output.csv"
+    if not cached_station_query(country, start_date, end_date, cwfis_id, csv_output=precip_csv):
+        db_query(query=query, csv_output=precip_csv)
 
     # get lightning data
     from cldn_query import db_query, full_station_location_cldn_query
@@ -97,7 +113,10 @@ for year in years:
     all_soundings = check_file(id=id, year=year)
 
     # check if all_soundings in empty
-    if all_soundings.empty:
+    if all_soundings.empty and not igra_seasons.get(year, pd.DataFrame()).empty:
+        from igra_sounding_ingest import write_season
+        write_season(igra_seasons[year], id, year)
+    elif all_soundings.empty:
         # getting 12Z soundings for the fire season
         download_soundings(year=year, mstart=int(mstart), mend=int(mend),
                            station=station, id=id)
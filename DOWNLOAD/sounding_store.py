@@ -0,0 +1,197 @@
+"""
+
+    Columnar sounding store: every launch of a station-season as one
+    contiguous ragged array (the CF "contiguous ragged array" layout) in
+    Arrow IPC files, written next to the all_soundings csv:
+
+        OUTPUT/{id}/{id}_{year}_soundings.arrow           levels, float32 columns
+        OUTPUT/{id}/{id}_{year}_soundings_launches.arrow  one row per launch:
+                                                          time, count (+ pw, lat, lon, elevation)
+
+    Launches are sorted by time and their levels are stored back to back,
+    so launch k occupies rows start[k]:start[k] + count[k] with start the
+    cumulative sum of count. Opening the store memory-maps the level file,
+    a profile lookup by time is a dict lookup plus an array slice, and a
+    range of launches is one zero-copy view of every column.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from pathlib import Path
+
+#%%
+LEVEL_COLUMNS = ["pressure", "height", "temperature", "dewpoint", "direction",
+                 "speed", "u_wind", "v_wind", "rh"]
+LAUNCH_COLUMNS = ["pw", "latitude", "longitude", "elevation"]
+
+
+def store_paths(id, year, out_dir):
+    base = Path(out_dir) / f"{id}" / f"{id}_{year}_soundings"
+    return base.with_suffix(".arrow"), Path(f"{base}_launches.arrow")
+
+
+def write_ipc(table, path):
+    # uncompressed so the file can be memory-mapped, renamed into place when complete
+    tmp_path = Path(str(path) + ".tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def write_store(soundings, id, year, out_dir):
+    """
+    Write a season of soundings (all_soundings csv layout, one row per level)
+    as a contiguous ragged array. Launches are ordered by time and levels by
+    decreasing pressure. Level/launch columns missing from the input are skipped.
+    """
+    levels_path, launches_path = store_paths(id, year, out_dir)
+    levels_path.parent.mkdir(parents=True, exist_ok=True)
+
+    df = soundings[soundings["time"].notna()].copy()
+    df["time"] = pd.to_datetime(df["time"]).dt.strftime("%Y-%m-%d %H:%M:%S")
+    df = df.sort_values(["time", "pressure"], ascending=[True, False], kind="stable")
+
+    level_cols = [c for c in LEVEL_COLUMNS if c in df.columns]
+    levels = pa.table({c: pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float32) for c in level_cols})
+
+    grouped = df.groupby("time", sort=True)
+    launches = {"time": np.asarray(list(grouped.groups.keys()), dtype=object),
+                "count": grouped.size().to_numpy(dtype=np.int32)}
+    for c in [c for c in LAUNCH_COLUMNS if c in df.columns]:
+        launches[c] = pd.to_numeric(grouped[c].first(), errors="coerce").to_numpy(dtype=np.float32)
+
+    write_ipc(levels, levels_path)
+    write_ipc(pa.table(launches), launches_path)
+    print(f"Saved {len(launches['count'])} launches ({len(df)} levels) to {levels_path}")
+
+    return levels_path
+
+
+def store_from_csv(id, year, out_dir, overwrite=False):
+    """
+    Build the store from an existing {id}_{year}_all_soundings.csv.
+    Returns None if there is no csv.
+    """
+    csv_path = Path(out_dir) / f"{id}" / f"{id}_{year}_all_soundings.csv"
+    levels_path, _ = store_paths(id, year, out_dir)
+    if levels_path.exists() and not overwrite and (
+            not csv_path.exists() or levels_path.stat().st_mtime >= csv_path.stat().st_mtime):
+        return levels_path
+    if not csv_path.exists():
+        return None
+
+    soundings = pd.read_csv(csv_path)
+    if soundings.empty or "time" not in soundings.columns:
+        return None
+
+    return write_store(soundings, id, year, out_dir)
+
+
+def column_view(column):
+    # numpy view of a single-chunk float32 column (no copy when there are no nulls)
+    if column.num_chunks == 0:
+        return np.empty(0, dtype=np.float32)
+    chunk = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    return chunk.to_numpy(zero_copy_only=False)
+
+
+class SoundingStore:
+    """
+    Read-only view of one station-season.
+
+    store = SoundingStore.open(id, year, out_dir)
+    store.profile("2021-07-02 12:00:00")  # dict of column -> float32 view
+    store.block(first_time, last_time)     # zero-copy views of a range of launches
+    """
+
+    def __init__(self, levels, launches):
+        self.levels = levels
+        self.times = launches.column("time").to_pylist()
+        self._sorted_times = np.asarray(self.times, dtype=object)
+        self.count = launches.column("count").to_numpy().astype(np.int64)
+        self.start = np.concatenate([[0], np.cumsum(self.count)[:-1]]).astype(np.int64)
+        self.launch_values = {c: launches.column(c).to_numpy() for c in LAUNCH_COLUMNS if c in launches.column_names}
+        self._position = {t: k for k, t in enumerate(self.times)}
+        # float32 columns without nulls come out of the mapped buffers without a copy
+        self.columns = {c: column_view(levels.column(c)) for c in levels.column_names}
+
+    @classmethod
+    def open(cls, id, year, out_dir):
+        levels_path, launches_path = store_paths(id, year, out_dir)
+        levels = pa.ipc.open_file(pa.memory_map(str(levels_path), "r")).read_all()
+        launches = pa.ipc.open_file(pa.memory_map(str(launches_path), "r")).read_all()
+        return cls(levels, launches)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __contains__(self, time):
+        return time in self._position
+
+    def launch(self, time):
+        # launch number for a "YYYY-MM-DD HH:MM:SS" time, None if there was no launch
+        return self._position.get(time)
+
+    def positions(self, times):
+        # batched launch numbers, -1 where there was no launch
+        return np.array([self._position.get(t, -1) for t in times], dtype=np.int64)
+
+    def profile(self, time, columns=None):
+        """
+        Level arrays of one launch (views into the store), None if there was no launch.
+        """
+        k = self.launch(time)
+        if k is None:
+            return None
+        s, n = self.start[k], self.count[k]
+        columns = columns or list(self.columns)
+
+        return {c: self.columns[c][s:s + n] for c in columns}
+
+    def block(self, first_time, last_time, columns=None):
+        """
+        Every launch with first_time <= time <= last_time as one view per column
+        plus the per-launch offsets into those views.
+        Output: (times, offsets (n + 1,), {column: array})
+        """
+        k0 = int(np.searchsorted(self._sorted_times, first_time, side="left"))
+        k1 = int(np.searchsorted(self._sorted_times, last_time, side="right"))
+        columns = columns or list(self.columns)
+        if k1 <= k0:
+            return [], np.zeros(1, dtype=np.int64), {c: self.columns[c][0:0] for c in columns}
+
+        s0 = self.start[k0]
+        s1 = self.start[k1 - 1] + self.count[k1 - 1]
+        offsets = np.concatenate([self.start[k0:k1], [s1]]) - s0
+
+        return self.times[k0:k1], offsets, {c: self.columns[c][s0:s1] for c in columns}
+
+    def frame(self, time, dropna=True):
+        """
+        One launch as a dataframe in the all_soundings csv layout.
+        dropna mirrors sounding.dropna(): levels with a missing value are
+        dropped and the whole launch is dropped if a launch value (pw) is missing.
+        """
+        levels = self.profile(time)
+        if levels is None:
+            return pd.DataFrame(columns=list(self.columns) + list(self.launch_values) + ["time"])
+
+        k = self.launch(time)
+        df = pd.DataFrame(levels)
+        for c, values in self.launch_values.items():
+            df[c] = values[k]
+        df["time"] = time
+
+        if dropna:
+            df = df.dropna()
+
+        return df
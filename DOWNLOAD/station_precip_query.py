@@ -17,6 +17,11 @@ import sshtunnel
 
 from sshtunnel import SSHTunnelForwarder
 from context import utils_dir
+try:
+    from CLIM_DATA.OBS.obs_cache import station_season
+except ImportError:
+    # no local observation cache (pyarrow missing) - always use the database
+    station_season = None
 
 # open the stations json file
 #with open(utils_dir + '/stations.json', 'r') as f:
@@ -79,6 +84,26 @@ def usa_set_query(start, end, stationid):
 
     return QUERY
 
+def cached_station_query(country, start, end, stationid, csv_output):
+    """
+    Write one station's season of hourly precip to csv_output from the
+    local observation cache (CLIM_DATA/OBS), pulling missing days first.
+    country - "can" or "usa"
+    output: True if written, False if the caller should query the database
+    """
+    if station_season is None:
+        return False
+
+    try:
+        obs = station_season(country, stationid, start, end)
+    except Exception as e:
+        print("Observation cache error:", e)
+        return False
+
+    obs.to_csv(csv_output, index=False)
+    print(f"Cached results saved to {csv_output}")
+    return True
+
 def db_query(query, csv_output='query_output.csv'):
     """
     Call the database to get wind data
@@ -19,6 +19,7 @@ import metpy.calc as mpcalc
 from metpy.units import units
 from siphon.simplewebservice.wyoming import WyomingUpperAir
 from context import utils_dir
+from sounding_store import write_store
 
 # open the stations json file
 #with open(utils_dir + '/stations.json', 'r') as f:
@@ -94,17 +95,19 @@ def download_soundings(year, mstart, mend, station, id):
 
     # get the all_soundings dataframe
     all_soundings = check_file(id, year)
+    # launches already downloaded (ddmmyyyy), checked with a set lookup
+    have = set(all_soundings["ddmmyyyy"].dropna().astype(int)) if "ddmmyyyy" in all_soundings.columns else set()
 
     for date in daterange(start_date, end_date):
         # loop through dates and append sounding info to the all_soundings dataframess
         month = str(date)[5:7]
-        year = str(date)[0:4]
+        yyyy = str(date)[0:4]  # don't shadow the year argument
         day = str(date)[8:10]
-        duse = int( day+month+year )
+        duse = int( day+month+yyyy )
         month = int(month)
         
 
-        if month < mstart or month > mend or duse in all_soundings.values:
+        if month < mstart or month > mend or duse in have:
             # dont want to make our wind profile from outside of fire season
             print("Already there or out of season")
             pass
@@ -115,6 +118,7 @@ def download_soundings(year, mstart, mend, station, id):
 
                     df["ddmmyyyy"] = duse
                     all_soundings = pd.concat([all_soundings, df])
+                    have.add(duse)
 
                     print(str(date), " - ", len(all_soundings["height"])) 
                     all_soundings.to_csv(f"./OUTPUT/{id}/{id}_{year}_all_soundings.csv", sep=',')
@@ -130,5 +134,7 @@ def download_soundings(year, mstart, mend, station, id):
 
     # one more save
     all_soundings.to_csv(f"./OUTPUT/{id}/{id}_{year}_all_soundings.csv", sep=',')  
+    if not all_soundings.empty:
+        write_store(all_soundings, id, year, "./OUTPUT")
     print("Complete")
 # %%
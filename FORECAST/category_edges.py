@@ -0,0 +1,74 @@
+"""
+
+    Forecast category edges per grid point in one vectorized pass.
+
+    Edges come either from nationwide_bins.csv (one low-mod / mod-con pair
+    for the country) or from all_ecozone_bins.csv (low / moderate per
+    ecozone, both written by gen_fcst_bins.py or quantile_sketch.py). They
+    are held in a small (n_zones, 2) array indexed by an integer zone
+    code, so every point gathers its own pair with edges[codes] and the
+    class is two comparisons:
+        1 low          prob <= low-mod
+        2 moderate     low-mod < prob <= mod-con
+        3 considerable prob > mod-con
+    Points without a finite probability get class 0 (no forecast).
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+#%%
+BINS_DIR = Path(__file__).parent
+TEXT_FCST = np.array(["", "low", "moderate", "considerable"], dtype=object)
+
+
+def zone_key(zone):
+    # ecozone names are underscored in the bins files
+    return str(zone).replace(" ", "_")
+
+
+def edge_table(zones, bin_mode="nationwide", bins_dir=BINS_DIR):
+    """
+    Edges of every zone as an array with one row per zone code.
+    Zones missing from all_ecozone_bins.csv use the nationwide edges.
+    Output: ({zone: code}, (n_zones, 2) float array)
+    """
+    nationwide = pd.read_csv(Path(bins_dir) / "nationwide_bins.csv")
+    national = np.array([nationwide["low-mod"].values[0], nationwide["mod-con"].values[0]], dtype=float)
+
+    codes = {zone: k for k, zone in enumerate(zones)}
+    edges = np.tile(national, (len(zones), 1))
+    if bin_mode == "ecozone":
+        zone_bins = pd.read_csv(Path(bins_dir) / "all_ecozone_bins.csv").dropna(subset=["low", "moderate"])
+        zone_bins = zone_bins.set_index(zone_bins["ecozone"].map(zone_key))
+        for zone, k in codes.items():
+            if zone_key(zone) in zone_bins.index:
+                edges[k] = zone_bins.loc[zone_key(zone), ["low", "moderate"]].to_numpy(dtype=float)
+            else:
+                print(f"No edges for {zone}, using the nationwide edges")
+    elif bin_mode != "nationwide":
+        raise ValueError(f"bin_mode must be 'nationwide' or 'ecozone', not '{bin_mode}'")
+
+    return codes, edges
+
+
+def classify(probs, zone_codes, edges):
+    """
+    Forecast class (uint8) of every point from its zone's edges.
+    """
+    probs = np.asarray(probs, dtype=float)
+    point_edges = edges[np.asarray(zone_codes, dtype=np.intp)]
+    with np.errstate(invalid="ignore"):
+        fcst_class = 1 + (probs > point_edges[:, 0]).astype(np.uint8) + (probs > point_edges[:, 1]).astype(np.uint8)
+
+    return np.where(np.isfinite(probs), fcst_class, 0).astype(np.uint8)
+
+
+def class_text(fcst_class):
+    return TEXT_FCST[np.asarray(fcst_class, dtype=np.intp)]
@@ -9,7 +9,6 @@
 """
 #%%
 import os
-import numpy as np
 import pandas as pd
 import geopandas as gpd
 import json
@@ -23,6 +22,12 @@ import cartopy.feature as cfeature
 from datetime import datetime, timedelta
 from shapely.geometry import Point
 from context import process_dir
+from lda_lookup import load_lookup
+from quantile_sketch import record_forecast
+from datacube import append_day
+from fcst_funcs import write_forecast_cogs, write_forecast_points, load_grid, raster_grid
+from regrid import regrid_forecast
+from category_edges import edge_table, classify, class_text
 
 ##### User Input #####
 date_base = datetime.today()
@@ -32,6 +37,10 @@ d2 = (date_base + timedelta(days=2)).strftime("%Y-%m-%d")
 print(date)
 
 model_select = "hrdps"  # ["rdps", "hrdps"]
+scoring = "rf"  # ["rf", "lookup"] lookup uses the LDA-space tables from lda_lookup.py
+bin_mode = "nationwide"  # ["nationwide", "ecozone"] category edges from nationwide_bins.csv or all_ecozone_bins.csv
+export_gpkg = False  # also write the points as a GPKG for GIS users (slow on the HRDPS grid)
+regrid_method = "box"  # ["box", "nearest", "linear"] points to raster, see regrid.py
 
 #%%
 if str(model_select) == 'rdps':
@@ -44,9 +53,9 @@ elif str(model_select) == 'hrdps':
         model_vars = json.load(f)
 pred_vars = model_vars["predict_vars"]
 
-# read the two required dataframes
-bins = pd.read_csv("nationwide_bins.csv")
-d1_data = pd.read_csv(f"./temp/{model_select}_d1_full.csv")
+# read the required dataframe
+# ecozone points only (eccc_calcs.py), indexed by their position on the full grid
+d1_data = pd.read_csv(f"./temp/{model_select}_d1_full.csv", index_col=0)
 # d1_date = 
 
 # requires variables/functions to loop and generate the pixel
@@ -59,24 +68,8 @@ d1_data = d1_data[~d1_data["ecozone"].isin(["No Ecozone"])]
 ecozones = list(d1_data["ecozone"].unique())
 print(ecozones)
 
-all_text_fcst = ["low", "moderate", "considerable"]
-all_fcst_class = [1, 2, 3]
-def fcst_bins(df, prob):
-    # takes the nationwide bins limits dataframes
-    lower_limit = df["low-mod"].values[0]
-    upper_limit = df["mod-con"].values[0]
-
-    if prob <= lower_limit:
-        text_fcst = "low"
-        fcst_class = 1
-    elif lower_limit < prob <= upper_limit:
-        text_fcst = "moderate"
-        fcst_class = 2
-    else: 
-        text_fcst = "considerable"
-        fcst_class = 3
-
-    return text_fcst, fcst_class 
+# category edges of every zone, gathered per point by zone code
+zone_codes, zone_edges = edge_table(ecozones, bin_mode)
 
 def find_files(directory, substring):
     """
@@ -114,13 +107,16 @@ for zone in ecozones:
     # Load model ONCE per ecozone
     # ----------------------------------------------
     file_zone = zone.replace(" ", "_")
-    file_pred_model = find_files(
-        f"{process_dir}FINAL_MODELS",
-        file_zone
-    )
+    if scoring == "lookup":
+        lookup = load_lookup(zone)
+    else:
+        file_pred_model = find_files(
+            f"{process_dir}FINAL_MODELS",
+            file_zone
+        )
 
-    lda_model = joblib.load(file_pred_model[0])    
-    rf_model = joblib.load(file_pred_model[1])
+        lda_model = joblib.load(file_pred_model[0])    
+        rf_model = joblib.load(file_pred_model[1])
 
     # ----------------------------------------------
     # Subset data 
@@ -132,52 +128,48 @@ for zone in ecozones:
     # ----------------------------------------------
     X = d1_zone[pred_vars].to_numpy()
 
-    fitted = lda_model.transform(X)
-    probs = rf_model.predict_proba(fitted)
+    if scoring == "lookup":
+        # one matrix multiply + bilinear table lookup
+        probs = lookup.predict_proba(X)
+    else:
+        fitted = lda_model.transform(X)
+        probs = rf_model.predict_proba(fitted)
     
     # for now just grab the last probability (for dry lightning)
     probs = probs[:, -1]
 
     # ----------------------------------------------
-    # STEP 3: Vectorized geometry creation
+    # STEP 2: Collect the zone's points (classified after the loop)
     # ----------------------------------------------
-    geometries = gpd.GeoSeries(
-        gpd.points_from_xy(d1_zone["lon"], d1_zone["lat"]),
-        index=d1_zone.index,
-        crs="EPSG:4326"
-    )
+    records.append(pd.DataFrame({
+        "id": d1_zone.index,
+        "name": f"{zone}_fcst",
+        "latitude": d1_zone["lat"].to_numpy(),
+        "longitude": d1_zone["lon"].to_numpy(),
+        "probability": probs,
+        "zone_code": zone_codes[zone]
+    }))
 
-    # ----------------------------------------------
-    # STEP 2 & 4: Build rows in Python list
-    # ----------------------------------------------
-    for i, (idx, row) in enumerate(d1_zone.iterrows()):
-        prob = probs[i]
-        geom = geometries.loc[idx]
-
-        # Forecast classification row
-        text_fcst, fcst_class = fcst_bins(bins, prob)
-
-        records.append({
-            "id": idx,
-            "name": f"{zone}_fcst",
-            "latitude": row["lat"],
-            "longitude": row["lon"],
-            "probability": prob,
-            "text": text_fcst,
-            "class": fcst_class,
-            "geometry": geom
-        })
+# --------------------------------------------------
+# STEP 3: Classify every point with its zone's edges in one pass
+# --------------------------------------------------
+points = pd.concat(records, ignore_index=True)
+points["class"] = classify(points["probability"], points["zone_code"], zone_edges)
+points["text"] = class_text(points["class"])
 
 # --------------------------------------------------
 # STEP 4: Create the GeoDataFrame 
 # --------------------------------------------------
 gdf = gpd.GeoDataFrame(
-    records,
-    geometry="geometry",
+    points[["id", "name", "latitude", "longitude", "probability", "text", "class"]],
+    geometry=gpd.points_from_xy(points["longitude"], points["latitude"]),
     crs="EPSG:4326"
 )
 
-gdf.to_file(f"./RESOURCES/d1_{date}_lightning_forecast.gpkg", driver="GPKG")
+# GeoParquet points (GPKG only when export_gpkg)
+write_forecast_points(gdf, f"./RESOURCES/d1_{date}_lightning_forecast.parquet", export_gpkg)
+# keep the day's probability distribution per zone for threshold calibration
+record_forecast(gdf, date, "d1")
 
 print(gdf)
 
@@ -194,182 +186,40 @@ CLASS_COLORS = {
     3: "#d6820b"    # Considerable
 }
 
-gdf = gdf[
-    gdf.geometry.notna() &
-    (~gdf.geometry.is_empty)
-].copy()
-
 # NRCan Projection information
 plot_projection = ccrs.PlateCarree()  # 3978
-target_crs = "EPSG:3978"
-gdf_proj = gdf.to_crs(target_crs)
-
-gdf_proj = gdf_proj[
-    gdf_proj.geometry.notna() &
-    (~gdf_proj.geometry.is_empty)
-].copy()
-
-if gdf_proj.empty:
-    raise ValueError("gdf_proj is empty — no valid geometries to rasterize")
 
 # ----------
 # BEGIN MAPPING
 # ----------
-import rasterio
-from rasterio.features import rasterize
-from rasterio.transform import from_origin
-from shapely.validation import make_valid
-
-# -------------------------------------
-# Raster grid definition (keep base projection: EPSG:4326)
-# -------------------------------------
-# Ensure CRS is defined
-if gdf.crs is None:
-    gdf = gdf.set_crs("EPSG:4326")
-
-# Make geometries valid
-gdf["geometry"] = gdf.geometry.apply(
-    lambda g: make_valid(g) if g is not None else None
-)
-
-# Drop invalid / empty / non-finite points
-gdf = gdf[
-    gdf.geometry.notna() &
-    (~gdf.geometry.is_empty) &
-    np.isfinite(gdf.geometry.x) &
-    np.isfinite(gdf.geometry.y) &
-    np.isfinite(gdf["probability"])
-].copy()
-
-# Enforce class column cleanliness (optional but recommended)
-gdf = gdf[
-    gdf["class"].notna() &
-    np.isfinite(gdf["class"])
-].copy()
-
-gdf["class"] = gdf["class"].astype("uint8")
-
-target_crs = "EPSG:4326"
-gdf_proj = gdf  # No reprojection to keep base projection
-
-# Drop any points that failed reprojection (though none since no reprojection)
-gdf_proj = gdf_proj[
-    np.isfinite(gdf_proj.geometry.x) &
-    np.isfinite(gdf_proj.geometry.y)
-].copy()
-
-if gdf_proj.empty:
-    raise ValueError("No valid points remain after filtering")
-
-# Manual bounds from finite geometry bounds
-bounds = gdf_proj.geometry.bounds
-bounds = bounds.replace([np.inf, -np.inf], np.nan).dropna()
-
-if bounds.empty:
-    raise ValueError("No finite geometry bounds available")
-
-xmin = bounds.minx.min()
-ymin = bounds.miny.min()
-xmax = bounds.maxx.max()
-ymax = bounds.maxy.max()
-
 from rasterio.transform import from_origin
 
-resolution = 0.09  # Approximately 10 km in degrees (since EPSG:4326 is geographic)
-
-width  = int(np.ceil((xmax - xmin) / resolution))
-height = int(np.ceil((ymax - ymin) / resolution))
-
-transform = from_origin(xmin, ymax, resolution, resolution)
-
-prob_shapes = (
-    (geom, float(val))
-    for geom, val in zip(
-        gdf_proj.geometry,
-        gdf_proj["probability"]
-    )
+# fixed raster over the model grid, every point (all ecozone points, a stable
+# set so the cached weights are reused) regridded with sparse weights
+# (regrid.py) and classed with the edges of each cell's zone
+spec = raster_grid(load_grid(model_select))
+transform = from_origin(spec["west"], spec["north"], spec["resolution"], spec["resolution"])
+
+prob_raster, class_raster = regrid_forecast(
+    points["latitude"].to_numpy(),
+    points["longitude"].to_numpy(),
+    points["probability"].to_numpy(),
+    points["zone_code"].to_numpy(),
+    zone_edges,
+    spec,
+    regrid_method
 )
 
-prob_raster = rasterize(
-    prob_shapes,
-    out_shape=(height, width),
-    transform=transform,
-    fill=np.nan,
-    dtype="float32"
-)
-
-class_shapes = (
-    (geom, cls)
-    for geom, cls in zip(
-        gdf_proj.geometry,
-        gdf_proj["class"]
-    )
-)
-
-class_raster = rasterize(
-    class_shapes,
-    out_shape=(height, width),
-    transform=transform,
-    fill=0,
-    dtype="uint8"
-)
+# stack the day into the season datacube (DATACUBE/{model}_d1_{year}.nc)
+append_day(date, "d1", prob_raster, class_raster, spec, model_select)
 
 output_tif = f"./RESOURCES/d1_{date}_lightning_forecast.tif"
 today_tif = f"./RESOURCES/d1.tif"
 
-with rasterio.open(
-    output_tif,
-    "w",
-    driver="GTiff",
-    height=height,
-    width=width,
-    count=2,
-    crs=target_crs,
-    transform=transform,
-    dtype="float32",
-    nodata=np.nan,
-    compress="lzw"
-) as dst:
-
-    dst.write(prob_raster, 1)
-    dst.write(class_raster.astype("float32"), 2)
-
-    dst.set_band_description(1, "Dry Lightning Probability")
-    dst.set_band_description(2, "Forecast Class")
-
-    dst.update_tags(
-        CLASS_1="Low",
-        CLASS_2="Moderate",
-        CLASS_3="Considerable",
-        CRS="EPSG:4326"
-    )
-
-with rasterio.open(
-    today_tif,
-    "w",
-    driver="GTiff",
-    height=height,
-    width=width,
-    count=2,
-    crs=target_crs,
-    transform=transform,
-    dtype="float32",
-    nodata=np.nan,
-    compress="lzw"
-) as dst:
-
-    dst.write(prob_raster, 1)
-    dst.write(class_raster.astype("float32"), 2)
-
-    dst.set_band_description(1, "Dry Lightning Probability")
-    dst.set_band_description(2, "Forecast Class")
-
-    dst.update_tags(
-        CLASS_1="Low",
-        CLASS_2="Moderate",
-        CLASS_3="Considerable",
-        CRS="EPSG:4326"
-    )
+# cloud-optimized class (uint8) and probability (scaled int16) rasters,
+# the probability goes to *_lightning_probability.tif / d1_probability.tif
+for tif_path in [output_tif, today_tif]:
+    write_forecast_cogs(tif_path, prob_raster, class_raster, transform)
 
 # ----------
 # STATIC MAP
@@ -377,7 +227,7 @@ with rasterio.open(
 fig = plt.figure(figsize=(12, 12))
 ax = plt.axes(projection=plot_projection)
 
-xmin, ymin, xmax, ymax = gdf_proj.total_bounds
+xmin, ymin, xmax, ymax = gdf.total_bounds
 
 ax.set_extent(
     #[xmin, xmax, ymin, ymax],
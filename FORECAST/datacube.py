@@ -0,0 +1,299 @@
+"""
+
+    Forecast archive as one time-stacked datacube per season and lead
+    instead of a GPKG/TIF pair per day.
+
+        DATACUBE/{model}_{lead}_{year}.nc    (time, lat, lon) on the fixed 0.09 degree
+                                              raster of fcst_funcs.raster_grid
+            probability   int16, scale 1e-4 (fill -1 = no forecast)
+            fcst_class    uint8, 0 no forecast, 1 low, 2 moderate, 3 considerable
+
+    daily_fcst.py / d1_daily_fcst.py append each day (a rerun of a day
+    overwrites its slice). The time dimension is unlimited and the
+    variables are chunked in small time x tile blocks and deflated, so an
+    append only touches one block row while a point time series or a
+    window over a few days reads a handful of chunks rather than every
+    daily file.
+
+    Retention / compaction (run this file, e.g. once a week):
+        - finished seasons are rewritten sorted by time with longer time
+          chunks (COMPACT_CHUNKS, faster point time series)
+        - cubes older than RETAIN_SEASONS seasons are deleted
+        - per-day GPKG/TIF files in RESOURCES older than RETAIN_DAYS are
+          deleted once their day is in the cube (the VALIDATE readers fall
+          back to the cube for those days, file_funcs.forecast_cube_day)
+
+    NetCDF4 rather than Zarr: xarray/netCDF4 are already used for the
+    climatology and hindcast cubes and netCDF4 appends in place along an
+    unlimited dimension.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from fcst_funcs import PROB_SCALE, PROB_FILL, pack_probability
+
+#%%
+CUBE_DIR = Path(__file__).parent / "DATACUBE"
+RESOURCES_DIR = Path(__file__).parent / "RESOURCES"
+APPEND_CHUNKS = (8, 128, 128)  # time, lat, lon while the season is being written
+COMPACT_CHUNKS = (64, 64, 64)  # after compaction
+RETAIN_SEASONS = 10
+RETAIN_DAYS = 30
+EPOCH = datetime(1970, 1, 1)
+LEAD_DAYS = {"d0": 0, "d1": 1}
+
+
+def cube_path(lead, year, model="hrdps", cube_dir=CUBE_DIR):
+    return Path(cube_dir) / f"{model}_{lead}_{year}.nc"
+
+
+def day_number(date):
+    return (datetime.strptime(date, "%Y-%m-%d") - EPOCH).days
+
+
+def cell_index(spec, lat, lon):
+    # row / column of the cell containing each point
+    row = np.floor((spec["north"] - np.asarray(lat, dtype=float)) / spec["resolution"]).astype(np.intp)
+    col = np.floor((np.asarray(lon, dtype=float) - spec["west"]) / spec["resolution"]).astype(np.intp)
+    return row, col
+
+
+def cube_spec(path):
+    import netCDF4
+
+    with netCDF4.Dataset(path) as nc:
+        return {"west": float(nc.west), "north": float(nc.north), "resolution": float(nc.resolution),
+                "width": len(nc.dimensions["lon"]), "height": len(nc.dimensions["lat"])}
+
+
+#%%
+def create_cube(path, spec, lead, model="hrdps", chunks=APPEND_CHUNKS):
+    """
+    Empty cube with an unlimited time dimension on the raster spec.
+    """
+    import netCDF4
+    from fcst_funcs import raster_coords
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(str(path) + ".tmp")
+    lats, lons = raster_coords(spec)
+    chunks = (chunks[0], min(chunks[1], spec["height"]), min(chunks[2], spec["width"]))
+
+    with netCDF4.Dataset(tmp_path, "w", format="NETCDF4") as nc:
+        nc.createDimension("time", None)
+        nc.createDimension("lat", spec["height"])
+        nc.createDimension("lon", spec["width"])
+
+        for name in ["time", "valid_time"]:
+            var = nc.createVariable(name, "i4", ("time",))
+            var.units = "days since 1970-01-01"
+            var.calendar = "standard"
+        nc.createVariable("lat", "f8", ("lat",))[:] = lats
+        nc.createVariable("lon", "f8", ("lon",))[:] = lons
+        nc["lat"].units = "degrees_north"
+        nc["lon"].units = "degrees_east"
+
+        prob = nc.createVariable("probability", "i2", ("time", "lat", "lon"), zlib=True, complevel=4,
+                                 shuffle=True, chunksizes=chunks, fill_value=PROB_FILL)
+        prob.scale_factor = PROB_SCALE
+        prob.add_offset = 0.0
+        prob.long_name = "dry lightning probability"
+        fcst_class = nc.createVariable("fcst_class", "u1", ("time", "lat", "lon"), zlib=True, complevel=4,
+                                       chunksizes=chunks, fill_value=False)
+        fcst_class.long_name = "0 no forecast, 1 low, 2 moderate, 3 considerable"
+
+        nc.lead = lead
+        nc.model = model
+        nc.valid = "12 UTC valid_time to 12 UTC the next day"
+        nc.compacted = 0
+        for key in ["west", "north", "resolution"]:
+            setattr(nc, key, spec[key])
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def append_day(date, lead, prob, fcst_class, spec, model="hrdps", cube_dir=CUBE_DIR):
+    """
+    Write one day's probability / class rasters into the season cube.
+    A day already in the cube is overwritten.
+    """
+    import netCDF4
+
+    path = cube_path(lead, date[:4], model, cube_dir)
+    if not path.exists():
+        create_cube(path, spec, lead, model)
+    elif cube_spec(path) != spec:
+        raise ValueError(f"{path} is on a different raster than {spec}")
+
+    day = day_number(date)
+    with netCDF4.Dataset(path, "a") as nc:
+        nc.set_auto_maskandscale(False)
+        days = nc["time"][:]
+        existing = np.flatnonzero(days == day)
+        k = int(existing[0]) if len(existing) else len(days)
+
+        nc["time"][k] = day
+        nc["valid_time"][k] = day + LEAD_DAYS[lead]
+        nc["probability"][k, :, :] = pack_probability(prob)
+        nc["fcst_class"][k, :, :] = np.asarray(fcst_class, dtype=np.uint8)
+        if len(days) and day < days.max():
+            nc.compacted = 0  # out of order, sorted again at compaction
+
+    return path
+
+
+#%%
+def season_paths(start, end, lead, model="hrdps", cube_dir=CUBE_DIR):
+    years = range(int(start[:4]), int(end[:4]) + 1)
+    return [p for p in (cube_path(lead, year, model, cube_dir) for year in years) if p.exists()]
+
+
+def read_point(lat, lon, start, end, lead="d0", model="hrdps", cube_dir=CUBE_DIR):
+    """
+    Time series of probability and class at the cell containing (lat, lon).
+    Output: DataFrame with time, valid_time, probability, fcst_class
+    """
+    import xarray as xr
+
+    series = []
+    for path in season_paths(start, end, lead, model, cube_dir):
+        row, col = cell_index(cube_spec(path), lat, lon)
+        with xr.open_dataset(path) as ds:
+            if not (0 <= row < ds.sizes["lat"] and 0 <= col < ds.sizes["lon"]):
+                raise ValueError(f"({lat}, {lon}) is outside the forecast raster")
+            point = ds.isel(lat=int(row), lon=int(col)).sortby("time").sel(time=slice(start, end))
+            series.append(point[["valid_time", "probability", "fcst_class"]].to_dataframe().reset_index())
+
+    if not series:
+        return pd.DataFrame(columns=["time", "valid_time", "probability", "fcst_class"])
+    return pd.concat(series, ignore_index=True)[["time", "valid_time", "probability", "fcst_class"]]
+
+
+def read_window(start, end, lead="d0", bbox=None, model="hrdps", cube_dir=CUBE_DIR):
+    """
+    Every day between start and end (inclusive, YYYY-MM-DD), optionally
+    cut to bbox = (west, south, east, north). Output: xarray Dataset
+    """
+    import xarray as xr
+
+    windows = []
+    for path in season_paths(start, end, lead, model, cube_dir):
+        with xr.open_dataset(path) as ds:
+            ds = ds.sortby("time").sel(time=slice(start, end))
+            if bbox is not None:
+                west, south, east, north = bbox
+                ds = ds.sel(lat=slice(north, south), lon=slice(west, east))
+            windows.append(ds.load())
+
+    if not windows:
+        return None
+    return xr.concat(windows, dim="time") if len(windows) > 1 else windows[0]
+
+
+#%%
+def compact(path, chunks=COMPACT_CHUNKS):
+    """
+    Rewrite a cube sorted by time, one slice per day, with larger time chunks.
+    """
+    import netCDF4
+
+    path = Path(path)
+    spec = cube_spec(path)
+    with netCDF4.Dataset(path) as nc:
+        nc.set_auto_maskandscale(False)
+        lead, model = nc.lead, nc.model
+        days = nc["time"][:]
+        # keep the last write of a day, in date order
+        _, last = np.unique(days[::-1], return_index=True)
+        order = (len(days) - 1 - last)
+        n_days = len(order)
+        chunks = (max(1, min(chunks[0], n_days)), chunks[1], chunks[2])
+
+        tmp_path = Path(str(path) + ".compact")
+        create_cube(tmp_path, spec, lead, model, chunks)
+        with netCDF4.Dataset(tmp_path, "a") as out:
+            out.set_auto_maskandscale(False)
+            out["time"][:] = days[order]
+            out["valid_time"][:] = nc["valid_time"][:][order]
+            for name in ["probability", "fcst_class"]:
+                for k, src in enumerate(order):
+                    out[name][k, :, :] = nc[name][src, :, :]
+            out.compacted = 1
+
+    os.replace(tmp_path, path)
+    print(f"Compacted {path} ({n_days} days)")
+    return path
+
+
+def cube_days(path):
+    import netCDF4
+
+    with netCDF4.Dataset(path) as nc:
+        return {(EPOCH + timedelta(days=int(d))).strftime("%Y-%m-%d") for d in nc["time"][:]}
+
+
+def apply_retention(lead="d0", model="hrdps", today=None, retain_seasons=RETAIN_SEASONS, retain_days=RETAIN_DAYS,
+                    cube_dir=CUBE_DIR, resources_dir=RESOURCES_DIR):
+    """
+    Compact finished seasons, drop seasons past retain_seasons and remove
+    per-day GPKG/TIF files older than retain_days that are in the cube.
+    """
+    import netCDF4
+
+    today = today or datetime.today().strftime("%Y-%m-%d")
+    year = int(today[:4])
+
+    for path in sorted(Path(cube_dir).glob(f"{model}_{lead}_*.nc")):
+        season = int(path.stem.split("_")[-1])
+        if season <= year - retain_seasons:
+            os.remove(path)
+            print(f"Removed {path}")
+            continue
+        with netCDF4.Dataset(path) as nc:
+            compacted = int(nc.compacted)
+        if season < year and not compacted:
+            compact(path)
+
+    if retain_days is None:
+        return
+    cutoff = datetime.strptime(today, "%Y-%m-%d") - timedelta(days=retain_days)
+    archived = {}
+    for path in sorted(Path(resources_dir).glob(f"{lead}_*_lightning_*")):
+        date = path.name.split("_")[1]
+        try:
+            day = datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            continue
+        if day >= cutoff:
+            continue
+        if date[:4] not in archived:
+            cube = cube_path(lead, date[:4], model, cube_dir)
+            archived[date[:4]] = cube_days(cube) if cube.exists() else set()
+        if date in archived[date[:4]]:
+            os.remove(path)
+            print(f"Removed {path}")
+
+
+if __name__ == "__main__":
+    ##### USER INPUT #####
+    model = "hrdps"
+    leads = ("d0", "d1")
+    retain_seasons = RETAIN_SEASONS
+    retain_days = RETAIN_DAYS  # None keeps every daily GPKG/TIF
+    ##### END USER INPUT #####
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    for lead in leads:
+        apply_retention(lead, model, retain_seasons=retain_seasons, retain_days=retain_days)
@@ -23,12 +23,11 @@ import numpy as np
 import pandas as pd
 import geopandas as gpd
 import json
-import metpy.calc as mpcalc
-from metpy.units import units
 
 from shapely.geometry import Point
 from datetime import datetime
 from file_funcs import clean_dir, set_filenames, download_data, clean_dir_d1
+from fcst_funcs import k_index, temp_diff, TTI, get_lcl, ecozone_mask
 
 ##### User Input #####
 date_base = datetime.today()
@@ -69,44 +68,18 @@ for index, row in all_files.iterrows():
 
     download_data(file_url, output_file, save_dir)
 
-#%%
-def k_index(T500, dewpdep700, T850, dewpdep850):
-    # an odd selection of variables from the datamart
-    # though can still calculate k-index
-    # variables will be pre-converted to numpy
-
-    # get dewpoint 850
-    Td850 = T850 - dewpdep850
-    K = (T850 - T500) + Td850 - (dewpdep700)
-
-    return K
-
-def temp_diff(T1, T2):
-    return T1 - T2
-
-def TTI(T850, dewpdep850, T500):
-    # calculate the total totals
-    Td850 = T850 - dewpdep850
-    totals = T850 + Td850 - (2 * T500)
-
-    return totals
-
-def get_lcl(p, T, dewdep):
-    # get the lcl using metpy but need to get dewpoint
-    Td = T - dewdep
-    print("Adding Units...")
-    p = p * units("hPa")
-    T = T * units("degC")
-    Td = Td * units("degC")
-    lcl = mpcalc.lcl(p, T, Td)[0].magnitude
-
-    return lcl
-
 # %%
 # load the grid grid stuff from the utils folder
 # this will hold all future variables 
 gdf = pd.read_csv(f"../UTILS/MODEL/grid_{model_select}_ecozones.csv")
 
+# keep only the points inside an ecozone, every field is gathered onto them
+# as it is decoded so the indices and the csv skip the ocean and the US
+# (the index stays the position on the full grid)
+mask = ecozone_mask(model_select)
+in_zone = np.flatnonzero(mask)
+gdf = gdf.iloc[in_zone].copy()
+
 # ensure GeoDataFrame
 if "geometry" not in gdf.columns:
     gdf = gpd.GeoDataFrame(
@@ -140,14 +113,14 @@ for base_var, var_name in model_vars["wx_vars"].items():
     values = ds[data_var].values.flatten()
 
     # safety check
-    if len(values) != len(gdf):
+    if len(values) != len(mask):
         raise ValueError(
             f"Grid size mismatch for {var_name}: "
-            f"{len(values)} values vs {len(gdf)} grid points"
+            f"{len(values)} values vs {len(mask)} grid points"
         )
 
-    # append column
-    gdf[base_var] = values
+    # append column (ecozone points only)
+    gdf[base_var] = values[in_zone]
 
 #%% -------------------------------------------------------------------
 # Final clean-up
@@ -246,6 +219,13 @@ for index, row in all_files.iterrows():
 # this will hold all future variables 
 gdf = pd.read_csv(f"../UTILS/MODEL/grid_{model_select}_ecozones.csv")
 
+# keep only the points inside an ecozone, every field is gathered onto them
+# as it is decoded so the indices and the csv skip the ocean and the US
+# (the index stays the position on the full grid)
+mask = ecozone_mask(model_select)
+in_zone = np.flatnonzero(mask)
+gdf = gdf.iloc[in_zone].copy()
+
 # ensure GeoDataFrame
 if "geometry" not in gdf.columns:
     gdf = gpd.GeoDataFrame(
@@ -288,14 +268,14 @@ for base_var, var_name in model_vars["wx_vars"].items():
 
     values = values.flatten()
     # safety check
-    if len(values) != len(gdf):
+    if len(values) != len(mask):
         raise ValueError(
             f"Grid size mismatch for {var_name}: "
-            f"{len(values)} values vs {len(gdf)} grid points"
+            f"{len(values)} values vs {len(mask)} grid points"
         )
 
-    # append column
-    gdf[base_var] = values
+    # append column (ecozone points only)
+    gdf[base_var] = values[in_zone]
 
 #%% -------------------------------------------------------------------
 # Final clean-up
@@ -0,0 +1,369 @@
+"""
+
+    Forecast pipeline steps as functions (ingest -> indices -> scoring -> raster)
+    so they can run for any date from local GRIB files, not only for today's
+    download in eccc_calcs.py / daily_fcst.py. Used by hindcast.py.
+
+    write_forecast_cogs writes the forecast rasters as Cloud-Optimized
+    GeoTIFFs (256 px tiles, overviews, ZSTD or DEFLATE with predictor):
+        {lead}_{date}_lightning_forecast.tif      class, uint8 (0 = no forecast)
+        {lead}_{date}_lightning_probability.tif   probability, int16 scaled by 1e-4 (nodata -1)
+
+    write_forecast_points writes the forecast points as GeoParquet built
+    straight from the coordinate arrays with pyarrow (no OGR, no shapely),
+    with the GPKG as an optional export for GIS users:
+        {lead}_{date}_lightning_forecast.parquet
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+import json
+import difflib
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from functools import lru_cache
+
+from context import process_dir, utils_dir
+
+#%%
+FORECAST_DIR = Path(__file__).parent
+MODEL_DIR = Path(process_dir) / "FINAL_MODELS"
+RESOLUTION = 0.09  # raster resolution in degrees (same as daily_fcst.py)
+PROB_SCALE = 1e-4  # probability stored as int16 * PROB_SCALE
+PROB_FILL = -1
+COG_BLOCKSIZE = 256
+COG_CODECS = ["ZSTD", "DEFLATE"]  # first one the GDAL build supports
+CLASS_TAGS = {"CLASS_0": "No forecast", "CLASS_1": "Low", "CLASS_2": "Moderate", "CLASS_3": "Considerable"}
+DATAMART_URL = "https://dd.weather.gc.ca/today/"
+
+
+def load_model_vars(model="hrdps"):
+    with open(FORECAST_DIR / f"{model}_vars.json", "r") as f:
+        return json.load(f)
+
+
+def load_grid(model="hrdps", masked=False):
+    # lat, lon and ecozone of every model grid point, in GRIB order
+    # (masked: only the points inside an ecozone, indexed by their grid position)
+    grid = pd.read_csv(f"{utils_dir}MODEL/grid_{model}_ecozones.csv", usecols=["lat", "lon", "ecozone"])
+    if masked:
+        grid = grid[ecozone_mask(model)]
+    return grid
+
+
+def ecozone_mask(model="hrdps"):
+    """
+    Boolean mask of the grid points inside an ecozone, in GRIB order.
+    Written by gridded_eccc_ecozones.py next to the grid csv, rebuilt here
+    when it is missing or older than the csv.
+    """
+    grid_path = Path(f"{utils_dir}MODEL/grid_{model}_ecozones.csv")
+    mask_path = grid_path.with_name(f"grid_{model}_ecozone_mask.npy")
+    if mask_path.exists() and os.path.getmtime(mask_path) >= os.path.getmtime(grid_path):
+        return np.load(mask_path)
+
+    mask = (pd.read_csv(grid_path, usecols=["ecozone"])["ecozone"] != "No Ecozone").to_numpy()
+    tmp_path = Path(str(mask_path) + ".tmp.npy")
+    np.save(tmp_path, mask)
+    os.replace(tmp_path, mask_path)
+    print(f"Saved {mask.sum()} of {len(mask)} grid points to {mask_path}")
+
+    return mask
+
+
+#%%
+# sounding indices from the model fields
+def k_index(T500, dewpdep700, T850, dewpdep850):
+    # an odd selection of variables from the datamart
+    # though can still calculate k-index
+    Td850 = T850 - dewpdep850
+    return (T850 - T500) + Td850 - (dewpdep700)
+
+
+def temp_diff(T1, T2):
+    return T1 - T2
+
+
+def TTI(T850, dewpdep850, T500):
+    # calculate the total totals
+    Td850 = T850 - dewpdep850
+    return T850 + Td850 - (2 * T500)
+
+
+def get_lcl(p, T, dewdep):
+    # get the lcl using metpy but need to get dewpoint
+    import metpy.calc as mpcalc
+    from metpy.units import units
+
+    Td = T - dewdep
+    return mpcalc.lcl(p * units("hPa"), T * units("degC"), Td * units("degC"))[0].magnitude
+
+
+#%%
+def local_files(model, date, horizon, archive_dir):
+    """
+    set_filenames for a past date with every file looked up in a local
+    mirror of the datamart: {archive_dir}/{YYYYMMDD}/{datamart path}/{file}
+    or directly in {archive_dir}/{file}.
+    """
+    from file_funcs import set_filenames
+
+    files = set_filenames(model, date, horizon)
+    day_dir = Path(archive_dir) / date.replace("-", "")
+
+    paths = []
+    for _, row in files.iterrows():
+        mirrored = day_dir / row["extension"].replace(DATAMART_URL, "") / row["file"]
+        paths.append(mirrored if mirrored.exists() else Path(archive_dir) / row["file"])
+    files["local_path"] = paths
+
+    return files
+
+
+def read_fields(files, grid, model_vars, mask=None):
+    """
+    One column per wx_vars entry read from the GRIB files onto the grid
+    (same order as the flattened GRIB fields, like eccc_calcs.py).
+    With the ecozone mask only the masked points are gathered, grid must
+    then be load_grid(model, masked=True).
+    """
+    index = np.flatnonzero(mask) if mask is not None else None
+    import xarray as xr
+
+    fields = grid.copy()
+    for base_var, var_name in model_vars["wx_vars"].items():
+        matches = files[files["file"].str.contains(var_name)]
+        if matches.empty or not Path(matches.iloc[0]["local_path"]).exists():
+            print(f"No GRIB file found for {var_name}, skipping")
+            continue
+
+        with xr.open_dataset(matches.iloc[0]["local_path"], engine="cfgrib") as ds:
+            values = ds[list(ds.data_vars)[0]].values
+        # some fields (SWEAT) come with an extra leading dimension
+        while values.ndim > 2:
+            values = values[0]
+        values = values.ravel()
+
+        n_grid = len(mask) if mask is not None else len(fields)
+        if len(values) != n_grid:
+            raise ValueError(f"Grid size mismatch for {var_name}: {len(values)} values vs {n_grid} grid points")
+        fields[base_var] = values[index] if index is not None else values
+
+    return fields
+
+
+def derive_indices(fields, model_vars):
+    """
+    Unit conversions, the derived indices and the predict_vars names (eccc_calcs.py).
+    """
+    fields = fields.copy()
+    for col in ["temperature", "T500", "T850"]:
+        fields[col] = fields[col] - 273.15
+    fields["press"] = fields["press"] / 100
+
+    fields["dT850-500"] = temp_diff(fields["T850"], fields["T500"])
+    fields["total_totals"] = TTI(fields["T850"], fields["dTTd850"], fields["T500"])
+    fields["lcl"] = get_lcl(fields["press"].values, fields["temperature"].values, fields["dTTdSfc"].values)
+    fields["K_index"] = k_index(fields["T500"], fields["dTTd700"], fields["T850"], fields["dTTd850"])
+
+    # rename columns that only differ from the predict_vars by case or spelling
+    for var in model_vars["predict_vars"]:
+        if var in fields.columns:
+            continue
+        matches = difflib.get_close_matches(var, list(fields.columns)) or \
+            difflib.get_close_matches(var.upper(), list(fields.columns))
+        fields = fields.rename(columns={matches[0]: var})
+
+    return fields
+
+
+#%%
+@lru_cache(maxsize=None)
+def zone_model(zone, scoring="rf", model_dir=str(MODEL_DIR)):
+    """
+    predict_proba function of a zone, loaded once per process.
+    """
+    name = zone.replace(" ", "_")
+    if scoring == "lookup":
+        from lda_lookup import LdaLookup
+        return LdaLookup.load(Path(model_dir) / "LOOKUP" / f"{name}_lookup.npz").predict_proba
+
+    import joblib
+    lda = joblib.load(Path(model_dir) / f"{name}_lda_trained.joblib")
+    rf = joblib.load(Path(model_dir) / f"{name}_rf_trained.joblib")
+    return lambda X: rf.predict_proba(lda.transform(X))
+
+
+def score_points(fields, pred_vars, scoring="rf", bin_mode="nationwide", model_dir=MODEL_DIR):
+    """
+    Dry lightning probability and forecast class of every grid point in an ecozone.
+    """
+    from category_edges import edge_table, classify
+
+    points = fields[fields["ecozone"] != "No Ecozone"]
+    zones = list(points["ecozone"].unique())
+    zone_codes, zone_edges = edge_table(zones, bin_mode)
+
+    X = points[pred_vars].to_numpy(dtype=float)
+    zone_names = points["ecozone"].to_numpy()
+    probs = np.full(len(points), np.nan)
+    for zone in zones:
+        rows = np.flatnonzero(zone_names == zone)
+        probs[rows] = zone_model(zone, scoring, str(model_dir))(X[rows])[:, -1]
+
+    codes = points["ecozone"].map(zone_codes).to_numpy()
+    return pd.DataFrame({
+        "lat": points["lat"].to_numpy(),
+        "lon": points["lon"].to_numpy(),
+        "ecozone": points["ecozone"].to_numpy(),
+        "probability": probs,
+        "class": classify(probs, codes, zone_edges),
+    })
+
+
+#%%
+def raster_grid(grid, resolution=RESOLUTION):
+    """
+    Fixed raster over the bounds of the model grid so every day lands on the same cells.
+    Output: dict with west, north, resolution, width, height
+    """
+    west, east = grid["lon"].min(), grid["lon"].max()
+    south, north = grid["lat"].min(), grid["lat"].max()
+    return {
+        "west": float(west),
+        "north": float(north),
+        "resolution": resolution,
+        "width": int(np.ceil((east - west) / resolution)) + 1,
+        "height": int(np.ceil((north - south) / resolution)) + 1,
+    }
+
+
+def raster_coords(spec):
+    # cell centre latitudes (north to south) and longitudes
+    res = spec["resolution"]
+    lats = spec["north"] - res * (np.arange(spec["height"]) + 0.5)
+    lons = spec["west"] + res * (np.arange(spec["width"]) + 0.5)
+    return lats, lons
+
+
+def pack_probability(prob):
+    # float probabilities (NaN = no forecast) to scaled int16
+    prob = np.asarray(prob, dtype=float)
+    packed = np.round(np.clip(prob, 0, 1) / PROB_SCALE)
+    return np.where(np.isfinite(prob), packed, PROB_FILL).astype(np.int16)
+
+
+def probability_path(class_path):
+    # the probability COG next to a class COG: *_lightning_forecast.tif -> *_lightning_probability.tif,
+    # d0.tif -> d0_probability.tif
+    path = Path(class_path)
+    if path.stem.endswith("_lightning_forecast"):
+        return str(path.with_name(path.stem.replace("_lightning_forecast", "_lightning_probability") + path.suffix))
+    return str(path.with_name(f"{path.stem}_probability{path.suffix}"))
+
+
+def write_cog(path, data, transform, nodata, description, resampling="nearest", scale=None, tags=None,
+              crs="EPSG:4326"):
+    """
+    One band Cloud-Optimized GeoTIFF, written to a temporary file and moved into place.
+    """
+    from rasterio.io import MemoryFile
+    from rasterio.shutil import copy as rio_copy
+
+    profile = {"driver": "GTiff", "height": data.shape[0], "width": data.shape[1], "count": 1,
+               "dtype": data.dtype.name, "crs": crs, "transform": transform, "nodata": nodata}
+    tmp_path = f"{path}.tmp.tif"
+
+    with MemoryFile() as mem:
+        with mem.open(**profile) as dst:
+            dst.write(data, 1)
+            dst.set_band_description(1, description)
+            if scale is not None:
+                dst.scales = (scale,)
+                dst.offsets = (0.0,)
+            dst.update_tags(CRS=crs, **(tags or {}))
+
+        with mem.open() as src:
+            for codec in COG_CODECS:
+                try:
+                    rio_copy(src, tmp_path, driver="COG", compress=codec, predictor="YES",
+                             blocksize=COG_BLOCKSIZE, overviews="AUTO", overview_resampling=resampling)
+                    break
+                except Exception as e:
+                    print(f"COG with {codec} failed ({e}), trying the next codec")
+            else:
+                raise RuntimeError(f"Could not write {path} with any of {COG_CODECS}")
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_forecast_cogs(class_path, prob_raster, class_raster, transform):
+    """
+    Class (uint8) and probability (scaled int16) COGs of one forecast.
+    Output: (class path, probability path)
+    """
+    prob_path = probability_path(class_path)
+    write_cog(class_path, np.asarray(class_raster, dtype=np.uint8), transform, 0,
+              "Forecast Class", "nearest", tags=CLASS_TAGS)
+    write_cog(prob_path, pack_probability(prob_raster), transform, PROB_FILL,
+              "Dry Lightning Probability", "average", scale=PROB_SCALE)
+
+    return class_path, prob_path
+
+
+#%%
+def point_wkb(lon, lat):
+    """
+    Little-endian WKB points as a pyarrow binary array, built from the arrays
+    (1 byte order + 4 byte type + 2 doubles = 21 bytes per point).
+    """
+    import pyarrow as pa
+
+    wkb = np.empty(len(lon), dtype=[("order", "u1"), ("type", "<u4"), ("x", "<f8"), ("y", "<f8")])
+    wkb["order"] = 1
+    wkb["type"] = 1
+    wkb["x"] = lon
+    wkb["y"] = lat
+    offsets = np.arange(len(lon) + 1, dtype=np.int32) * wkb.dtype.itemsize
+
+    return pa.Array.from_buffers(pa.binary(), len(lon), [None, pa.py_buffer(offsets), pa.py_buffer(wkb.tobytes())])
+
+
+def write_forecast_points(points, path, export_gpkg=False):
+    """
+    Forecast points (daily_fcst.py columns, latitude / longitude) as GeoParquet,
+    and as a GPKG next to it when export_gpkg (points must then be a GeoDataFrame).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = Path(path).with_suffix(".parquet")
+    lon = points["longitude"].to_numpy(dtype=float)
+    lat = points["latitude"].to_numpy(dtype=float)
+
+    columns = points.drop(columns="geometry", errors="ignore")
+    table = pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+    table = table.append_column("geometry", point_wkb(lon, lat))
+
+    # GeoParquet 1.0 metadata, no crs means OGC:CRS84 (lon / lat, same as EPSG:4326)
+    column = {"encoding": "WKB", "geometry_types": ["Point"]}
+    if len(lon):
+        column["bbox"] = [float(lon.min()), float(lat.min()), float(lon.max()), float(lat.max())]
+    geo = {"version": "1.0.0", "primary_column": "geometry", "columns": {"geometry": column}}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"geo": json.dumps(geo).encode()})
+
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+    if export_gpkg:
+        points.to_file(path.with_suffix(".gpkg"), driver="GPKG")
+
+    return path
@@ -0,0 +1,209 @@
+"""
+
+    Hindcast / reforecast of the dry lightning forecast over archived
+    HRDPS analyses.
+
+    Every (date, lead) runs the operational chain on local GRIB files
+    (ingest -> indices -> scoring -> regrid, see fcst_funcs.py / regrid.py) in a
+    process pool and writes
+        HINDCAST/{run}/{lead}/{date}.npz    probability (float32) and class (uint8)
+                                             on the fixed 0.09 degree raster
+    where run = {model}_{scoring}_{bin_mode}_{regrid_method}, so hindcasts
+    with different settings never overwrite or satisfy each other.
+    A day is skipped when its output is newer than its GRIB inputs, the
+    zone models and the category edges, so a rerun only redoes what
+    changed. The days are then stacked into
+        HINDCAST/{run}/{model}_{lead}_{start}_{end}.nc   (time, lat, lon)
+
+    GRIB files are read from ARCHIVE_DIR, laid out as the datamart paths
+    of set_filenames under one folder per day (or all in ARCHIVE_DIR):
+        ARCHIVE/20250715/model_hrdps/continental/2.5km/12/000/20250715T12Z_MSC_HRDPS_..._PT000H.grib2
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from fcst_funcs import (MODEL_DIR, load_model_vars, load_grid, ecozone_mask, local_files, read_fields,
+                        derive_indices, score_points, raster_grid, raster_coords)
+from category_edges import edge_table
+from regrid import regrid_forecast
+
+#%%
+ARCHIVE_DIR = Path(__file__).parent / "ARCHIVE"
+HINDCAST_DIR = Path(__file__).parent / "HINDCAST"
+LEADS = {"d0": "000", "d1": "024"}
+EDGE_FILES = [Path(__file__).parent / "nationwide_bins.csv", Path(__file__).parent / "all_ecozone_bins.csv"]
+
+
+def daterange(start, end):
+    day = datetime.strptime(start, "%Y-%m-%d")
+    while day <= datetime.strptime(end, "%Y-%m-%d"):
+        yield day.strftime("%Y-%m-%d")
+        day += timedelta(days=1)
+
+
+def run_dir(model="hrdps", scoring="rf", bin_mode="nationwide", regrid_method="box", out_dir=HINDCAST_DIR):
+    return Path(out_dir) / f"{model}_{scoring}_{bin_mode}_{regrid_method}"
+
+
+def day_path(date, lead, out_dir=HINDCAST_DIR):
+    # out_dir is a run_dir
+    return Path(out_dir) / lead / f"{date}.npz"
+
+
+def newest_mtime(paths):
+    times = [os.path.getmtime(p) for p in paths if Path(p).exists()]
+    return max(times) if times else 0.0
+
+
+def model_mtime(model_dir=MODEL_DIR):
+    # any retrained model or new edges makes every day stale
+    model_dir = Path(model_dir)
+    return newest_mtime(list(model_dir.glob("*.joblib")) + list(model_dir.glob("LOOKUP/*.npz")) + EDGE_FILES)
+
+
+def up_to_date(out_path, input_paths, models_mtime):
+    if not Path(out_path).exists():
+        return False
+    return os.path.getmtime(out_path) >= max(newest_mtime(input_paths), models_mtime)
+
+
+def hindcast_day(date, lead="d0", model="hrdps", archive_dir=ARCHIVE_DIR, out_dir=HINDCAST_DIR,
+                 scoring="rf", bin_mode="nationwide", force=False, models_mtime=0.0, model_dir=MODEL_DIR,
+                 regrid_method="box"):
+    """
+    Run one forecast day. Returns (date, lead, status).
+    """
+    out_path = day_path(date, lead, run_dir(model, scoring, bin_mode, regrid_method, out_dir))
+    files = local_files(model, date, LEADS[lead], archive_dir)
+    inputs = [p for p in files["local_path"] if Path(p).exists()]
+
+    if not inputs:
+        return date, lead, "no input"
+    if not force and up_to_date(out_path, inputs, models_mtime):
+        return date, lead, "up to date"
+
+    model_vars = load_model_vars(model)
+    # indices and scoring only on the points inside an ecozone
+    grid = load_grid(model, masked=True)
+    fields = derive_indices(read_fields(files, grid, model_vars, ecozone_mask(model)), model_vars)
+    points = score_points(fields, model_vars["predict_vars"], scoring, bin_mode, model_dir)
+
+    # same regridding as daily_fcst.py, weights are cached per grid so built once
+    spec = raster_grid(load_grid(model))
+    zone_codes, zone_edges = edge_table(list(points["ecozone"].unique()), bin_mode)
+    prob, fcst_class = regrid_forecast(points["lat"].to_numpy(), points["lon"].to_numpy(),
+                                       points["probability"].to_numpy(), points["ecozone"].map(zone_codes).to_numpy(),
+                                       zone_edges, spec, regrid_method)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(str(out_path) + ".tmp.npz")
+    np.savez_compressed(tmp_path, probability=prob, fcst_class=fcst_class, **spec)
+    os.replace(tmp_path, out_path)
+
+    return date, lead, "done"
+
+
+def write_cube(start, end, lead="d0", model="hrdps", out_dir=HINDCAST_DIR,
+               scoring="rf", bin_mode="nationwide", regrid_method="box"):
+    """
+    Stack the daily rasters of one run into one netCDF cube (missing days are left out).
+    """
+    import xarray as xr
+
+    out_dir = run_dir(model, scoring, bin_mode, regrid_method, out_dir)
+    dates, probs, classes, spec = [], [], [], None
+    for date in daterange(start, end):
+        path = day_path(date, lead, out_dir)
+        if not path.exists():
+            continue
+        with np.load(path) as f:
+            probs.append(f["probability"])
+            classes.append(f["fcst_class"])
+            spec = {k: f[k].item() for k in ["west", "north", "resolution", "width", "height"]}
+        dates.append(np.datetime64(date))
+
+    if not dates:
+        print(f"No {lead} hindcast days between {start} and {end}")
+        return None
+
+    lats, lons = raster_coords(spec)
+    time = np.array(dates, dtype="datetime64[ns]")
+    offset = np.timedelta64(1 if lead == "d1" else 0, "D")
+    cube = xr.Dataset(
+        {
+            "probability": (("time", "lat", "lon"), np.stack(probs)),
+            "fcst_class": (("time", "lat", "lon"), np.stack(classes)),
+        },
+        coords={"time": time, "valid_time": ("time", time + offset), "lat": lats, "lon": lons},
+        attrs={"lead": lead, "model": model, "resolution": spec["resolution"],
+               "scoring": scoring, "bin_mode": bin_mode, "regrid_method": regrid_method,
+               "valid": "12 UTC valid_time to 12 UTC the next day",
+               "fcst_class": "0 no forecast, 1 low, 2 moderate, 3 considerable"},
+    )
+
+    out_path = Path(out_dir) / f"{model}_{lead}_{start}_{end}.nc"
+    tmp_path = Path(str(out_path) + ".tmp")
+    encoding = {v: {"zlib": True, "complevel": 4} for v in cube.data_vars}
+    cube.to_netcdf(tmp_path, encoding=encoding)
+    os.replace(tmp_path, out_path)
+    print(f"Saved {len(dates)} days to {out_path}")
+
+    return out_path
+
+
+def run_hindcast(start, end, leads=("d0", "d1"), model="hrdps", archive_dir=ARCHIVE_DIR, out_dir=HINDCAST_DIR,
+                 scoring="rf", bin_mode="nationwide", max_workers=None, force=False, model_dir=MODEL_DIR,
+                 regrid_method="box"):
+    """
+    Every day and lead between start and end in a process pool, then one cube per lead.
+    """
+    models_mtime = model_mtime(model_dir)
+    jobs = [(date, lead) for date in daterange(start, end) for lead in leads]
+    max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+
+    status = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(hindcast_day, date, lead, model, archive_dir, out_dir,
+                               scoring, bin_mode, force, models_mtime, model_dir, regrid_method): (date, lead)
+                   for date, lead in jobs}
+        for future in as_completed(futures):
+            date, lead = futures[future]
+            try:
+                status.append(future.result())
+            except Exception as e:
+                status.append((date, lead, f"failed: {e}"))
+            print(*status[-1])
+
+    status = pd.DataFrame(status, columns=["date", "lead", "status"]).sort_values(["lead", "date"])
+    print(status["status"].str.split(":").str[0].value_counts())
+
+    for lead in leads:
+        write_cube(start, end, lead, model, out_dir, scoring, bin_mode, regrid_method)
+
+    return status
+
+
+if __name__ == "__main__":
+    ##### USER INPUT #####
+    start, end = "2025-05-01", "2025-09-30"
+    leads = ("d0", "d1")
+    scoring = "rf"  # ["rf", "lookup"]
+    bin_mode = "nationwide"  # ["nationwide", "ecozone"]
+    regrid_method = "box"  # ["box", "nearest", "linear"]
+    max_workers = None  # each worker holds one day of the HRDPS grid in memory
+    ##### END USER INPUT #####
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    run_hindcast(start, end, leads, scoring=scoring, bin_mode=bin_mode, max_workers=max_workers,
+                 regrid_method=regrid_method)
@@ -0,0 +1,222 @@
+"""
+
+    LDA-space probability lookup tables for the ecozone models.
+
+    Each zone model projects the predictors onto (at most) 2 LDA
+    components before the random forest, so the forest is just a function
+    on a plane. export_zone tabulates predict_proba on a GRID_N x GRID_N
+    grid and LdaLookup scores new points with one matrix multiply (the
+    LDA projection) and a bilinear lookup in that table - numpy only, no
+    sklearn or joblib needed at forecast time.
+
+    The grid spans the split thresholds of every tree in the forest (plus
+    a margin). Thresholds are midpoints between training values, so this
+    is the observed LDA range the forest learned from, and outside it the
+    forest output no longer changes: points beyond the grid are clamped
+    to its edge without loss.
+
+    Tables are written to PROCESS/FINAL_MODELS/LOOKUP/{zone}_lookup.npz
+    (a subfolder so find_files in daily_fcst.py still only sees the two
+    joblib models), with a fidelity report against the real forest in
+    lookup_fidelity.csv.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+import glob
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from context import process_dir
+
+#%%
+MODEL_DIR = Path(process_dir) / "FINAL_MODELS"
+LOOKUP_DIR = MODEL_DIR / "LOOKUP"
+GRID_N = 512  # nodes per LDA axis
+MARGIN = 0.05  # share of the threshold range added on each side
+N_CHECK = 20000  # points in the fidelity check
+
+
+def lda_projection(lda):
+    """
+    (mean, weights) such that lda.transform(X) == (X - mean) @ weights
+    """
+    k = lda._max_components
+    if lda.solver == "svd":
+        return np.asarray(lda.xbar_, dtype=float), np.asarray(lda.scalings_[:, :k], dtype=float)
+    if lda.solver == "eigen":
+        return np.zeros(lda.scalings_.shape[0]), np.asarray(lda.scalings_[:, :k], dtype=float)
+    raise ValueError(f"LDA solver '{lda.solver}' has no transform")
+
+
+def forest_range(rf, n_components, margin=MARGIN):
+    """
+    Per component [min, max] of the split thresholds over all trees.
+    """
+    lo = np.full(n_components, np.inf)
+    hi = np.full(n_components, -np.inf)
+    for tree in rf.estimators_:
+        feature, threshold = tree.tree_.feature, tree.tree_.threshold
+        for c in range(n_components):
+            splits = threshold[feature == c]
+            if splits.size:
+                lo[c] = min(lo[c], splits.min())
+                hi[c] = max(hi[c], splits.max())
+
+    # a component the forest never splits on: any short range gives the same output
+    unused = ~np.isfinite(lo)
+    lo[unused], hi[unused] = -1.0, 1.0
+    pad = np.maximum(margin * (hi - lo), 1e-6)
+
+    return lo - pad, hi + pad
+
+
+def build_table(rf, lo, hi, n=GRID_N):
+    """
+    predict_proba of the forest on the grid nodes.
+    Output: (n, [n,] n_classes) float32 table
+    """
+    axes = [np.linspace(lo[c], hi[c], n) for c in range(len(lo))]
+    nodes = np.stack([a.ravel() for a in np.meshgrid(*axes, indexing="ij")], axis=1)
+    probs = rf.predict_proba(nodes).astype(np.float32)
+
+    return probs.reshape((n,) * len(lo) + (probs.shape[1],))
+
+
+class LdaLookup:
+    """
+    lookup = LdaLookup.load(path)
+    lookup.predict_proba(X)  # same columns as rf.predict_proba(lda.transform(X))
+    """
+
+    def __init__(self, mean, weights, lo, hi, table, classes):
+        self.mean = np.asarray(mean, dtype=float)
+        self.weights = np.asarray(weights, dtype=float)
+        self.lo = np.asarray(lo, dtype=float)
+        self.hi = np.asarray(hi, dtype=float)
+        self.table = np.asarray(table)
+        self.classes = np.asarray(classes)
+        self.n = self.table.shape[0]
+        self.step = (self.hi - self.lo) / (self.n - 1)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f["mean"], f["weights"], f["lo"], f["hi"], f["table"], f["classes"])
+
+    def save(self, path):
+        tmp_path = Path(str(path) + ".tmp.npz")
+        np.savez(tmp_path, mean=self.mean, weights=self.weights, lo=self.lo, hi=self.hi,
+                 table=self.table, classes=self.classes)
+        os.replace(tmp_path, path)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=float) - self.mean) @ self.weights
+
+    def cells(self, Z):
+        # lower grid node and the fractional offset of every point, clamped to the grid
+        f = np.clip((Z - self.lo) / self.step, 0, self.n - 1)
+        i = np.minimum(np.floor(f).astype(np.intp), self.n - 2)
+        return i, f - i
+
+    def predict_proba(self, X):
+        Z = self.transform(X)
+        i, t = self.cells(Z)
+        if Z.shape[1] == 1:
+            t = t[:, 0:1]
+            return self.table[i[:, 0]] * (1 - t) + self.table[i[:, 0] + 1] * t
+
+        i0, i1 = i[:, 0], i[:, 1]
+        t0, t1 = t[:, 0:1], t[:, 1:2]
+        return ((1 - t0) * (1 - t1) * self.table[i0, i1] + t0 * (1 - t1) * self.table[i0 + 1, i1]
+                + (1 - t0) * t1 * self.table[i0, i1 + 1] + t0 * t1 * self.table[i0 + 1, i1 + 1])
+
+
+def lookup_from_models(lda, rf, n=GRID_N):
+    mean, weights = lda_projection(lda)
+    lo, hi = forest_range(rf, weights.shape[1])
+    return LdaLookup(mean, weights, lo, hi, build_table(rf, lo, hi, n), rf.classes_)
+
+
+def fidelity(lookup, lda, rf, X=None, n=N_CHECK, seed=42):
+    """
+    Compare the lookup with the real LDA + RF.
+    Points are X when given, otherwise half uniform over the grid and half
+    drawn around the projected class means (unit within-class spread).
+    """
+    rng = np.random.default_rng(seed)
+    if X is not None:
+        Z = lda.transform(X)
+    else:
+        k = lookup.weights.shape[1]
+        uniform = rng.uniform(lookup.lo, lookup.hi, size=(n // 2, k))
+        centres = lda.transform(lda.means_)[rng.integers(0, len(lda.means_), n - n // 2)]
+        Z = np.vstack([uniform, centres + rng.normal(size=centres.shape)])
+        # points for the lookup that land on the same Z
+        X = lookup.mean + Z @ np.linalg.pinv(lookup.weights)
+
+    true = rf.predict_proba(lda.transform(X))
+    approx = lookup.predict_proba(X)
+    err = np.abs(approx[:, -1] - true[:, -1])
+    outside = np.any((Z < lookup.lo) | (Z > lookup.hi), axis=1)
+
+    return {
+        "n_points": len(Z),
+        "max_abs_err": round(float(err.max()), 4),
+        "p99_abs_err": round(float(np.percentile(err, 99)), 4),
+        "mean_abs_err": round(float(err.mean()), 5),
+        "class_agreement": round(float(np.mean(approx.argmax(1) == true.argmax(1))), 4),
+        "outside_grid": round(float(outside.mean()), 4),
+    }
+
+
+def export_zone(zone, model_dir=MODEL_DIR, lookup_dir=LOOKUP_DIR, n=GRID_N, X=None):
+    """
+    Tabulate one zone's saved models and check the table against them.
+    """
+    import joblib
+
+    name = zone.replace(" ", "_")
+    lda = joblib.load(Path(model_dir) / f"{name}_lda_trained.joblib")
+    rf = joblib.load(Path(model_dir) / f"{name}_rf_trained.joblib")
+
+    lookup = lookup_from_models(lda, rf, n)
+    Path(lookup_dir).mkdir(parents=True, exist_ok=True)
+    lookup.save(Path(lookup_dir) / f"{name}_lookup.npz")
+
+    report = {"eco_zone": name, "grid_n": n, **fidelity(lookup, lda, rf, X)}
+    print(f"{zone}: max error {report['max_abs_err']}, class agreement {report['class_agreement']}")
+
+    return report
+
+
+def export_all(model_dir=MODEL_DIR, lookup_dir=LOOKUP_DIR, n=GRID_N):
+    """
+    Export every *_rf_trained.joblib in model_dir and write lookup_fidelity.csv
+    """
+    zones = sorted(Path(p).name[:-len("_rf_trained.joblib")]
+                   for p in glob.glob(str(Path(model_dir) / "*_rf_trained.joblib")))
+    reports = []
+    for zone in zones:
+        try:
+            reports.append(export_zone(zone, model_dir, lookup_dir, n))
+        except Exception as e:
+            print(f"Lookup export failed for {zone}: {e}")
+
+    report = pd.DataFrame(reports)
+    report.to_csv(Path(lookup_dir) / "lookup_fidelity.csv", index=False)
+
+    return report
+
+
+def load_lookup(zone, lookup_dir=LOOKUP_DIR):
+    return LdaLookup.load(Path(lookup_dir) / f"{zone.replace(' ', '_')}_lookup.npz")
+
+
+if __name__ == "__main__":
+    print(export_all())
@@ -0,0 +1,222 @@
+"""
+
+    Mergeable quantile sketches of dry lightning probabilities for the
+    forecast category thresholds.
+
+    Probabilities live on [0, 1] and the thresholds are kept to 3 decimals
+    (pred_terciles.csv, nationwide_bins.csv), so instead of a t-digest or
+    KLL sketch each zone keeps a fixed histogram of N_BINS bins of width
+    0.001. It is exactly mergeable (counts add), a quantile is within half
+    a bin (0.0005) of the exact one, and any number of days or zones
+    merge into one without touching the underlying data again.
+
+    Sketches are stored per source:
+        PROCESS/FINAL_MODELS/pred_sketches.npz   test-set probabilities written by
+                                                  train_all_zones.py, weighted by the
+                                                  zone's dry lightning days
+        FORECAST/SKETCHES/{d0,d1}/{date}.npz      each day's forecast points, written
+                                                  by daily_fcst.py / d1_daily_fcst.py
+
+    zone_edges / nationwide_edges turn either into all_ecozone_bins.csv and
+    nationwide_bins.csv (same layout as gen_fcst_bins.py), so thresholds can
+    be recalibrated from the training sketches or from any range of the
+    season's forecasts.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from datetime import datetime, timedelta
+
+#%%
+N_BINS = 1000
+QUANTILES = [0.65, 0.90]  # low-mod and mod-con edges
+SKETCH_DIR = Path(__file__).parent / "SKETCHES"
+TRAINING_SKETCH = Path(__file__).parent.parent / "PROCESS" / "FINAL_MODELS" / "pred_sketches.npz"
+
+
+class ZoneSketches:
+    """
+    One probability histogram (and a weight) per ecozone.
+
+    sk = ZoneSketches()
+    sk.add("Prairies", probs)
+    sk.merge(other)
+    sk.quantile("Prairies", [0.65, 0.9])
+    """
+
+    def __init__(self, counts=None, weights=None, n_bins=N_BINS):
+        self.n_bins = n_bins
+        self.counts = dict(counts or {})
+        self.weights = dict(weights or {})
+
+    def add(self, zone, probs, weight=None):
+        probs = np.asarray(probs, dtype=float)
+        probs = probs[np.isfinite(probs)]
+        bins = np.clip((probs * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+        hist = np.bincount(bins, minlength=self.n_bins).astype(np.int64)
+
+        self.counts[zone] = self.counts.get(zone, np.zeros(self.n_bins, dtype=np.int64)) + hist
+        self.weights[zone] = self.weights.get(zone, 0.0) + (len(probs) if weight is None else weight)
+        return self
+
+    def merge(self, other):
+        for zone, hist in other.counts.items():
+            self.counts[zone] = self.counts.get(zone, np.zeros(self.n_bins, dtype=np.int64)) + hist
+            self.weights[zone] = self.weights.get(zone, 0.0) + other.weights.get(zone, 0.0)
+        return self
+
+    def replace(self, other):
+        # zones in other overwrite ours (retrained zones)
+        self.counts.update(other.counts)
+        self.weights.update(other.weights)
+        return self
+
+    def zones(self):
+        return sorted(self.counts)
+
+    def count(self, zone):
+        return int(self.counts[zone].sum())
+
+    def quantile(self, zone=None, q=QUANTILES):
+        """
+        Quantiles of one zone, or of every zone pooled when zone is None,
+        interpolated linearly inside the bin.
+        """
+        hist = self.counts[zone] if zone is not None else np.sum(list(self.counts.values()), axis=0)
+        cdf = np.cumsum(hist)
+        if cdf[-1] == 0:
+            return np.full(len(np.atleast_1d(q)), np.nan)
+
+        target = np.atleast_1d(q) * cdf[-1]
+        k = np.minimum(np.searchsorted(cdf, target, side="left"), self.n_bins - 1)
+        below = np.where(k > 0, cdf[np.maximum(k - 1, 0)], 0)
+        frac = (target - below) / np.maximum(hist[k], 1)
+
+        return (k + np.clip(frac, 0, 1)) / self.n_bins
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        zones = self.zones()
+        tmp_path = Path(str(path) + ".tmp.npz")
+        np.savez_compressed(tmp_path, zones=np.array(zones, dtype=str),
+                            counts=np.stack([self.counts[z] for z in zones]) if zones else np.zeros((0, self.n_bins)),
+                            weights=np.array([self.weights[z] for z in zones], dtype=float))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            zones = [str(z) for z in f["zones"]]
+            counts = {z: c.astype(np.int64) for z, c in zip(zones, f["counts"])}
+            weights = dict(zip(zones, f["weights"].astype(float)))
+            return cls(counts, weights, f["counts"].shape[1])
+
+
+#%%
+def record_forecast(points, date, lead="d0", zone_col="name", prob_col="probability", sketch_dir=SKETCH_DIR):
+    """
+    Sketch one day's forecast points (daily_fcst.py records, name = "{zone}_fcst").
+    """
+    sketches = ZoneSketches()
+    zones = points[zone_col].str.replace("_fcst", "", regex=False).str.replace(" ", "_")
+    for zone, probs in points[prob_col].groupby(zones):
+        sketches.add(zone, probs.to_numpy())
+
+    path = Path(sketch_dir) / lead / f"{date}.npz"
+    sketches.save(path)
+    print(f"Saved forecast sketch {path}")
+    return path
+
+
+def season_sketches(start, end, lead="d0", sketch_dir=SKETCH_DIR):
+    """
+    Merge the daily sketches from start to end (inclusive, YYYY-MM-DD).
+    """
+    merged = ZoneSketches()
+    day = datetime.strptime(start, "%Y-%m-%d")
+    n_days = 0
+    while day <= datetime.strptime(end, "%Y-%m-%d"):
+        path = Path(sketch_dir) / lead / f"{day:%Y-%m-%d}.npz"
+        if path.exists():
+            merged.merge(ZoneSketches.load(path))
+            n_days += 1
+        day += timedelta(days=1)
+
+    print(f"Merged {n_days} daily sketches from {start} to {end}")
+    return merged
+
+
+def zone_edges(sketches, q=QUANTILES, weights=None):
+    """
+    all_ecozone_bins.csv layout: ecozone, dry_lightning_days, low, moderate.
+    weights default to the sketch weights (dry lightning days for the training sketch).
+    """
+    rows = []
+    for zone in sketches.zones():
+        low, moderate = sketches.quantile(zone, q)
+        weight = sketches.weights[zone] if weights is None else weights.get(zone, 0.0)
+        rows.append({"ecozone": zone, "dry_lightning_days": weight,
+                     "low": round(float(low), 3), "moderate": round(float(moderate), 3)})
+
+    return pd.DataFrame(rows)
+
+
+def nationwide_edges(sketches, q=QUANTILES, weights=None, method="weighted"):
+    """
+    nationwide_bins.csv layout: low-mod, mod-con.
+    weighted - zone edges averaged with the zone weights (gen_fcst_bins.py)
+    pooled   - quantiles of all zones merged into one sketch
+    """
+    if method == "pooled":
+        lower, upper = sketches.quantile(None, q)
+    else:
+        bins = zone_edges(sketches, q, weights)
+        wt = bins["dry_lightning_days"]
+        lower = (bins["low"] * wt).sum() / wt.sum()
+        upper = (bins["moderate"] * wt).sum() / wt.sum()
+
+    return pd.DataFrame({"low-mod": [round(float(lower), 3)], "mod-con": [round(float(upper), 3)]})
+
+
+def calibrate(source="training", start=None, end=None, lead="d0", method="weighted", out_dir=None):
+    """
+    Write all_ecozone_bins.csv and nationwide_bins.csv from the training sketch
+    or from the forecast sketches between start and end. Forecast sketches
+    are weighted with the training dry lightning days when available.
+    """
+    training = ZoneSketches.load(TRAINING_SKETCH) if TRAINING_SKETCH.exists() else None
+    if source == "training":
+        sketches = training
+    else:
+        sketches = season_sketches(start, end, lead)
+    weights = training.weights if training is not None and source != "training" else None
+
+    bins = zone_edges(sketches, weights=weights)
+    nationwide = nationwide_edges(sketches, weights=weights, method=method)
+    print(bins)
+    print(nationwide)
+
+    out_dir = Path(out_dir or Path(__file__).parent)
+    bins.to_csv(out_dir / "all_ecozone_bins.csv")
+    nationwide.to_csv(out_dir / "nationwide_bins.csv")
+
+    return bins, nationwide
+
+
+if __name__ == "__main__":
+    ##### USER INPUT #####
+    source = "training"  # ["training", "forecast"]
+    start, end = "2026-05-01", "2026-09-30"  # forecast days to calibrate from
+    lead = "d0"
+    ##### END USER INPUT #####
+
+    calibrate(source, start, end, lead)
@@ -0,0 +1,180 @@
+"""
+
+    Sparse regridding of the model grid points onto the forecast raster.
+
+    The HRDPS / RDPS points are on a rotated grid, so burning them into
+    0.09 degree cells drops some cells and overwrites others. Instead a
+    weight matrix W (raster cells x model points) is built once per
+    (model points, raster, method) and every field is regridded with one
+    sparse mat-vec, out = W @ values, renormalized over the finite values:
+        nearest  each cell takes the closest point (within MAX_DIST cells)
+        linear   barycentric weights of the Delaunay triangle holding the
+                 cell centre (the model grid is not regular in lat / lon,
+                 so this stands in for bilinear)
+        box      mean of the points falling in the cell; the model cells
+                 (2.5 km) are near equal area and much smaller than the
+                 raster cells, so this approximates conservative remapping
+
+    Weights are cached as
+        REGRID/{method}_{hash}.npz     scipy.sparse csr matrix
+    where the hash covers the point coordinates, the raster spec and the
+    method, so a new grid, mask or resolution builds a new operator and an
+    unchanged one is loaded from disk.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from pathlib import Path
+
+from fcst_funcs import raster_coords
+
+#%%
+REGRID_DIR = Path(__file__).parent / "REGRID"
+METHODS = ["nearest", "linear", "box"]
+MAX_DIST = 1.0  # in raster cells, cells further than this from every point stay empty
+
+
+def grid_hash(lat, lon, spec, method):
+    sha = hashlib.sha1()
+    sha.update(np.ascontiguousarray(lat, dtype=np.float64).tobytes())
+    sha.update(np.ascontiguousarray(lon, dtype=np.float64).tobytes())
+    sha.update(json.dumps({k: spec[k] for k in sorted(spec)}).encode())
+    sha.update(method.encode())
+    return sha.hexdigest()[:16]
+
+
+def cell_centres(spec):
+    # lon, lat of every raster cell in row major order (north to south)
+    lats, lons = raster_coords(spec)
+    lon2d, lat2d = np.meshgrid(lons, lats)
+    return np.column_stack([lon2d.ravel(), lat2d.ravel()])
+
+
+def near_enough(tree, centres, spec, max_dist=MAX_DIST):
+    # cells with a model point within max_dist raster cells
+    dist, _ = tree.query(centres, distance_upper_bound=max_dist * spec["resolution"])
+    return np.isfinite(dist)
+
+
+#%%
+def nearest_weights(lat, lon, spec, max_dist=MAX_DIST):
+    from scipy.sparse import csr_matrix
+    from scipy.spatial import cKDTree
+
+    centres = cell_centres(spec)
+    dist, nearest = cKDTree(np.column_stack([lon, lat])).query(
+        centres, distance_upper_bound=max_dist * spec["resolution"])
+    cells = np.flatnonzero(np.isfinite(dist))
+
+    return csr_matrix((np.ones(len(cells)), (cells, nearest[cells])), shape=(len(centres), len(lat)))
+
+
+def linear_weights(lat, lon, spec, max_dist=MAX_DIST):
+    from scipy.sparse import csr_matrix
+    from scipy.spatial import Delaunay, cKDTree
+
+    # centred coordinates, find_simplex is an order of magnitude slower far from the origin
+    offset = np.array([np.mean(lon), np.mean(lat)])
+    points = np.column_stack([lon, lat]) - offset
+    centres = cell_centres(spec) - offset
+    tri = Delaunay(points)
+    simplex = tri.find_simplex(centres)
+
+    # the triangulation also spans the gaps between ecozones (Hudson Bay, the Great Lakes)
+    cells = np.flatnonzero((simplex >= 0) & near_enough(cKDTree(points), centres, spec, max_dist))
+    transform = tri.transform[simplex[cells]]
+    bary = np.einsum("nij,nj->ni", transform[:, :2], centres[cells] - transform[:, 2])
+    bary = np.column_stack([bary, 1 - bary.sum(axis=1)])
+
+    rows = np.repeat(cells, 3)
+    cols = tri.simplices[simplex[cells]].ravel()
+    return csr_matrix((bary.ravel(), (rows, cols)), shape=(len(centres), len(lat)))
+
+
+def box_weights(lat, lon, spec):
+    from scipy.sparse import csr_matrix
+
+    n_cells = spec["height"] * spec["width"]
+    row = np.floor((spec["north"] - np.asarray(lat)) / spec["resolution"]).astype(np.intp)
+    col = np.floor((np.asarray(lon) - spec["west"]) / spec["resolution"]).astype(np.intp)
+    inside = np.flatnonzero((row >= 0) & (row < spec["height"]) & (col >= 0) & (col < spec["width"]))
+
+    cells = row[inside] * spec["width"] + col[inside]
+    counts = np.bincount(cells, minlength=n_cells)
+    return csr_matrix((1.0 / counts[cells], (cells, inside)), shape=(n_cells, len(lat)))
+
+
+def build_weights(lat, lon, spec, method="box"):
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if method == "nearest":
+        return nearest_weights(lat, lon, spec)
+    if method == "linear":
+        return linear_weights(lat, lon, spec)
+    if method == "box":
+        return box_weights(lat, lon, spec)
+    raise ValueError(f"method must be one of {METHODS}, not '{method}'")
+
+
+def regrid_weights(lat, lon, spec, method="box", regrid_dir=REGRID_DIR):
+    """
+    Weight matrix of the points onto the raster, loaded from the cache
+    or built and saved on first use.
+    """
+    from scipy.sparse import load_npz, save_npz
+
+    path = Path(regrid_dir) / f"{method}_{grid_hash(lat, lon, spec, method)}.npz"
+    if path.exists():
+        return load_npz(path)
+
+    weights = build_weights(lat, lon, spec, method).tocsr()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(f"{path}.{os.getpid()}.tmp.npz")  # hindcast workers may build the same weights
+    save_npz(tmp_path, weights)
+    os.replace(tmp_path, path)
+    print(f"Saved {method} regrid weights ({weights.nnz} non-zero) to {path}")
+
+    return weights
+
+
+#%%
+def regrid(weights, values, spec=None):
+    """
+    Regrid point values with one sparse mat-vec. NaN points are left out and
+    the remaining weights renormalized, cells with no weight are NaN.
+    Output: (height, width) array when spec is given, flat otherwise
+    """
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    total = weights @ np.where(finite, values, 0.0)
+    norm = weights @ finite.astype(float)
+
+    out = np.full(len(total), np.nan)
+    np.divide(total, norm, out=out, where=norm > 0)
+    if spec is not None:
+        out = out.reshape(spec["height"], spec["width"])
+
+    return out
+
+
+def regrid_forecast(lat, lon, probs, zone_codes, edges, spec, method="box", regrid_dir=REGRID_DIR):
+    """
+    Probability raster (float32) regridded with method, and the class raster
+    (uint8) from it with the edges of each cell's nearest zone.
+    """
+    from category_edges import classify
+
+    prob = regrid(regrid_weights(lat, lon, spec, method, regrid_dir), probs, spec)
+    codes = regrid(regrid_weights(lat, lon, spec, "nearest", regrid_dir), zone_codes, spec)
+    codes = np.nan_to_num(np.rint(codes), nan=0).astype(np.intp)
+    fcst_class = classify(prob.ravel(), codes.ravel(), edges).reshape(prob.shape)
+
+    return prob.astype(np.float32), fcst_class
@@ -8,11 +8,13 @@
     December 23, 2025
 """
 #%%
+import os
 import pandas as pd
 import numpy as np
 import json
 import glob
 
+from pathlib import Path
 from context import utils_dir
 
 #%%
@@ -24,6 +26,14 @@ all_stations = stations.keys()
 # define a cutoff value for dry or moist lightning [mm]
 precip_cutoff = 2.54
 
+# columns normalized to z-scores and columns log transformed (name of the output column)
+ZSCORE_COLS = ["dTTd850", "dT850-500", "K_index", "lcl", "pw", "lifted_index", "sfc_rh"]
+LOG_COLS = {"mucape": "mucape_log", "dTTd700": "dtTd700_log"}
+LABEL_COLS = ["no_lightning", "moist_lightning", "dry_lightning", "classifier"]
+
+# typed columnar training table, partitioned by station
+TRAINING_DIR = Path(__file__).parent / "CLEANED" / "training_table"
+
 def clean_station(station_select, dry_run=False):
     """Combine all yearly lightning_prediction files for a station and clean them.
 
@@ -52,59 +62,154 @@ def clean_station(station_select, dry_run=False):
     id = station_info["id"]
 
     # get all files containing id and lightning_prediction
-    file_list = glob.glob(f"./OUTPUT/{id}_*_lightning_prediction.csv")
+    file_list = sorted(glob.glob(f"./OUTPUT/{id}_*_lightning_prediction.csv"))
 
     if not file_list:
         print(f"No files found for station id {id} in ./OUTPUT/. Nothing to do.")
         return None
 
-    all_lightning = pd.DataFrame()
-    for i, file in enumerate(file_list):
-        print("processing file: ", file)
-        df = pd.read_csv(file)
-
-        # append to a master dataframe
-        if i == 0:
-            all_lightning = df
-        else:
-            all_lightning = pd.concat([all_lightning, df], ignore_index=True)
-    print(f"Combined shape: {all_lightning.shape}")
+    # one concat of every year
+    all_lightning = pd.concat([pd.read_csv(f) for f in file_list], ignore_index=True)
+    print(f"Combined {len(file_list)} files: {all_lightning.shape}")
 
     is_lightning = all_lightning["no_lightning"] == 0
-    print(all_lightning[is_lightning].head())
     print(f"Lightning rows: {all_lightning[is_lightning].shape}")
 
-    # empty classifier column
-    all_lightning["classifier"] = np.nan
-
-    # create a classifier column 0 if no lightning, 1 if moist lightning, 2 if dry lightning
-    for row_idx, row in all_lightning.iterrows():
-        if row["no_lightning"] == 1:
-            all_lightning.at[row_idx, "classifier"] = 0
-        elif row["moist_lightning"] == 1:
-            all_lightning.at[row_idx, "classifier"] = 1
-        elif row["dry_lightning"] == 1:
-            all_lightning.at[row_idx, "classifier"] = 2
-
-    print(all_lightning.head())
-
-    # normalize a few columns and convert to z-scores
-    from scipy.stats import zscore
-    cols_normalize = ["dTTd850", "dT850-500", "K_index", 
-                      "lcl", "pw", "lifted_index", "sfc_rh"]
-
-    for col in cols_normalize:
-        print(f"normalizing column: {col}")
-        all_lightning[f"{col}_zscore"] = zscore(all_lightning[col], nan_policy='omit')
+    # classifier column 0 if no lightning, 1 if moist lightning, 2 if dry lightning
+    all_lightning["classifier"] = label_classifier(all_lightning)
 
-    # normalize mucape and dTTd700 differently - log transform
-    all_lightning["mucape_log"] = np.log1p(all_lightning["mucape"])
-    all_lightning["dtTd700_log"] = np.log1p(all_lightning["dTTd700"])
+    # z-scores and log transforms, parameters kept so forecasts can apply the same ones
+    transform = FeatureTransform().fit(all_lightning)
+    all_lightning = transform.transform(all_lightning)
 
     # round all columns in dataframe to 2 decimal places
     all_lightning = all_lightning.round(2)
 
     print(all_lightning.head())
 
+    if dry_run:
+        return all_lightning
+
     # save the cleaned combined dataframe
     all_lightning.to_csv(f"./CLEANED/{id}_combined_lightning_prediction_cleaned.csv", sep=',', index=False)
+    transform.save(f"./CLEANED/{id}_feature_transform.json")
+    write_training_table(all_lightning, id)
+
+    return all_lightning
+
+
+def label_classifier(df):
+    """
+    0 no lightning, 1 moist lightning, 2 dry lightning, NaN when unlabelled.
+    """
+    conditions = [df["no_lightning"] == 1, df["moist_lightning"] == 1, df["dry_lightning"] == 1]
+    return np.select(conditions, [0, 1, 2], default=np.nan)
+
+
+class FeatureTransform:
+    """
+    Fitted z-score / log1p transforms of the sounding indices.
+
+    fit stores the mean and (population) standard deviation of each z-score
+    column, transform adds the {col}_zscore and log columns, and the
+    parameters are saved as json so forecast-time code can apply the
+    same transform to model-derived indices.
+    """
+
+    def __init__(self, zscore_cols=ZSCORE_COLS, log_cols=LOG_COLS, params=None):
+        self.zscore_cols = list(zscore_cols)
+        self.log_cols = dict(log_cols)
+        self.params = params or {}
+
+    def fit(self, df):
+        # same as scipy.stats.zscore(nan_policy='omit') - ddof 0
+        values = df[self.zscore_cols].to_numpy(dtype=float)
+        means = np.nanmean(values, axis=0)
+        stds = np.nanstd(values, axis=0)
+        self.params = {col: {"mean": float(m), "std": float(sd)}
+                       for col, m, sd in zip(self.zscore_cols, means, stds)}
+        return self
+
+    def transform(self, df):
+        df = df.copy()
+        cols = [c for c in self.zscore_cols if c in df.columns]
+        means = np.array([self.params[c]["mean"] for c in cols])
+        stds = np.array([self.params[c]["std"] for c in cols])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (df[cols].to_numpy(dtype=float) - means) / stds
+        df[[f"{c}_zscore" for c in cols]] = z
+
+        for col, out_col in self.log_cols.items():
+            if col in df.columns:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    df[out_col] = np.log1p(df[col].astype(float))
+
+        return df
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"zscore": self.params, "log1p": self.log_cols}, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            saved = json.load(f)
+        return cls(zscore_cols=saved["zscore"].keys(), log_cols=saved["log1p"], params=saved["zscore"])
+
+
+def write_training_table(df, id, out_dir=TRAINING_DIR, part="part-0"):
+    """
+    Typed columnar copy of the cleaned table, one partition per station:
+    {out_dir}/station={id}/part-0.parquet
+    Seasons appended by incremental_update.py are extra parts (part-{year});
+    a full rewrite (part-0) removes them since part-0 then holds every year.
+    """
+    table = df.drop(columns=[c for c in df.columns if c.startswith("Unnamed")])
+    for col in LABEL_COLS:
+        if col in table.columns:
+            table[col] = table[col].astype("Int8")
+    float_cols = table.select_dtypes(include="number").columns.difference(LABEL_COLS)
+    table[float_cols] = table[float_cols].astype("float32")
+
+    out_path = Path(out_dir) / f"station={id}"
+    out_path.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path / f"{part}.parquet.tmp"
+    table.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, out_path / f"{part}.parquet")
+    if part == "part-0":
+        for stale in out_path.glob("part-*.parquet"):
+            if stale.name != "part-0.parquet":
+                stale.unlink()
+    print(f"Saved training table to {out_path / f'{part}.parquet'}")
+
+
+def load_training_table(ids=None, columns=None, out_dir=TRAINING_DIR):
+    """
+    Read the training table for the given station ids (all stations if None).
+    The station id comes back as a column.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(str(out_dir), format="parquet", partitioning="hive")
+    filt = ds.field("station").isin([int(i) for i in ids]) if ids is not None else None
+    if columns is not None:
+        columns = list(columns) + ["station"]
+
+    return dataset.to_table(columns=columns, filter=filt).to_pandas()
+
+
+def clean_all_stations(dry_run=False):
+    """
+    Rebuild the cleaned tables of every station in unique_ecozone_stations.json
+    """
+    done = []
+    for station_select in all_stations:
+        if clean_station(station_select, dry_run=dry_run) is not None:
+            done.append(station_select)
+
+    print(f"Cleaned {len(done)} of {len(all_stations)} stations")
+    return done
+
+
+if __name__ == "__main__":
+    clean_all_stations()
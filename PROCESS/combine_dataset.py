@@ -6,6 +6,8 @@
         1. No Lightning
         2. Lightning with Precipitation
         3. Dry Lightning
+    precip_total and strike_count are saved too so other cutoffs
+    can be labelled later with labels.py
 
 """
 #%%
@@ -16,6 +18,7 @@ import metpy.calc as mpcalc
 
 from metpy.units import units
 from context import utils_dir, download_dir
+from DOWNLOAD.sounding_store import SoundingStore, store_from_csv
 
 # define a cutoff value for dry or moist lightning [mm]
 precip_cutoff = 2.54
@@ -101,10 +104,12 @@ def combine_year(station_select, year, precip_cutoff=precip_cutoff):
     print(f"Station id: {id}")
     cldn = pd.read_csv(f"{download_dir}/OUTPUT/{id}/{id}_{year}_cldn_output.csv")
     precip = pd.read_csv(f"{download_dir}/OUTPUT/{id}/{id}_{year}_precip_output.csv")
-    sounding = pd.read_csv(f"{download_dir}/OUTPUT/{id}/{id}_{year}_all_soundings.csv")
-
-    # remove nans from sounding
-    sounding = sounding.dropna()
+    # soundings come from the ragged-array store (built from the csv on first use)
+    # so each launch is an offset slice instead of a scan of the season
+    if store_from_csv(id, year, f"{download_dir}/OUTPUT") is not None:
+        sounding = SoundingStore.open(id, year, f"{download_dir}/OUTPUT")
+    else:
+        sounding = None
 
     # early exit if no precipitation data
     if precip.empty:
@@ -112,7 +117,8 @@ def combine_year(station_select, year, precip_cutoff=precip_cutoff):
         empty_predict = pd.DataFrame(columns=["Day", "no_lightning", 
                                               "moist_lightning",
                                               "dry_lightning", 
-                                              "precip_total"])
+                                              "precip_total",
+                                              "strike_count"])
         empty_predict.to_csv(f"./OUTPUT/{id}_{year}_lightning_prediction.csv", index=False)
         return
 
@@ -137,13 +143,14 @@ def combine_year(station_select, year, precip_cutoff=precip_cutoff):
     # Checks
     print(cldn.head())
     print(precip.head())
-    print(sounding.head())
+    print(f"{0 if sounding is None else len(sounding)} sounding launches")
 
     # empty dataframe to store lightning classifiers
     lightning_predict = pd.DataFrame(columns=["Day", "no_lightning", 
                                               "moist_lightning",
                                               "dry_lightning", 
-                                              "precip_total"])
+                                              "precip_total",
+                                              "strike_count"])
 
     # dates of the fire season we want to predict on 
     all_days = precip["Day"].unique()
@@ -165,6 +172,8 @@ def combine_year(station_select, year, precip_cutoff=precip_cutoff):
         # get the daily total precipitation
         daily_precip = np.round(wx["precip"].sum(), 2)
         lightning_predict.loc[index, "precip_total"] = daily_precip
+        # keep the strike count so labels.py can relabel with other definitions
+        lightning_predict.loc[index, "strike_count"] = len(strikes)
 
         # cldn data is the linchpin for the dataset
         if strikes.empty:
@@ -197,10 +206,11 @@ def combine_year(station_select, year, precip_cutoff=precip_cutoff):
     for index, row in lightning_predict.iterrows():
         sdate = row["Day"] + " 12:00:00"  # how us stores the times
 
-        if "time" not in sounding.columns:  # for empty sounding data
-            sounding["time"] = []
-
-        daily_sounding = sounding[sounding["time"] == sdate]
+        if sounding is None:  # for empty sounding data
+            daily_sounding = pd.DataFrame()
+        else:
+            # drops missing levels (and launches without pw) like sounding.dropna()
+            daily_sounding = sounding.frame(sdate)
 
         # perform calculations if the sounding is not empty
         if daily_sounding.empty:
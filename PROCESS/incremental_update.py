@@ -0,0 +1,369 @@
+"""
+
+    End of season model update without a full retrain.
+
+    For a new season (year):
+    1. combine_year only for the new station-years and append them to the
+       training table as an extra part (station={id}/part-{year}.parquet)
+       using each station's saved feature transform, plus the cleaned csv
+    2. per ecozone, add the new rows to the LDA sufficient statistics
+       (class counts, sums and x x^T sums, FINAL_MODELS/STATS) and refit
+       the LDA from them - no pass over older seasons
+    3. compare the refitted LDA with the one the forest was trained on
+       (largest principal angle between the discriminant subspaces):
+       - below DRIFT_TOL_DEG the old projection is kept and the forest
+         grows warm_start trees on the new season only
+       - above it the forest was trained in a space that has moved, so the
+         zone is retrained on the full table with the refitted LDA
+    4. FINAL_MODELS/drift_report.csv: old and new model scores on the new
+       season, the subspace angle, the change in dry lightning probability
+       and the new-season terciles for comparison with pred_terciles.csv
+       (which is left to the full retrain)
+
+    The first update of a zone builds its statistics from the existing
+    table once; after that the cost follows the size of the new season.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from context import utils_dir
+from train_all_zones import (FEATURES, TARGET, SAVE_DIR, CLEANED_DIR, RANDOM_STATE, TERCILES,
+                             zone_station_ids, load_training_data, atomic_dump, atomic_csv,
+                             load_best_params)
+
+#%%
+STATS_DIR = SAVE_DIR / "STATS"
+DRIFT_TOL_DEG = 5.0  # largest subspace angle still served by growing the old forest
+MIN_NEW_TREES = 10
+
+
+class LdaStats:
+    """
+    Mergeable per-class sufficient statistics of the LDA predictors:
+    counts n_k, sums s_k = sum x and scatter sums m_k = sum x x^T,
+    plus the seasons already added so a season is never counted twice.
+    """
+
+    def __init__(self, classes, count, total, outer, seasons=()):
+        self.classes = np.asarray(classes)
+        self.count = np.asarray(count, dtype=float)
+        self.total = np.asarray(total, dtype=float)
+        self.outer = np.asarray(outer, dtype=float)
+        self.seasons = np.asarray(sorted(set(int(s) for s in seasons)), dtype=int)
+
+    @classmethod
+    def from_data(cls, X, y, classes=None, seasons=()):
+        X = np.asarray(X, dtype=float)
+        classes = np.unique(y) if classes is None else np.asarray(classes)
+        count = np.array([np.sum(y == c) for c in classes], dtype=float)
+        total = np.stack([X[y == c].sum(axis=0) for c in classes])
+        outer = np.stack([X[y == c].T @ X[y == c] for c in classes])
+        return cls(classes, count, total, outer, seasons)
+
+    def merge(self, other):
+        classes = np.union1d(self.classes, other.classes)
+        merged = LdaStats.from_data(np.zeros((0, self.total.shape[1])), np.zeros(0), classes,
+                                    np.concatenate([self.seasons, other.seasons]))
+        for stats in (self, other):
+            k = np.searchsorted(classes, stats.classes)
+            merged.count[k] += stats.count
+            merged.total[k] += stats.total
+            merged.outer[k] += stats.outer
+        return merged
+
+    def save(self, path):
+        tmp_path = Path(str(path) + ".tmp.npz")
+        np.savez(tmp_path, classes=self.classes, count=self.count, total=self.total, outer=self.outer,
+                 seasons=self.seasons)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f["classes"], f["count"], f["total"], f["outer"], f["seasons"])
+
+
+def lda_from_stats(stats, n_components=2):
+    """
+    LinearDiscriminantAnalysis(solver="eigen") equal to fitting on every row
+    the statistics were built from (sklearn's _solve_eigen on the moments).
+    """
+    from scipy import linalg
+    from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+
+    n = stats.count.sum()
+    priors = stats.count / n
+    means = stats.total / stats.count[:, None]
+    # biased class covariances weighted by the priors, and the total covariance
+    class_cov = stats.outer / stats.count[:, None, None] - means[:, :, None] * means[:, None, :]
+    Sw = np.einsum("k,kij->ij", priors, class_cov)
+    xbar = stats.total.sum(axis=0) / n
+    St = stats.outer.sum(axis=0) / n - np.outer(xbar, xbar)
+
+    evals, evecs = linalg.eigh(St - Sw, Sw)
+    order = np.argsort(evals)[::-1]
+    evecs = evecs[:, order]
+
+    lda = LinearDiscriminantAnalysis(solver="eigen", n_components=n_components)
+    lda.classes_ = stats.classes
+    lda.priors_ = priors
+    lda.means_ = means
+    lda.covariance_ = Sw
+    lda.scalings_ = evecs
+    lda._max_components = min(n_components, len(stats.classes) - 1)
+    lda.explained_variance_ratio_ = (evals[order] / np.sum(evals))[:lda._max_components]
+    lda.coef_ = means @ evecs @ evecs.T
+    lda.intercept_ = -0.5 * np.diag(means @ lda.coef_.T) + np.log(priors)
+    if len(stats.classes) == 2:
+        lda.coef_ = np.array(lda.coef_[1, :] - lda.coef_[0, :], ndmin=2)
+        lda.intercept_ = np.array(lda.intercept_[1] - lda.intercept_[0], ndmin=1)
+    lda.n_features_in_ = means.shape[1]
+
+    return lda
+
+
+def discriminant_weights(lda):
+    # columns spanning the space lda.transform projects onto
+    k = lda._max_components
+    return lda.scalings_[:, :k]
+
+
+def subspace_angle(lda_old, lda_new):
+    # largest principal angle (degrees) between the two discriminant subspaces
+    from scipy.linalg import subspace_angles
+    return float(np.degrees(subspace_angles(discriminant_weights(lda_old), discriminant_weights(lda_new)).max()))
+
+
+#%%
+def append_season(id, year, cleaned_dir=CLEANED_DIR):
+    """
+    Add OUTPUT/{id}_{year}_lightning_prediction.csv to the station's training
+    table (part-{year}) and cleaned csv. Returns the new rows, None if there are none.
+    """
+    from clean_combine import label_classifier, FeatureTransform, write_training_table
+
+    path = Path(__file__).parent / "OUTPUT" / f"{id}_{year}_lightning_prediction.csv"
+    if not path.exists():
+        print(f"No combined output for {id} {year}")
+        return None
+    season = pd.read_csv(path)
+    season = season.drop(columns=[c for c in season.columns if c.startswith("Unnamed")])
+    if season.empty:
+        return None
+
+    season["classifier"] = label_classifier(season)
+    transform_path = Path(cleaned_dir) / f"{id}_feature_transform.json"
+    if transform_path.exists():
+        transform = FeatureTransform.load(transform_path)
+    else:
+        print(f"No feature transform for {id}, fitting on {year} only")
+        transform = FeatureTransform().fit(season)
+        transform.save(transform_path)
+    season = transform.transform(season).round(2)
+
+    # already appended by an earlier run: hand back the same rows from part-{year}
+    # (whether a zone still needs them is decided by its LdaStats.seasons), a
+    # station cleaned after the season has it in part-0 and the models already
+    csv_path = Path(cleaned_dir) / f"{id}_combined_lightning_prediction_cleaned.csv"
+    if csv_path.exists():
+        header = pd.read_csv(csv_path, nrows=0).columns
+        days = pd.read_csv(csv_path, usecols=["Day"])["Day"] if "Day" in header else pd.Series(dtype=str)
+        if days.astype(str).str.startswith(str(year)).any():
+            part_path = Path(cleaned_dir) / "training_table" / f"station={id}" / f"part-{year}.parquet"
+            if not part_path.exists():
+                print(f"{id} {year} is already in the cleaned table")
+                return None
+            print(f"{id} {year} already appended, reading {part_path}")
+            return pd.read_parquet(part_path).assign(id=id)
+        season.reindex(columns=header).to_csv(csv_path, mode="a", header=False, index=False)
+    else:
+        season.to_csv(csv_path, index=False)
+
+    write_training_table(season, id, Path(cleaned_dir) / "training_table", part=f"part-{year}")
+
+    return season.assign(id=id)
+
+
+def combine_new_season(year, rerun=False, cleaned_dir=CLEANED_DIR):
+    """
+    combine_year for the station-years of the new season only, then append them.
+    Output: new rows of every station with an id column
+    """
+    from combine_dataset import combine_year
+
+    with open(utils_dir + '/unique_ecozone_stations.json', 'r') as f:
+        stations = json.load(f)
+
+    new_rows = []
+    for station_select, station_info in stations.items():
+        id = station_info["id"]
+        output = Path(__file__).parent / "OUTPUT" / f"{id}_{year}_lightning_prediction.csv"
+        if rerun or not output.exists():
+            try:
+                combine_year(station_select, year)
+            except Exception as e:
+                print(f"combine_year failed for {station_select} {year}: {e}")
+                continue
+        season = append_season(id, year, cleaned_dir)
+        if season is not None:
+            new_rows.append(season)
+
+    if not new_rows:
+        return pd.DataFrame(columns=FEATURES + [TARGET, "id"])
+    return pd.concat(new_rows, ignore_index=True)
+
+
+#%%
+def season_scores(lda, rf, X, y):
+    from sklearn.metrics import accuracy_score, balanced_accuracy_score, log_loss
+
+    prob = rf.predict_proba(lda.transform(X))
+    pred = rf.classes_[prob.argmax(axis=1)]
+    return {
+        "accuracy": round(accuracy_score(y, pred), 4),
+        "balanced_accuracy": round(balanced_accuracy_score(y, pred), 4),
+        "log_loss": round(log_loss(y, prob, labels=rf.classes_), 4),
+    }, prob
+
+
+def update_zone(zone, ids, new_data, year, save_dir=SAVE_DIR, stats_dir=STATS_DIR,
+                cleaned_dir=CLEANED_DIR, drift_tol=DRIFT_TOL_DEG):
+    """
+    Update one zone with its new-season rows. Returns a drift report row.
+    """
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+
+    name = zone.replace(" ", "_")
+    lda = joblib.load(Path(save_dir) / f"{name}_lda_trained.joblib")
+    rf = joblib.load(Path(save_dir) / f"{name}_rf_trained.joblib")
+
+    zone_new = new_data[new_data["id"].isin(ids)][FEATURES + [TARGET]].dropna()
+    X_new = zone_new[FEATURES].to_numpy(dtype=float)
+    y_new = zone_new[TARGET].to_numpy().astype(int)
+    report = {"eco_zone": name, "year": year, "n_new": len(y_new)}
+    if len(y_new) == 0:
+        print(f"{zone}: no new rows")
+        return {**report, "mode": "none"}
+
+    # statistics of everything before this season (built from the table once)
+    stats_path = Path(stats_dir) / f"{name}_lda_stats.npz"
+    if stats_path.exists():
+        stats = LdaStats.load(stats_path)
+    else:
+        old = load_training_data(ids, TARGET, cleaned_dir, extra_columns=["Day"])
+        old = old[~old["Day"].astype(str).str.startswith(str(year))].dropna(subset=FEATURES + [TARGET])
+        stats = LdaStats.from_data(old[FEATURES].to_numpy(dtype=float), old[TARGET].to_numpy().astype(int),
+                                   seasons=pd.to_datetime(old["Day"]).dt.year.unique())
+    if year in stats.seasons:
+        # this zone was updated with the season by an earlier run
+        print(f"{zone}: {year} is already in the LDA statistics, skipping")
+        return {**report, "mode": "none"}
+    stats = stats.merge(LdaStats.from_data(X_new, y_new, seasons=[year]))
+    lda_refit = lda_from_stats(stats, lda._max_components)
+
+    old_scores, old_prob = season_scores(lda, rf, X_new, y_new)
+    angle = subspace_angle(lda, lda_refit)
+
+    n_trees = len(rf.estimators_)
+    same_classes = np.array_equal(np.unique(y_new), rf.classes_)
+    if angle <= drift_tol and same_classes:
+        # old trees stay valid in the old projection: add trees for the new season
+        mode = "grow"
+        n_add = max(MIN_NEW_TREES, int(np.ceil(n_trees * len(y_new) / max(stats.count.sum() - len(y_new), 1))))
+        rf.set_params(warm_start=True, n_estimators=n_trees + n_add)
+        rf.fit(lda.transform(X_new), y_new)
+        rf.set_params(warm_start=False)
+    else:
+        # the projection moved (or a class is missing from the season): full retrain
+        mode = "refit"
+        data = load_training_data(ids, TARGET, cleaned_dir)[FEATURES + [TARGET]].dropna()
+        params = load_best_params(save_dir).get(name, {})
+        lda = lda_refit
+        rf = RandomForestClassifier(max_depth=rf.max_depth, n_estimators=params.get("n_estimators", n_trees),
+                                    random_state=RANDOM_STATE)
+        rf.fit(lda.transform(data[FEATURES].to_numpy(dtype=float)), data[TARGET].to_numpy().astype(int))
+
+    new_scores, new_prob = season_scores(lda, rf, X_new, y_new)
+
+    atomic_dump(lda, Path(save_dir) / f"{name}_lda_trained.joblib")
+    atomic_dump(rf, Path(save_dir) / f"{name}_rf_trained.joblib")
+    Path(stats_dir).mkdir(parents=True, exist_ok=True)
+    stats.save(stats_path)
+
+    report.update({
+        "mode": mode,
+        "subspace_angle_deg": round(angle, 2),
+        "n_trees_before": n_trees,
+        "n_trees_after": len(rf.estimators_),
+        **{f"old_{k}": v for k, v in old_scores.items()},
+        **{f"new_{k}": v for k, v in new_scores.items()},
+        "mean_abs_dry_prob_change": round(float(np.mean(np.abs(new_prob[:, -1] - old_prob[:, -1]))), 4),
+        **{f"old_dry_p{q}": round(float(np.percentile(old_prob[:, -1], q)), 3) for q in TERCILES},
+        **{f"new_dry_p{q}": round(float(np.percentile(new_prob[:, -1], q)), 3) for q in TERCILES},
+    })
+    print(f"{zone}: {mode} (angle {angle:.1f} deg), log loss {old_scores['log_loss']} -> {new_scores['log_loss']}")
+
+    return report
+
+
+def update_season(year, zones=None, rerun_combine=False, save_dir=SAVE_DIR, cleaned_dir=CLEANED_DIR,
+                  drift_tol=DRIFT_TOL_DEG, new_data=None):
+    """
+    Incremental end of season update of every zone (or the listed zones).
+    new_data skips the combine step when the season rows are already at hand.
+    """
+    if new_data is None:
+        new_data = combine_new_season(year, rerun_combine, cleaned_dir)
+    print(f"{len(new_data)} new station days for {year}")
+
+    with open(utils_dir + '/ecozone_stations.json', 'r') as f:
+        zone_ids = zone_station_ids(json.load(f))
+    if zones is not None:
+        zone_ids = {z: zone_ids[z] for z in zones}
+
+    reports = []
+    for zone, ids in zone_ids.items():
+        try:
+            reports.append(update_zone(zone, ids, new_data, year, save_dir, Path(save_dir) / "STATS",
+                                       cleaned_dir, drift_tol))
+        except FileNotFoundError as e:
+            print(f"No trained model for {zone}, run train_all_zones.py first: {e}")
+        except Exception as e:
+            # the other zones still update, a re-run picks this one up (its stats lack the season)
+            print(f"Update failed for {zone}: {e}")
+
+    report = pd.DataFrame(reports)
+    report_path = Path(save_dir) / "drift_report.csv"
+    if report_path.exists() and not report.empty:
+        old = pd.read_csv(report_path)
+        # a re-run skips the zones already updated, keep their earlier rows
+        old_season = old["year"] == year
+        skipped = (report["mode"] == "none") & report["eco_zone"].isin(old.loc[old_season, "eco_zone"])
+        report = report[~skipped]
+        keep = ~(old["eco_zone"].isin(report["eco_zone"]) & old_season)
+        report = pd.concat([old[keep], report], ignore_index=True)
+    atomic_csv(report, report_path)
+    print(f"Saved {report_path}")
+
+    return report
+
+
+if __name__ == "__main__":
+    ##### USER INPUT #####
+    year = 2026  # the season just finished
+    zones = None
+    ##### END USER INPUT #####
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    print(update_season(year, zones))
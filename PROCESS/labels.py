@@ -0,0 +1,108 @@
+"""
+
+    Label generation for many dry lightning definitions at once.
+
+    combine_dataset.py stores the 12Z-12Z precip total and the number of
+    strikes for every day, so the classifier can be rebuilt for any
+    precipitation cutoff and strike-count threshold without rerunning the
+    combine. All variants are computed in one broadcast over
+    (days, cutoffs, strike thresholds):
+        0 - no lightning   (strike_count < min_strikes)
+        1 - moist lightning (precip_total > cutoff)
+        2 - dry lightning  (precip_total <= cutoff)
+    NaN where the precip total or strike count is missing.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import numpy as np
+import pandas as pd
+
+#%%
+CUTOFFS = [1.0, 2.54, 5.0, 10.0]  # mm
+STRIKE_THRESHOLDS = [1, 2, 5]  # minimum strikes for a lightning day
+
+
+def label_name(cutoff, min_strikes):
+    return f"classifier_{cutoff:.2f}mm_{int(min_strikes)}str"
+
+
+def strike_counts(df):
+    """
+    Daily strike counts; older combine output only has the no_lightning flag
+    so there the count is only known to be 0 or >= 1 (returned as NaN above 1).
+    """
+    if "strike_count" in df.columns:
+        return df["strike_count"].to_numpy(dtype=float), None
+
+    print("No strike_count column - rerun combine_dataset for strike thresholds above 1")
+    any_strike = 1 - df["no_lightning"].to_numpy(dtype=float)
+    return any_strike, any_strike
+
+
+def label_matrix(precip_total, strike_count, cutoffs=CUTOFFS, strike_thresholds=STRIKE_THRESHOLDS, flag_only=None):
+    """
+    Classifier for every (cutoff, threshold) pair.
+    Output: array (n_days, n_cutoffs, n_thresholds) of 0/1/2 with NaN where undefined
+    """
+    precip = np.asarray(precip_total, dtype=float)[:, None, None]
+    strikes = np.asarray(strike_count, dtype=float)[:, None, None]
+    cutoffs = np.asarray(cutoffs, dtype=float)[None, :, None]
+    thresholds = np.asarray(strike_thresholds, dtype=float)[None, None, :]
+
+    lightning = strikes >= thresholds
+    labels = np.where(lightning, np.where(precip <= cutoffs, 2.0, 1.0), 0.0)
+
+    missing = np.isnan(strikes) | (lightning & np.isnan(precip))
+    if flag_only is not None:
+        # only "any strike" is known: thresholds above 1 are undefined on lightning days
+        missing = missing | ((np.asarray(flag_only, dtype=float)[:, None, None] > 0) & (thresholds > 1))
+    labels[np.broadcast_to(missing, labels.shape)] = np.nan
+
+    return labels
+
+
+def add_labels(df, cutoffs=CUTOFFS, strike_thresholds=STRIKE_THRESHOLDS):
+    """
+    Append one classifier column per (cutoff, strike threshold) to df.
+    """
+    strikes, flag_only = strike_counts(df)
+    labels = label_matrix(df["precip_total"], strikes, cutoffs, strike_thresholds, flag_only)
+
+    names = [label_name(c, t) for c in cutoffs for t in strike_thresholds]
+    new_cols = pd.DataFrame(labels.reshape(len(df), -1), columns=names, index=df.index)
+
+    return pd.concat([df.drop(columns=[n for n in names if n in df.columns]), new_cols], axis=1)
+
+
+def label_summary(df, cutoffs=CUTOFFS, strike_thresholds=STRIKE_THRESHOLDS):
+    """
+    Number of no/moist/dry lightning days under each label definition.
+    """
+    strikes, flag_only = strike_counts(df)
+    labels = label_matrix(df["precip_total"], strikes, cutoffs, strike_thresholds, flag_only)
+
+    rows = []
+    for i, cutoff in enumerate(cutoffs):
+        for j, min_strikes in enumerate(strike_thresholds):
+            lab = labels[:, i, j]
+            rows.append({
+                "label": label_name(cutoff, min_strikes),
+                "cutoff_mm": cutoff,
+                "min_strikes": min_strikes,
+                "no_lightning": int(np.sum(lab == 0)),
+                "moist_lightning": int(np.sum(lab == 1)),
+                "dry_lightning": int(np.sum(lab == 2)),
+                "undefined": int(np.sum(np.isnan(lab))),
+            })
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from clean_combine import load_training_table
+
+    table = load_training_table()
+    print(label_summary(table))
@@ -0,0 +1,240 @@
+"""
+
+    Cross-validated hyperparameter search for the ecozone LDA + RF models.
+
+    station_lightning_lda.py fixes the forest at max_depth=5 and scores it
+    on one 80/20 split. Here every ecozone is searched over the LDA
+    component count and the forest depth / number of trees with:
+    - stratified K-fold grouped by fire season (all days of a year stay in
+      the same fold, so neighbouring days never score each other)
+    - one LDA fit per fold: LDA components are ordered, so the transform
+      for n_components=k is the first k columns of the full transform and
+      every candidate of a fold reuses the same projected arrays
+    - successive halving: all candidates start on a fraction of each
+      training fold and only the best 1/HALVING_FACTOR move up to the
+      next, larger, fraction
+    - ecozones searched in parallel in a process pool
+
+    Every (zone, rung, candidate) is a row of FINAL_MODELS/cv_results.csv
+    and the winner of each zone goes to FINAL_MODELS/best_params.json,
+    which train_all_zones.py uses with use_best_params=True.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+import json
+import time
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from context import utils_dir
+from train_all_zones import (FEATURES, TARGET, RANDOM_STATE, SAVE_DIR, CLEANED_DIR, BEST_PARAMS,
+                             zone_station_ids, load_training_data, atomic_csv)
+
+#%%
+PARAM_GRID = {
+    "n_components": [1, 2],
+    "max_depth": [3, 5, 8, 12],
+    "n_estimators": [100, 300],
+}
+N_SPLITS = 5
+HALVING_FACTOR = 3
+MIN_FRACTION = 0.1  # share of each training fold used on the first rung
+SCORING = "balanced_accuracy"  # ranking metric, log loss is also recorded
+
+
+def candidates(param_grid=PARAM_GRID):
+    keys = list(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*param_grid.values())]
+
+
+def season_groups(days):
+    # fire season (year) of every row
+    return pd.to_datetime(pd.Series(days)).dt.year.to_numpy()
+
+
+def lda_folds(X, y, groups, n_splits=N_SPLITS, n_components=2):
+    """
+    Fit the LDA once per fold.
+    Output: list of (X_train projected, y_train, X_test projected, y_test)
+    """
+    from sklearn.model_selection import StratifiedGroupKFold
+    from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+
+    n_splits = min(n_splits, len(np.unique(groups)))
+    cv = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=RANDOM_STATE)
+
+    folds = []
+    for train, test in cv.split(X, y, groups):
+        lda = LinearDiscriminantAnalysis(n_components=n_components)
+        folds.append((lda.fit_transform(X[train], y[train]), y[train], lda.transform(X[test]), y[test]))
+
+    return folds
+
+
+def subsample(y, fraction, seed=RANDOM_STATE):
+    # stratified row indices keeping ~fraction of every class (at least one row each)
+    if fraction >= 1:
+        return np.arange(len(y))
+    rng = np.random.default_rng(seed)
+    keep = []
+    for c in np.unique(y):
+        rows = np.flatnonzero(y == c)
+        keep.append(rng.choice(rows, max(1, int(round(fraction * len(rows)))), replace=False))
+    return np.sort(np.concatenate(keep))
+
+
+def score_candidate(params, folds, fraction, n_jobs=1, labels=None):
+    """
+    Mean and std of the scores of one candidate over the cached LDA folds.
+    labels: every class of the zone, a rare class can be missing from a training fold
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import balanced_accuracy_score, accuracy_score, log_loss
+
+    t0 = time.time()
+    if labels is None:
+        labels = np.unique(np.concatenate([f[1] for f in folds] + [f[3] for f in folds]))
+    scores = {"balanced_accuracy": [], "accuracy": [], "log_loss": []}
+    for k, (X_train, y_train, X_test, y_test) in enumerate(folds):
+        rows = subsample(y_train, fraction, seed=RANDOM_STATE + k)
+        rf = RandomForestClassifier(max_depth=params["max_depth"], n_estimators=params["n_estimators"],
+                                    random_state=RANDOM_STATE, n_jobs=n_jobs)
+        rf.fit(X_train[rows, :params["n_components"]], y_train[rows])
+
+        X_eval = X_test[:, :params["n_components"]]
+        y_pred = rf.predict(X_eval)
+        scores["balanced_accuracy"].append(balanced_accuracy_score(y_test, y_pred))
+        scores["accuracy"].append(accuracy_score(y_test, y_pred))
+        # probabilities on the full label set, 0 for classes the training fold lacks
+        proba = np.zeros((len(y_test), len(labels)))
+        proba[:, np.searchsorted(labels, rf.classes_)] = rf.predict_proba(X_eval)
+        scores["log_loss"].append(log_loss(y_test, proba, labels=labels))
+
+    result = {}
+    for metric, values in scores.items():
+        result[f"mean_{metric}"] = round(float(np.mean(values)), 4)
+        result[f"std_{metric}"] = round(float(np.std(values)), 4)
+    result["fit_seconds"] = round(time.time() - t0, 2)
+
+    return result
+
+
+def search_zone(zone, X, y, groups, param_grid=PARAM_GRID, n_jobs=1,
+                factor=HALVING_FACTOR, min_fraction=MIN_FRACTION):
+    """
+    Successive halving over the candidates of one zone.
+    Output: (dataframe of every evaluation, best params)
+    """
+    from sklearn.preprocessing import LabelEncoder
+
+    t0 = time.time()
+    y = LabelEncoder().fit_transform(y)
+    n_components = min(max(param_grid["n_components"]), len(np.unique(y)) - 1, X.shape[1])
+    folds = lda_folds(X, y, groups, n_components=n_components)
+
+    alive = [p for p in candidates(param_grid) if p["n_components"] <= n_components]
+    n_rungs = int(np.ceil(np.log(len(alive)) / np.log(factor))) if len(alive) > 1 else 0
+    fraction = max(min_fraction, factor ** -n_rungs)
+
+    rows = []
+    rung = 0
+    while True:
+        results = [{**p, **score_candidate(p, folds, fraction, n_jobs, np.unique(y))} for p in alive]
+        results.sort(key=lambda r: (-r[f"mean_{SCORING}"], r["mean_log_loss"]))
+        for rank, r in enumerate(results, start=1):
+            rows.append({"eco_zone": zone.replace(" ", "_"), "rung": rung, "fraction": round(fraction, 3),
+                         "n_candidates": len(results), "rank": rank, **r})
+
+        if len(results) == 1 or fraction >= 1:
+            break
+        alive = [{k: r[k] for k in param_grid} for r in results[:max(1, len(results) // factor)]]
+        # the winner is always scored on the full training folds
+        fraction = 1.0 if len(alive) == 1 else min(1.0, fraction * factor)
+        rung += 1
+
+    best = {k: results[0][k] for k in param_grid}
+    print(f"{zone}: best {best} {SCORING} {results[0][f'mean_{SCORING}']:.3f} "
+          f"({len(folds)} folds, {round(time.time() - t0, 1)} s)")
+
+    return pd.DataFrame(rows), best
+
+
+def select_all_zones(zones=None, max_workers=None, param_grid=PARAM_GRID, target=TARGET,
+                     save_dir=SAVE_DIR, cleaned_dir=CLEANED_DIR):
+    """
+    Search every zone (or the listed zones) in parallel, write cv_results.csv
+    and best_params.json (zones not searched keep their previous entry).
+    """
+    with open(utils_dir + '/ecozone_stations.json', 'r') as f:
+        zone_ids = zone_station_ids(json.load(f))
+    if zones is not None:
+        zone_ids = {z: zone_ids[z] for z in zones}
+
+    all_ids = sorted({i for ids in zone_ids.values() for i in ids})
+    data = load_training_data(all_ids, target, cleaned_dir, extra_columns=["Day"])
+    print(f"Loaded {len(data)} station days from {data['id'].nunique()} stations")
+
+    n_cpu = os.cpu_count() or 1
+    max_workers = max_workers or min(len(zone_ids), n_cpu)
+    rf_jobs = max(1, n_cpu // max_workers)
+
+    tables, best = [], {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for zone, ids in zone_ids.items():
+            zone_data = data[data["id"].isin(ids)][FEATURES + [target, "Day"]].dropna()
+            groups = season_groups(zone_data["Day"])
+            if zone_data[target].nunique() < 2 or len(np.unique(groups)) < 2:
+                print(f"Not enough classes or seasons to search {zone}, skipping")
+                continue
+            futures[pool.submit(search_zone, zone, zone_data[FEATURES].to_numpy(),
+                                zone_data[target].to_numpy(), groups, param_grid, rf_jobs)] = zone
+
+        for future in as_completed(futures):
+            zone = futures[future]
+            try:
+                table, params = future.result()
+            except Exception as e:
+                print(f"Search failed for {zone}: {e}")
+                continue
+            tables.append(table)
+            best[zone.replace(" ", "_")] = params
+
+    if not tables:
+        raise RuntimeError("No ecozone was searched")
+
+    Path(save_dir).mkdir(parents=True, exist_ok=True)
+    cv_results = pd.concat(tables, ignore_index=True).sort_values(["eco_zone", "rung", "rank"])
+    atomic_csv(cv_results, Path(save_dir) / "cv_results.csv")
+
+    best_path = Path(save_dir) / BEST_PARAMS
+    if best_path.exists():
+        with open(best_path, "r") as f:
+            best = {**json.load(f), **best}
+    tmp_path = Path(str(best_path) + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(best, f, indent=2)
+    os.replace(tmp_path, best_path)
+    print(f"Saved {best_path}")
+
+    return cv_results
+
+
+if __name__ == "__main__":
+    ##### USER INPUT #####
+    zones = None  # None for every ecozone or e.g. ["Prairies"]
+    max_workers = None
+    ##### END USER INPUT #####
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    cv_results = select_all_zones(zones, max_workers)
+    print(cv_results[cv_results["rank"] == 1])
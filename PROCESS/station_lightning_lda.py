@@ -30,6 +30,7 @@ from context import utils_dir
 ##### USER INPUT #####
 zone_select = "Prairies"
 save_dir = "./FINAL_MODELS/"
+label_variant = None  # None for "classifier" or (cutoff mm, min strikes) e.g. (5.0, 2) - see labels.py
 ##### END USER INPUT #####
 
 # open the stations json file
@@ -76,6 +77,14 @@ print("Lightning Days with full data...")
 print(dataset[dataset['dry_lightning'] == 1].shape)
 print(dataset[dataset['moist_lightning'] == 1].shape)
 
+# relabel with another dry lightning definition
+target_col = "classifier"
+if label_variant is not None:
+    from labels import add_labels, label_name
+    dataset = add_labels(dataset, [label_variant[0]], [label_variant[1]])
+    target_col = label_name(*label_variant)
+    print(f"Training on {target_col}")
+
 # %%
 # prediction columns
 #cols_predict = ["K_index_zscore", "mucape_log", "dTTd700_zscore"] 
@@ -83,11 +92,11 @@ print(dataset[dataset['moist_lightning'] == 1].shape)
 cols_predict = ["dTTd850", "dTTd700", "dT850-500", "cape",
                 "total_totals", "sweat", "lcl", 
                 "K_index", "lifted_index"] # "T1000",
-X = dataset[cols_predict + ["classifier"]].dropna()
-y = X["classifier"]
+X = dataset[cols_predict + [target_col]].dropna()
+y = X[target_col]
 
 # just need to ensure that things are the same size
-X = X.drop(columns=["classifier"])
+X = X.drop(columns=[target_col])
 X = X.values
 
 # Encode the target variable
@@ -98,7 +107,7 @@ print(y)
 
 #%%
 # grab training variables and classifiers for plotting
-plot_set = dataset[cols_predict + ["classifier"]]
+plot_set = dataset[cols_predict + [target_col]].rename(columns={target_col: "classifier"})
 
 # pair plot of the features colored by classifier
 ax = sns.pairplot(plot_set, hue='classifier')
@@ -0,0 +1,317 @@
+"""
+
+    Headless LDA + Random Forest training for every ecozone.
+
+    Same model as station_lightning_lda.py (LDA with 2 components feeding a
+    depth 5 random forest, 80/20 stratified split) but:
+    - the training table is loaded once (CLEANED/training_table, or the
+      cleaned csv files) and split by ecozone
+    - zones are trained in parallel in a process pool and each forest uses
+      the cores left over with n_jobs
+    - models, metrics and pred_terciles.csv are written atomically
+      (temporary file then rename) so a failed run never leaves half a file
+    - diagnostic plots are optional and drawn afterwards in their own pool
+
+    A full refresh is
+        python train_all_zones.py
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import os
+import json
+import time
+import joblib
+
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from context import utils_dir
+
+#%%
+BASE_DIR = Path(__file__).parent
+SAVE_DIR = BASE_DIR / "FINAL_MODELS"
+PLOTS_DIR = SAVE_DIR / "plots"
+CLEANED_DIR = BASE_DIR / "CLEANED"
+
+FEATURES = ["dTTd850", "dTTd700", "dT850-500", "cape",
+            "total_totals", "sweat", "lcl",
+            "K_index", "lifted_index"]
+TARGET = "classifier"
+CLASS_NAMES = ["no_lightning", "moist_lightning", "dry_lightning"]
+TERCILES = [65, 90]
+
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+RF_MAX_DEPTH = 5
+BEST_PARAMS = "best_params.json"  # written by model_selection.py
+
+
+def zone_station_ids(zones_info):
+    # {zone: [station ids]} skipping the grid_id record
+    return {zone: sorted({r["id"] for r in records if "id" in r}) for zone, records in zones_info.items()}
+
+
+def load_training_data(ids, target=TARGET, cleaned_dir=CLEANED_DIR, extra_columns=()):
+    """
+    Feature and label columns (plus extra_columns) of every station, loaded once.
+    Uses the Parquet training table when it exists, otherwise the cleaned csv files.
+    """
+    columns = FEATURES + [target] + list(extra_columns)
+    table_dir = Path(cleaned_dir) / "training_table"
+    if table_dir.exists():
+        from clean_combine import load_training_table
+        data = load_training_table(ids, columns=columns, out_dir=table_dir)
+        return data.rename(columns={"station": "id"})
+
+    frames = []
+    for id in ids:
+        path = Path(cleaned_dir) / f"{id}_combined_lightning_prediction_cleaned.csv"
+        if path.exists():
+            frames.append(pd.read_csv(path, usecols=lambda c: c in columns).assign(id=id))
+        else:
+            print(f"No cleaned data for station {id}")
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def atomic_dump(obj, path):
+    tmp_path = Path(str(path) + ".tmp")
+    joblib.dump(obj, tmp_path, compress=3)
+    os.replace(tmp_path, path)
+
+
+def atomic_csv(df, path):
+    tmp_path = Path(str(path) + ".tmp")
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def train_zone(zone, X, y, save_dir=SAVE_DIR, n_jobs=1, keep_plot_data=False, params=None):
+    """
+    Fit LDA + RF for one zone and save {zone}_lda_trained.joblib / {zone}_rf_trained.joblib.
+    params (n_components, max_depth, n_estimators) override the defaults.
+    Returns (metrics dict, tercile rows, plot data or None, test-set dry lightning probabilities).
+    """
+    from sklearn.preprocessing import LabelEncoder
+    from sklearn.model_selection import train_test_split
+    from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, confusion_matrix
+
+    t0 = time.time()
+    name = zone.replace(" ", "_")
+
+    le = LabelEncoder()
+    y = le.fit_transform(y)
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=TEST_SIZE, stratify=y, random_state=RANDOM_STATE)
+
+    params = {"n_components": 2, "max_depth": RF_MAX_DEPTH, "n_estimators": 100, **(params or {})}
+
+    lda = LinearDiscriminantAnalysis(n_components=params["n_components"])
+    X_train = lda.fit_transform(X_train, y_train)
+    X_test = lda.transform(X_test)
+
+    rf = RandomForestClassifier(max_depth=params["max_depth"], n_estimators=params["n_estimators"],
+                                random_state=RANDOM_STATE, n_jobs=n_jobs)
+    rf.fit(X_train, y_train)
+    # forecasts run one zone at a time, no need to keep the training parallelism
+    rf.set_params(n_jobs=None)
+
+    y_pred = rf.predict(X_test)
+    y_prob = rf.predict_proba(X_test)
+
+    atomic_dump(lda, Path(save_dir) / f"{name}_lda_trained.joblib")
+    atomic_dump(rf, Path(save_dir) / f"{name}_rf_trained.joblib")
+
+    conf_m = confusion_matrix(y_test, y_pred, labels=np.arange(len(le.classes_)))
+    metrics = {
+        "eco_zone": name,
+        "accuracy": round(accuracy_score(y_test, y_pred), 4),
+        "n_train": len(y_train),
+        "n_test": len(y_test),
+        "classes": " ".join(str(int(c)) for c in le.classes_),
+        "params": json.dumps(params),
+        "confusion_matrix": json.dumps(conf_m.tolist()),
+        "train_seconds": round(time.time() - t0, 2),
+    }
+    for k, c in enumerate(le.classes_):
+        metrics[f"n_class_{int(c)}"] = int(np.sum(y == k))
+
+    # same layout as station_lightning_lda.py: one row per tercile
+    tercile_rows = pd.DataFrame({
+        "eco_zone": [name] * len(TERCILES),
+        **{f"{cls}_terciles": np.round(np.percentile(y_prob[:, k], TERCILES), 3)
+           for k, cls in enumerate(CLASS_NAMES[:y_prob.shape[1]])},
+    })
+
+    plot_data = None
+    if keep_plot_data:
+        plot_data = {"X_train": X_train, "y_train": y_train, "y_test": y_test,
+                     "y_prob": y_prob, "conf_m": conf_m, "rf": rf}
+
+    print(f"{zone}: accuracy {metrics['accuracy']:.2f} ({metrics['train_seconds']} s)")
+    return metrics, tercile_rows, plot_data, y_prob[:, -1]
+
+
+def plot_zone(zone, plot_data, plots_dir=PLOTS_DIR):
+    """
+    Confusion matrix and LDA decision boundary for one zone, written as png.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.colors import ListedColormap
+
+    name = zone.replace(" ", "_")
+    Path(plots_dir).mkdir(parents=True, exist_ok=True)
+
+    plt.figure(figsize=(6, 6))
+    sns.heatmap(plot_data["conf_m"], annot=True, fmt="d", cmap="Blues", cbar=False, square=True)
+    plt.xlabel("Predicted")
+    plt.ylabel("True")
+    plt.title(f"Confusion Matrix - {zone}")
+    plt.savefig(Path(plots_dir) / f"{name}_confusion_matrix.png", dpi=150, bbox_inches="tight")
+    plt.close()
+
+    X_train = plot_data["X_train"]
+    if X_train.shape[1] < 2:
+        return name
+
+    x_min, x_max = X_train[:, 0].min() - 1, X_train[:, 0].max() + 1
+    y_min, y_max = X_train[:, 1].min() - 1, X_train[:, 1].max() + 1
+    xx, yy = np.meshgrid(np.arange(x_min, x_max, 0.02), np.arange(y_min, y_max, 0.02))
+    Z = plot_data["rf"].predict(np.c_[xx.ravel(), yy.ravel()]).reshape(xx.shape)
+
+    plt.figure(figsize=(7, 5))
+    plt.contourf(xx, yy, Z, alpha=0.3, cmap=ListedColormap(['#FFAAAA', '#AAFFAA', '#AAAAFF']))
+    plt.scatter(X_train[:, 0], X_train[:, 1], c=plot_data["y_train"], cmap='rainbow', edgecolors='b', s=10)
+    plt.xlabel('LDA Component 1')
+    plt.ylabel('LDA Component 2')
+    plt.title(f'Random Forest Decision Boundary With LDA - {zone}')
+    plt.savefig(Path(plots_dir) / f"{name}_decision_boundary.png", dpi=150, bbox_inches="tight")
+    plt.close()
+
+    return name
+
+
+def write_terciles(tercile_rows, save_dir=SAVE_DIR):
+    """
+    Replace the rows of the retrained zones in pred_terciles.csv, keep the others.
+    """
+    csv_path = Path(save_dir) / "pred_terciles.csv"
+    new = pd.concat(tercile_rows, ignore_index=True)
+    if csv_path.exists():
+        old = pd.read_csv(csv_path)
+        new = pd.concat([old[~old["eco_zone"].isin(new["eco_zone"])], new], ignore_index=True)
+
+    atomic_csv(new, csv_path)
+    print(f"Saved {csv_path}")
+
+
+def write_sketches(results, save_dir=SAVE_DIR):
+    """
+    Quantile sketches of the test-set dry lightning probabilities, weighted
+    by dry lightning days, for FORECAST/quantile_sketch.py (zones not retrained are kept).
+    """
+    from FORECAST.quantile_sketch import ZoneSketches
+
+    sketches = ZoneSketches()
+    for zone, (metrics, _, _, dry_prob) in results.items():
+        sketches.add(zone.replace(" ", "_"), dry_prob, weight=metrics.get("n_class_2", 0))
+
+    path = Path(save_dir) / "pred_sketches.npz"
+    if path.exists():
+        sketches = ZoneSketches.load(path).replace(sketches)
+    sketches.save(path)
+    print(f"Saved {path}")
+
+
+def load_best_params(save_dir=SAVE_DIR):
+    # {zone: params} from model_selection.py, empty if no search was run
+    path = Path(save_dir) / BEST_PARAMS
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def train_all_zones(zones=None, max_workers=None, make_plots=False, target=TARGET,
+                    save_dir=SAVE_DIR, cleaned_dir=CLEANED_DIR, use_best_params=False):
+    """
+    Train every zone (or the listed zones) in parallel.
+    use_best_params trains with the cross-validated settings in best_params.json.
+    Returns the metrics dataframe.
+    """
+    with open(utils_dir + '/ecozone_stations.json', 'r') as f:
+        zone_ids = zone_station_ids(json.load(f))
+    if zones is not None:
+        zone_ids = {z: zone_ids[z] for z in zones}
+
+    all_ids = sorted({i for ids in zone_ids.values() for i in ids})
+    data = load_training_data(all_ids, target, cleaned_dir)
+    print(f"Loaded {len(data)} station days from {data['id'].nunique()} stations")
+
+    Path(save_dir).mkdir(parents=True, exist_ok=True)
+    best_params = load_best_params(save_dir) if use_best_params else {}
+    n_cpu = os.cpu_count() or 1
+    max_workers = max_workers or min(len(zone_ids), n_cpu)
+    rf_jobs = max(1, n_cpu // max_workers)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for zone, ids in zone_ids.items():
+            zone_data = data[data["id"].isin(ids)][FEATURES + [target]].dropna()
+            if zone_data[target].nunique() < 2:
+                print(f"Not enough classes to train {zone}, skipping")
+                continue
+            futures[pool.submit(train_zone, zone, zone_data[FEATURES].to_numpy(),
+                                zone_data[target].to_numpy(), save_dir, rf_jobs, make_plots,
+                                best_params.get(zone.replace(" ", "_")))] = zone
+
+        for future in as_completed(futures):
+            zone = futures[future]
+            try:
+                results[zone] = future.result()
+            except Exception as e:
+                print(f"Training failed for {zone}: {e}")
+
+    if not results:
+        raise RuntimeError("No ecozone was trained")
+
+    metrics = pd.DataFrame([results[z][0] for z in sorted(results)])
+    atomic_csv(metrics, Path(save_dir) / "training_metrics.csv")
+    write_terciles([results[z][1] for z in sorted(results)], save_dir)
+    write_sketches(results, save_dir)
+
+    if make_plots:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(plot_zone, z, results[z][2], Path(save_dir) / "plots") for z in sorted(results)]
+            for future in as_completed(futures):
+                try:
+                    print(f"Plotted {future.result()}")
+                except Exception as e:
+                    print(f"Plotting failed: {e}")
+
+    return metrics
+
+
+if __name__ == "__main__":
+    ##### USER INPUT #####
+    zones = None  # None for every ecozone or e.g. ["Prairies"]
+    max_workers = None  # None for one process per zone up to the number of cores
+    make_plots = False
+    use_best_params = False  # True after running model_selection.py
+    ##### END USER INPUT #####
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    print(train_all_zones(zones, max_workers, make_plots, use_best_params=use_best_params))
@@ -123,4 +123,10 @@ out_csv = f"grid_{model_select}_ecozones.csv"
 # drop any unwanted columns (none expected) before saving
 joined.to_csv(out_csv, index=False)
 print(f"Saved lat-lon ecozone lookup to {out_csv}")
+
+# boolean mask of the points inside an ecozone (GRIB order) so the forecast
+# only gathers and computes those points (FORECAST/eccc_calcs.py)
+out_mask = f"grid_{model_select}_ecozone_mask.npy"
+np.save(out_mask, (joined['ecozone'] != 'No Ecozone').to_numpy())
+print(f"Saved ecozone mask to {out_mask}")
 # %%
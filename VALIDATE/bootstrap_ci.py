@@ -0,0 +1,223 @@
+"""
+
+    Bootstrap confidence intervals for the POD, FAR, CSI, BIAS and HSS
+    verification scores written by d0_allstn_validate / d1_allstn_validate.
+
+    Two flavours:
+    - station bootstrap: resample the per-station TP/FP/TN/FN vectors of one day
+    - block bootstrap: resample blocks of consecutive days from the daily totals
+      (keeps the day-to-day correlation of lightning outbreaks)
+
+    All replicates are drawn at once with NumPy, a replicate is a weight
+    (or block) vector so the resampled contingency totals come from a single
+    matrix product instead of a Python loop.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from rolling_stats import SEASON_START
+
+#%%
+BASE_DIR = Path(__file__).parent
+ARCHIVE_DIR = BASE_DIR / "archive"
+
+COUNT_COLUMNS = ["TP", "FP", "TN", "FN"]
+STATS_COLUMNS = ["POD", "FAR", "CSI", "BIAS", "HSS"]
+
+N_BOOT = 5000
+ALPHA = 0.05  # 95% intervals
+BLOCK_DAYS = 5  # block length for the block bootstrap over days
+
+
+def contingency_vectors(df):
+    """
+    (n, 4) array of TP, FP, TN, FN from a validation data frame.
+    """
+    return df[COUNT_COLUMNS].fillna(0).to_numpy(dtype=float)
+
+
+def scores_from_counts(counts):
+    """
+    Vectorized verification scores from contingency totals.
+
+    counts: array (..., 4) ordered TP, FP, TN, FN
+    Returns: dict of arrays with shape counts.shape[:-1], NaN where undefined
+    """
+    TP, FP, TN, FN = np.moveaxis(np.asarray(counts, dtype=float), -1, 0)
+
+    def ratio(num, den):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(den > 0, num / den, np.nan)
+
+    hss_den = (TP + FN) * (FN + TN) + (TP + FP) * (FP + TN)
+
+    return {
+        "POD": ratio(TP, TP + FN),
+        "FAR": ratio(FP, TP + FP),
+        "CSI": ratio(TP, TP + FP + FN),
+        "BIAS": ratio(TP + FP, TP + FN),
+        "HSS": ratio(2 * (TP * TN - FP * FN), hss_den),
+    }
+
+
+def bootstrap_counts(counts, n_boot=N_BOOT, seed=None):
+    """
+    Station bootstrap of contingency totals.
+
+    Each replicate draws n stations with replacement; this is expressed as
+    multinomial counts per station so the totals are one (n_boot, n) @ (n, 4) product.
+    """
+    counts = np.asarray(counts, dtype=float)
+    n = counts.shape[0]
+    if n == 0:
+        return np.zeros((n_boot, len(COUNT_COLUMNS)))
+
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(n, np.full(n, 1.0 / n), size=n_boot)
+
+    return weights @ counts
+
+
+def block_bootstrap_counts(daily_counts, block_days=BLOCK_DAYS, n_boot=N_BOOT, seed=None):
+    """
+    Moving-block bootstrap of contingency totals over days.
+
+    daily_counts: (n_days, 4) daily totals in date order
+    Block sums come from a prefix sum over days, so every replicate is a gather
+    of ceil(n_days / block_days) block totals.
+    """
+    daily_counts = np.asarray(daily_counts, dtype=float)
+    n_days = daily_counts.shape[0]
+    if n_days == 0:
+        return np.zeros((n_boot, len(COUNT_COLUMNS)))
+
+    block_days = int(min(max(block_days, 1), n_days))
+    n_blocks = int(np.ceil(n_days / block_days))
+    # the last block is trimmed so every replicate covers exactly n_days
+    lengths = np.full(n_blocks, block_days)
+    lengths[-1] = n_days - block_days * (n_blocks - 1)
+
+    cum = np.vstack([np.zeros((1, daily_counts.shape[1])), np.cumsum(daily_counts, axis=0)])
+
+    rng = np.random.default_rng(seed)
+    starts = rng.integers(0, n_days - block_days + 1, size=(n_boot, n_blocks))
+    block_sums = cum[starts + lengths] - cum[starts]
+
+    return block_sums.sum(axis=1)
+
+
+def confidence_intervals(boot_counts, point_counts, alpha=ALPHA):
+    """
+    Percentile intervals for every score.
+
+    Returns a DataFrame with one row per score: value, lower, upper, std and
+    the number of replicates where the score was defined.
+    """
+    point = scores_from_counts(np.asarray(point_counts, dtype=float))
+    boot = scores_from_counts(boot_counts)
+
+    rows = []
+    for score in STATS_COLUMNS:
+        values = boot[score]
+        valid = np.isfinite(values)
+        if valid.any():
+            lower, upper = np.nanpercentile(values, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+            std = np.nanstd(values)
+        else:
+            lower = upper = std = np.nan
+
+        rows.append({
+            "score": score,
+            "value": float(point[score]),
+            "lower": lower,
+            "upper": upper,
+            "std": std,
+            "n_valid": int(valid.sum()),
+        })
+
+    return pd.DataFrame(rows)
+
+
+def station_ci(data_df, n_boot=N_BOOT, alpha=ALPHA, seed=None):
+    """
+    Confidence intervals for one day from the per-station contingency columns.
+    """
+    counts = contingency_vectors(data_df)
+    boot = bootstrap_counts(counts, n_boot=n_boot, seed=seed)
+    ci = confidence_intervals(boot, counts.sum(axis=0), alpha=alpha)
+    ci["method"] = "station"
+    ci["n_samples"] = counts.shape[0]
+
+    return ci
+
+
+def save_station_ci(data_df, fcst, rep_date, archive_dir=ARCHIVE_DIR, **kwargs):
+    """
+    Compute and store the daily intervals next to the daily stats as
+    {fcst}_validation_ci_{rep_date}.csv
+    """
+    ci = station_ci(data_df, **kwargs)
+    ci["rep_date"] = rep_date
+
+    out_path = Path(archive_dir) / f"{fcst}_validation_ci_{rep_date}.csv"
+    ci.to_csv(out_path, index=False)
+    print(f"Saved bootstrap intervals to {out_path}")
+
+    return ci
+
+
+def load_daily_counts(fcst, archive_dir=ARCHIVE_DIR):
+    """
+    Daily contingency totals from the {fcst}_validation_data_*.csv archive, in date order.
+    """
+    files = sorted(Path(archive_dir).glob(f"{fcst}_validation_data_*.csv"))
+    if not files:
+        raise FileNotFoundError(f"No {fcst} validation data files found.")
+
+    dates = []
+    totals = []
+    for f in files:
+        df = pd.read_csv(f)
+        dates.append(f.stem.split("_")[-1])
+        totals.append(contingency_vectors(df).sum(axis=0))
+
+    return pd.DataFrame(totals, columns=COUNT_COLUMNS, index=pd.to_datetime(dates)).sort_index()
+
+
+def season_ci(fcst, season=None, block_days=BLOCK_DAYS, n_boot=N_BOOT, alpha=ALPHA, seed=None,
+              archive_dir=ARCHIVE_DIR):
+    """
+    Block-bootstrap intervals for the scores aggregated over the archived days
+    of one fire season (SEASON_START to the end of the year, default the latest
+    season), so no block runs across the winter gap.
+    Saved as {fcst}_validation_ci_season_{last_date}.csv
+    """
+    daily = load_daily_counts(fcst, archive_dir)
+    year = daily.index.max().year if season is None else int(season)
+    daily = daily[(daily.index >= pd.Timestamp(year, *SEASON_START)) & (daily.index.year == year)]
+    if daily.empty:
+        raise FileNotFoundError(f"No {fcst} validation data in the {year} season.")
+    boot = block_bootstrap_counts(daily.to_numpy(), block_days=block_days, n_boot=n_boot, seed=seed)
+    ci = confidence_intervals(boot, daily.to_numpy().sum(axis=0), alpha=alpha)
+    ci["method"] = f"block_{block_days}d"
+    ci["n_samples"] = len(daily)
+
+    last_date = daily.index.max().strftime("%Y-%m-%d")
+    ci["rep_date"] = last_date
+    out_path = Path(archive_dir) / f"{fcst}_validation_ci_season_{last_date}.csv"
+    ci.to_csv(out_path, index=False)
+    print(f"Saved season bootstrap intervals to {out_path}")
+
+    return ci
+
+
+if __name__ == "__main__":
+    for fcst in ["d0", "d1"]:
+        print(season_ci(fcst))
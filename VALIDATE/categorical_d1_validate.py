@@ -26,11 +26,11 @@ import csv
 import sshtunnel
 
 import pandas as pd
-import geopandas as gpd
 from scipy.spatial import cKDTree
 
 from datetime import datetime, timedelta
 from sshtunnel import SSHTunnelForwarder
+from file_funcs import read_forecast_points
 
 ##### User Input #####
 vd = "today"  # "other" or "today"
@@ -284,7 +284,7 @@ for index, row in d1_df.iterrows():
 # now use a kd tree to extract the forecast value for each station location
 
 # open the geopackage with the forecast data for the day before
-fcst_gdf = gpd.read_file(f"../FORECAST/RESOURCES/d1_{d1_date}_lightning_forecast.gpkg")
+fcst_gdf = read_forecast_points(f"../FORECAST/RESOURCES/d1_{d1_date}_lightning_forecast.gpkg")
 
 print(d1_df.head())
 #print(fcst_gdf.head())
@@ -22,12 +22,14 @@ import csv
 import sshtunnel
 
 import pandas as pd
-import geopandas as gpd
 from scipy.spatial import cKDTree
 
 from datetime import datetime, timedelta
 from sshtunnel import SSHTunnelForwarder
 
+from bootstrap_ci import save_station_ci
+from file_funcs import cached_station_precip, read_forecast_points
+
 ##### User Input #####
 vd = "today"  # "other" or "today"
 if vd == "other":
@@ -236,11 +238,13 @@ def append_nearest_forecast(d0_df, fcst_df, forecast_col='text', lat_col='latitu
 #%%
 # carry out a quicker station data query using the IN operator
 # for build a list of the 
-all_stations = str(all_stations)
-query = can_set_query(d0_date, date, all_stations)
+# the local observation cache answers first, the database is the fallback
+if not cached_station_precip(d0_date, date, all_stations, "./temp/all_swob_precip_data.csv"):
+    all_stations = str(all_stations)
+    query = can_set_query(d0_date, date, all_stations)
 
-print(query)
-db_query(query, csv_output=f"./temp/all_swob_precip_data.csv")
+    print(query)
+    db_query(query, csv_output=f"./temp/all_swob_precip_data.csv")
 
 #%%
 # query all lightning stikes on the day
@@ -287,7 +291,7 @@ for index, row in d0_df.iterrows():
 # now use a kd tree to extract the forecast value for each station location
 
 # open the geopackage with the forecast data for the day before
-fcst_gdf = gpd.read_file(f"../FORECAST/RESOURCES/d0_{d0_date}_lightning_forecast.gpkg")
+fcst_gdf = read_forecast_points(f"../FORECAST/RESOURCES/d0_{d0_date}_lightning_forecast.gpkg")
 
 #%%
 print(d0_df.head())
@@ -297,6 +301,8 @@ print(d0_df.head())
 # append nearest forecast values to d0_df using KDTree
 try:
     d0_df = append_nearest_forecast(d0_df, fcst_gdf)
+    # keep the continuous probability for the probabilistic verification
+    d0_df = append_nearest_forecast(d0_df, fcst_gdf, forecast_col='probability', out_col='probability')
 except Exception as e:
     print('Error appending nearest forecast:', e)
 
@@ -373,5 +379,9 @@ print(stats)
 #%% save the two dataframe to a csv
 d0_df.to_csv(f"./archive/d0_validation_data_{d0_date}.csv", index=False)
 stats.to_csv(f"./archive/d0_validation_stats_{d0_date}.csv", index=False)
+
+# bootstrap intervals from the per-station contingency vectors
+ci = save_station_ci(d0_df, "d0", d0_date, archive_dir="./archive")
+print(ci)
 print("D0 Validations stats are completed")
 # %%
@@ -15,12 +15,14 @@ import csv
 import sshtunnel
 
 import pandas as pd
-import geopandas as gpd
 from scipy.spatial import cKDTree
 
 from datetime import datetime, timedelta
 from sshtunnel import SSHTunnelForwarder
 
+from bootstrap_ci import save_station_ci
+from file_funcs import cached_station_precip, read_forecast_points
+
 ##### User Input #####
 vd = "other"  # "other" or "today"
 if vd == "other":
@@ -231,11 +233,13 @@ def append_nearest_forecast(d0_df, fcst_df, forecast_col='text', lat_col='latitu
 #%%
 # carry out a quicker station data query using the IN operator
 # for build a list of the 
-all_stations = str(all_stations)
-query = can_set_query(d1_date, d1_date_end, all_stations)
+# the local observation cache answers first, the database is the fallback
+if not cached_station_precip(d1_date, d1_date_end, all_stations, "./temp/all_swob_precip_data.csv"):
+    all_stations = str(all_stations)
+    query = can_set_query(d1_date, d1_date_end, all_stations)
 
-print(query)
-db_query(query, csv_output=f"./temp/all_swob_precip_data.csv")
+    print(query)
+    db_query(query, csv_output=f"./temp/all_swob_precip_data.csv")
 
 #%%
 # query all lightning stikes on the day
@@ -282,7 +286,7 @@ for index, row in d1_df.iterrows():
 # now use a kd tree to extract the forecast value for each station location
 
 # open the geopackage with the forecast data for the day before
-fcst_gdf = gpd.read_file(f"../FORECAST/RESOURCES/d1_{d1_date}_lightning_forecast.gpkg")
+fcst_gdf = read_forecast_points(f"../FORECAST/RESOURCES/d1_{d1_date}_lightning_forecast.gpkg")
 
 #%%
 print(d1_df.head())
@@ -292,6 +296,8 @@ print(d1_df.head())
 # append nearest forecast values to d0_df using KDTree
 try:
     d1_df = append_nearest_forecast(d1_df, fcst_gdf)
+    # keep the continuous probability for the probabilistic verification
+    d1_df = append_nearest_forecast(d1_df, fcst_gdf, forecast_col='probability', out_col='probability')
 except Exception as e:
     print('Error appending nearest forecast:', e)
 
@@ -368,5 +374,9 @@ print(stats)
 #%% save the two dataframe to a csv
 d1_df.to_csv(f"./archive/d1_validation_data_{d1_date}.csv", index=False)
 stats.to_csv(f"./archive/d1_validation_stats_{d1_date}.csv", index=False)
+
+# bootstrap intervals from the per-station contingency vectors
+ci = save_station_ci(d1_df, "d1", d1_date, archive_dir="./archive")
+print(ci)
 print("D1 Validations stats are completed")
 # %%
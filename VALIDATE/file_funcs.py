@@ -1,3 +1,4 @@
+import os
 import json
 import psycopg2
 import paramiko
@@ -5,13 +6,27 @@ import json
 import csv
 import sshtunnel
 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 from scipy.spatial import cKDTree
 
+from pathlib import Path
 from datetime import datetime, timedelta
 from sshtunnel import SSHTunnelForwarder
 
+import context  # puts the repository root on the path
+try:
+    from CLIM_DATA.CLDN.cldn_etl import local_strikes, INGEST_LAG_HOURS
+except ImportError:
+    # no local archive support (pyarrow missing) - always use the database
+    local_strikes = None
+    INGEST_LAG_HOURS = 6
+try:
+    from CLIM_DATA.OBS.obs_cache import all_station_window
+except ImportError:
+    all_station_window = None
+
 def db_query(query, csv_output='query_output.csv'):
     """
     Call the database to get wind data
@@ -80,4 +95,256 @@ def all_stn_cldn_query(dstart, dend):
     q1 = f"SELECT rep_date, lat, lon, peak_current, mult_flash FROM cldn_strikes "
     q2 = f"WHERE rep_date BETWEEN '{dstart} 12:00:00' and '{dend} 11:59:59'"
 
-    return q1 + q2
\ No newline at end of file
+    return q1 + q2
+
+# ----------
+# Cached daily lightning strikes
+# ----------
+CLASS_TEXT = {1: "low", 2: "moderate", 3: "considerable"}
+
+def strike_day(rep_date):
+    """
+    Forecast day a strike belongs to - forecast days run 12Z to 12Z
+    so shift back 12 hours before taking the date.
+    """
+    times = pd.to_datetime(rep_date)
+    return (times - pd.Timedelta(hours=12)).dt.strftime("%Y-%m-%d")
+
+def contiguous_runs(dates):
+    # group sorted YYYY-MM-DD strings into runs of consecutive days
+    runs = []
+    for d in sorted(dates):
+        day = datetime.strptime(d, "%Y-%m-%d")
+        if runs and day - runs[-1][-1] == timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+
+    return [(r[0].strftime("%Y-%m-%d"), r[-1].strftime("%Y-%m-%d")) for r in runs]
+
+def cached_cldn_strikes(dates, cache_dir, temp_csv=None):
+    """
+    Return all CLDN strikes for the forecast days in dates (12Z-12Z windows)
+    as a single dataframe with a "day" column.
+
+    Each complete day is cached as cache_dir/cldn_{day}.csv so only days
+    that have never been fetched go to the database, and all of those are
+    pulled with one query per run of consecutive days (normally one query total).
+    Days whose window has not closed INGEST_LAG_HOURS ago (12Z tomorrow plus the
+    CLDN ingest lag) are returned but not cached.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    if temp_csv is None:
+        temp_csv = cache_dir / "query_strikes.csv"
+
+    missing = [d for d in dates if not (cache_dir / f"cldn_{d}.csv").exists()]
+    fetched = {}
+    for dstart, dlast in contiguous_runs(missing):
+        dend = (datetime.strptime(dlast, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        print(f"Fetching strikes {dstart} 12Z to {dend} 12Z")
+
+        # the local CLDN archive answers the whole window if it is synced
+        strikes = None
+        if local_strikes is not None:
+            strikes = local_strikes(f"{dstart} 12:00:00", f"{dend} 11:59:59")
+
+        if strikes is None:
+            if os.path.exists(temp_csv):
+                os.remove(temp_csv)
+            db_query(all_stn_cldn_query(dstart, dend), csv_output=temp_csv)
+            if not os.path.exists(temp_csv):
+                print(f"Strike query failed for {dstart} to {dend}, days left uncached")
+                continue
+            strikes = pd.read_csv(temp_csv)
+
+        strikes["day"] = strike_day(strikes["rep_date"]) if not strikes.empty else []
+        for day, day_df in strikes.groupby("day"):
+            fetched[day] = day_df
+
+        # write the cache for every complete day in the run (empty days too),
+        # strikes of the last INGEST_LAG_HOURS may still be arriving in the database
+        now = datetime.utcnow()
+        run_days = pd.date_range(dstart, dlast).strftime("%Y-%m-%d")
+        for day in run_days:
+            day_df = fetched.get(day, strikes.iloc[0:0])
+            fetched[day] = day_df
+            window_end = datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1, hours=12)
+            if window_end + timedelta(hours=INGEST_LAG_HOURS) <= now:
+                day_df.to_csv(cache_dir / f"cldn_{day}.csv", index=False)
+
+    frames = []
+    for d in dates:
+        if d in fetched:
+            frames.append(fetched[d])
+        elif (cache_dir / f"cldn_{d}.csv").exists():
+            frames.append(pd.read_csv(cache_dir / f"cldn_{d}.csv"))
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=["rep_date", "lat", "lon", "peak_current", "mult_flash", "day"])
+
+    return pd.concat(frames, ignore_index=True)
+
+# ----------
+# Cached station observations
+# ----------
+def cached_station_precip(dstart, dend, stationids, csv_output, country="can"):
+    """
+    Write the hourly precip of stationids for the 12Z dstart to 12Z dend window
+    to csv_output (same columns as the database query) from the local
+    observation cache. Missing days are pulled into the cache first.
+    Returns False when the cache is unavailable so the caller can query directly.
+    """
+    if all_station_window is None:
+        return False
+
+    try:
+        obs = all_station_window(country, dstart, dend, stations=stationids)
+    except Exception as e:
+        print(f"Observation cache failed for {dstart} to {dend}: {e}")
+        return False
+
+    obs["wmo"] = pd.to_numeric(obs["wmo"], errors="coerce")
+    obs.to_csv(csv_output, index=False)
+    print(f"Cached station precip saved to {csv_output}")
+
+    return True
+
+def forecast_cube_day(path):
+    """
+    The day of a per-day forecast path (RESOURCES/{lead}_{date}_lightning_*)
+    read from the forecast datacube (FORECAST/DATACUBE/{model}_{lead}_{year}.nc),
+    for days whose daily files were removed by the datacube retention.
+    Output: xarray Dataset of the day (probability, fcst_class, cube attributes) or None
+    """
+    import xarray as xr
+
+    lead, date = Path(path).name.split("_")[:2]
+    day = np.datetime64(date)
+    for cube in sorted((Path(path).parent.parent / "DATACUBE").glob(f"*_{lead}_{date[:4]}.nc")):
+        with xr.open_dataset(cube) as ds:
+            if day in ds["time"].values:
+                return ds[["probability", "fcst_class"]].sel(time=day).load()
+
+    return None
+
+
+def cube_band(day, band=2):
+    # class (band=2, uint8) or probability (band=1, float32 with NaN) of a forecast_cube_day
+    if band == 2:
+        return day["fcst_class"].values.astype("uint8")
+    return day["probability"].values.astype("float32")
+
+
+def read_forecast_points(path):
+    """
+    Forecast points of a *_lightning_forecast.gpkg / .parquet path as a
+    GeoDataFrame (EPSG:4326). The GeoParquet written by the daily forecast
+    is read when it exists, the GPKG otherwise. Once both have been pruned
+    the forecast cells of the datacube are returned as points instead.
+    """
+    parquet_path = Path(path).with_suffix(".parquet")
+    gpkg_path = Path(path).with_suffix(".gpkg")
+    if parquet_path.exists():
+        try:
+            return gpd.read_parquet(parquet_path).set_crs("EPSG:4326", allow_override=True)
+        except ImportError as e:
+            print(f"Cannot read {parquet_path} ({e}), trying the GPKG")
+
+    day = None if gpkg_path.exists() else forecast_cube_day(path)
+    if day is None:
+        return gpd.read_file(gpkg_path)
+
+    fcst_class = cube_band(day, 2)
+    rows, cols = np.nonzero(fcst_class)
+    points = pd.DataFrame({
+        "latitude": day["lat"].values[rows],
+        "longitude": day["lon"].values[cols],
+        "probability": cube_band(day, 1)[rows, cols],
+        "class": fcst_class[rows, cols],
+    })
+    points["text"] = points["class"].astype(int).map(CLASS_TEXT)
+
+    return gpd.GeoDataFrame(points, geometry=gpd.points_from_xy(points["longitude"], points["latitude"]),
+                            crs="EPSG:4326")
+
+
+def forecast_band(tif_path, band=2):
+    """
+    (path, band index) of the class (band=2) or probability (band=1) of a
+    forecast raster. Cloud-optimized forecasts keep the uint8 class in
+    *_lightning_forecast.tif and the scaled int16 probability in
+    *_lightning_probability.tif, older ones have both as float32 bands.
+    """
+    import rasterio
+
+    with rasterio.open(tif_path) as src:
+        if src.count >= 2:
+            return tif_path, band
+    if band == 2:
+        return tif_path, 1
+    return str(tif_path).replace("_lightning_forecast.tif", "_lightning_probability.tif"), 1
+
+
+def read_band(src, band=1, window=None):
+    """
+    A band of an open raster with its scale / offset applied.
+    Class bands come back as uint8 (nodata 0), scaled bands as float32 with NaN for nodata.
+    """
+    data = src.read(band, window=window, masked=True)
+    scale, offset = src.scales[band - 1], src.offsets[band - 1]
+    if np.issubdtype(data.dtype, np.integer) and scale == 1 and offset == 0:
+        return data.filled(0).astype("uint8")
+
+    return (data.astype("float32") * scale + offset).filled(np.nan)
+
+
+def sample_raster_class(tif_path, lats, lons, band=2):
+    """
+    Sample a forecast GeoTIFF band at many points in one vectorized pass.
+    Only the window covering the points is read. Points outside the
+    raster (or on nodata) get 0.
+
+    tif_path: path to a *_lightning_forecast.tif
+    band: 2 for the forecast class, 1 for the probability
+    """
+    import rasterio
+    from rasterio.transform import rowcol
+    from rasterio.windows import Window
+
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    values = np.zeros(len(lats), dtype="float32" if band == 1 else "uint8")
+
+    if not os.path.exists(tif_path):
+        # daily raster pruned, sample the datacube
+        day = forecast_cube_day(tif_path)
+        if day is None:
+            raise FileNotFoundError(f"No forecast raster or datacube day for {tif_path}")
+        res = day.attrs["resolution"]
+        rows = np.floor((day.attrs["north"] - lats) / res).astype(np.intp)
+        cols = np.floor((lons - day.attrs["west"]) / res).astype(np.intp)
+        data = np.nan_to_num(cube_band(day, band), nan=0)
+        inside = (rows >= 0) & (rows < data.shape[0]) & (cols >= 0) & (cols < data.shape[1])
+        values[inside] = data[rows[inside], cols[inside]]
+        return values
+
+    path, index = forecast_band(tif_path, band)
+
+    with rasterio.open(path) as src:
+        rows, cols = rowcol(src.transform, lons, lats)
+        rows = np.asarray(rows)
+        cols = np.asarray(cols)
+        inside = (rows >= 0) & (rows < src.height) & (cols >= 0) & (cols < src.width)
+
+        if not inside.any():
+            return values
+
+        row0, col0 = rows[inside].min(), cols[inside].min()
+        window = Window(col0, row0, cols[inside].max() - col0 + 1, rows[inside].max() - row0 + 1)
+        data = np.nan_to_num(read_band(src, index, window), nan=0)
+
+    values[inside] = data[rows[inside] - row0, cols[inside] - col0]
+
+    return values
@@ -0,0 +1,213 @@
+"""
+
+    Gridded spatial verification of the d0 and d1 forecasts.
+
+    The day's CLDN strikes are binned onto the forecast raster with np.bincount
+    and compared with the forecast classes over every in-ecozone pixel rather
+    than only at the SWOB stations. Scores per neighbourhood scale:
+    - Fractions Skill Score (FSS)
+    - neighbourhood POD: observed lightning pixels with a forecast event within the window
+    - neighbourhood FAR: forecast event pixels with no lightning within the window
+
+    Neighbourhood counts come from summed-area tables (integral images),
+    so each scale costs O(pixels) no matter how large the window is.
+
+    Observed event is any lightning in the pixel (no gridded precipitation yet),
+    forecast events are class >= moderate and class >= considerable.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from context import forecast_dir
+from file_funcs import cached_cldn_strikes, forecast_band, read_band, forecast_cube_day, cube_band
+
+#%%
+BASE_DIR = Path(__file__).parent
+ARCHIVE_DIR = BASE_DIR / "archive"
+CACHE_DIR = BASE_DIR / "temp" / "cldn_cache"
+
+SCALES = [1, 3, 5, 9, 17, 33]  # neighbourhood widths in pixels (odd)
+THRESHOLDS = {"moderate": 2, "considerable": 3}  # forecast event is class >= value
+
+
+def read_forecast_raster(tif_path, with_prob=True):
+    """
+    Return (class array, probability array, transform) from a forecast GeoTIFF
+    (the probability is None when with_prob is False). Days whose GeoTIFFs
+    were pruned by the datacube retention are read from the datacube.
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+
+    if not Path(tif_path).exists():
+        day = forecast_cube_day(tif_path)
+        if day is None:
+            raise FileNotFoundError(f"No forecast raster or datacube day for {tif_path}")
+        res = day.attrs["resolution"]
+        prob = cube_band(day, 1) if with_prob else None
+        return cube_band(day, 2), prob, from_origin(day.attrs["west"], day.attrs["north"], res, res)
+
+    class_path, class_band = forecast_band(tif_path, 2)
+    with rasterio.open(class_path) as src:
+        fcst_class = np.nan_to_num(read_band(src, class_band), nan=0).astype("uint8")
+        transform = src.transform
+
+    prob = None
+    if with_prob:
+        prob_path, prob_band = forecast_band(tif_path, 1)
+        with rasterio.open(prob_path) as src:
+            prob = read_band(src, prob_band).astype("float32")
+
+    return fcst_class, prob, transform
+
+
+def bin_to_raster(lats, lons, transform, shape):
+    """
+    Count strikes per raster pixel with a single bincount.
+    Strikes outside the raster are dropped.
+    """
+    from rasterio.transform import rowcol
+
+    ny, nx = shape
+    if len(lats) == 0:
+        return np.zeros(shape, dtype=np.int32)
+
+    rows, cols = rowcol(transform, np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    rows = np.asarray(rows)
+    cols = np.asarray(cols)
+    inside = (rows >= 0) & (rows < ny) & (cols >= 0) & (cols < nx)
+
+    flat = rows[inside] * nx + cols[inside]
+    counts = np.bincount(flat, minlength=ny * nx)
+
+    return counts.reshape(shape).astype(np.int32)
+
+
+def summed_area_table(a):
+    """
+    Integral image padded with a leading row and column of zeros,
+    sat[i, j] = a[:i, :j].sum()
+    """
+    sat = np.zeros((a.shape[0] + 1, a.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(a, axis=0, dtype=np.float64), axis=1, out=sat[1:, 1:])
+
+    return sat
+
+
+def neighbourhood_sum(sat, n):
+    """
+    Sum over the n x n window centred on each pixel (clipped at the edges),
+    four gathers from the summed-area table.
+    """
+    ny, nx = sat.shape[0] - 1, sat.shape[1] - 1
+    h = n // 2
+
+    r0 = np.clip(np.arange(ny) - h, 0, ny)
+    r1 = np.clip(np.arange(ny) + h + 1, 0, ny)
+    c0 = np.clip(np.arange(nx) - h, 0, nx)
+    c1 = np.clip(np.arange(nx) + h + 1, 0, nx)
+
+    return (sat[np.ix_(r1, c1)] - sat[np.ix_(r0, c1)]
+            - sat[np.ix_(r1, c0)] + sat[np.ix_(r0, c0)])
+
+
+def neighbourhood_scores(fcst_event, obs_event, valid, scales=SCALES):
+    """
+    FSS and neighbourhood POD/FAR at each scale.
+
+    fcst_event, obs_event, valid: boolean arrays on the forecast grid,
+    valid marks pixels that carry a forecast (inside the ecozones).
+    """
+    fcst = (fcst_event & valid).astype(np.float64)
+    obs = (obs_event & valid).astype(np.float64)
+
+    sat_f = summed_area_table(fcst)
+    sat_o = summed_area_table(obs)
+    sat_v = summed_area_table(valid.astype(np.float64))
+
+    n_valid = valid.sum()
+    n_obs = obs.sum()
+    n_fcst = fcst.sum()
+    base_rate = n_obs / n_valid if n_valid > 0 else np.nan
+
+    rows = []
+    for n in scales:
+        nf = neighbourhood_sum(sat_f, n)
+        no = neighbourhood_sum(sat_o, n)
+        nv = neighbourhood_sum(sat_v, n)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pf = np.where(nv > 0, nf / nv, 0.0)[valid]
+            po = np.where(nv > 0, no / nv, 0.0)[valid]
+
+        mse = np.mean((pf - po) ** 2) if n_valid > 0 else np.nan
+        mse_ref = np.mean(pf ** 2) + np.mean(po ** 2) if n_valid > 0 else np.nan
+        fss = 1 - mse / mse_ref if mse_ref > 0 else np.nan
+
+        hits = np.sum(obs.astype(bool) & (nf > 0))
+        false_alarms = np.sum(fcst.astype(bool) & (no == 0))
+
+        rows.append({
+            "scale_px": n,
+            "FSS": fss,
+            "FSS_useful": 0.5 + base_rate / 2,
+            "POD": hits / n_obs if n_obs > 0 else np.nan,
+            "FAR": false_alarms / n_fcst if n_fcst > 0 else np.nan,
+            "n_obs": int(n_obs),
+            "n_fcst": int(n_fcst),
+            "n_valid": int(n_valid),
+        })
+
+    return pd.DataFrame(rows)
+
+
+def gridded_validate(lead, issue_date, verify_date, scales=SCALES):
+    """
+    Gridded scores for one forecast file against the strikes of verify_date.
+    Saved as archive/{lead}_gridded_stats_{verify_date}.csv
+    """
+    tif_path = f"{forecast_dir}RESOURCES/{lead}_{issue_date}_lightning_forecast.tif"
+    fcst_class, _, transform = read_forecast_raster(tif_path, with_prob=False)
+    valid = fcst_class > 0
+
+    strikes = cached_cldn_strikes([verify_date], CACHE_DIR)
+    strike_counts = bin_to_raster(strikes["lat"], strikes["lon"], transform, fcst_class.shape)
+    obs_event = strike_counts > 0
+
+    all_stats = []
+    for label, min_class in THRESHOLDS.items():
+        stats = neighbourhood_scores(fcst_class >= min_class, obs_event, valid, scales)
+        stats.insert(0, "threshold", label)
+        all_stats.append(stats)
+
+    stats = pd.concat(all_stats, ignore_index=True)
+    stats["resolution_deg"] = abs(transform.a)
+    stats["rep_date"] = verify_date
+    stats["fcst_date"] = issue_date
+
+    out_path = ARCHIVE_DIR / f"{lead}_gridded_stats_{verify_date}.csv"
+    stats.to_csv(out_path, index=False)
+    print(f"Saved gridded stats to {out_path}")
+
+    return stats
+
+
+if __name__ == "__main__":
+    # yesterday's 12Z-12Z window is verified by yesterday's d0 and the d1 issued the day before
+    date_base = datetime.today()
+    verify_date = (date_base + timedelta(days=-1)).strftime("%Y-%m-%d")
+    d1_issue = (date_base + timedelta(days=-2)).strftime("%Y-%m-%d")
+
+    for lead, issue_date in [("d0", verify_date), ("d1", d1_issue)]:
+        try:
+            print(gridded_validate(lead, issue_date, verify_date))
+        except Exception as e:
+            print(f"Gridded validation failed for {lead} {issue_date}: {e}")
@@ -8,13 +8,13 @@
 
 """
 #%%
-import json
 from pathlib import Path
-from datetime import datetime, timedelta
 
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from rolling_stats import sync_all, WINDOWS
+
 #%%
 BASE_DIR = Path(__file__).parent
 ARCHIVE_DIR = BASE_DIR / "categorical"
@@ -24,114 +24,18 @@ PLOTS_DIR.mkdir(exist_ok=True)
 STATS_COLUMNS = ["accuracy", "HSS", "HK"]
 CAT_COLUMNS = ["no lightning", "moist lightning", "dry lightning"]
 
-def load_all_validation_stats():
-    """
-    Load all validation CSV files and attach d0/d1 type from filename.
-    """
-    files = sorted(ARCHIVE_DIR.glob("categorical_d*_validation_stats_*.csv"))
-    if not files:
-        raise FileNotFoundError("No validation stats CSV files found.")
-
-    dfs = []
-    for f in files:
-        df = pd.read_csv(f, parse_dates=["rep_date"])
-        df["type"] = extract_type_from_filename(f)
-        dfs.append(df)
-
-    return pd.concat(dfs, ignore_index=True)
-
-def melt_stats(df):
-    """
-    Convert wide-format stats into long format for plotting.
-    """
-    return df.melt(
-        id_vars=["rep_date", "type"],
-        value_vars=STATS_COLUMNS,
-        var_name="metric",
-        value_name="value",
-    )
-
-def extract_type_from_filename(filepath):
-    """
-    Extract lead time (d0 / d1) from filename.
-    """
-    name = filepath.name.lower()
-    if name.startswith("categorical_d0"):
-        return "d0"
-    elif name.startswith("categorical_d1"):
-        return "d1"
-    else:
-        raise ValueError(f"Cannot determine type from filename: {filepath.name}")
-
-def list_all_validation_tables(n_days):
+def combine_dataframes(rolling, fcst, span):
     """
-    Return d0 and d1 verification table files from the last n_days.
+    Total verification table over a window, answered from the
+    rolling prefix sums rather than re-reading each daily table.
 
-    Parameters:
-        n_days (int): number of days to look back from today, inclusive.
-
-    Returns:
-        dict: {'d0': [Path, ...], 'd1': [Path, ...]}
+    rolling: {fcst: RollingCounts} from rolling_stats.sync_all
+    span: number of days or "season"
     """
-    files = sorted(ARCHIVE_DIR.glob("categorical_d*_verification_table_*.csv"))
-    if not files:
-        raise FileNotFoundError("No validation stats CSV files found.")
-
-    cutoff_date = (datetime.today().date() - timedelta(days=max(n_days - 1, 0)))
-
-    recent_files = {"d0": [], "d1": []}
-    for filepath in files:
-        try:
-            date_text = filepath.stem.split("_")[-1]
-            file_date = datetime.strptime(date_text, "%Y-%m-%d").date()
-        except ValueError:
-            continue
-
-        if file_date >= cutoff_date:
-            data_type = extract_type_from_filename(filepath)
-            recent_files[data_type].append(filepath)
-
-    if not recent_files["d0"] and not recent_files["d1"]:
-        raise FileNotFoundError(f"No validation files found in the last {n_days} days.")
+    counts = rolling[fcst]
+    start, end = counts.window_bounds(span)
 
-    return recent_files
-
-def sum_dataframes(df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
-    """
-    Returns the element-wise sum of two DataFrames of the same shape.
-    Missing values are treated as 0.
-    """
-    # Validate inputs
-    if not isinstance(df1, pd.DataFrame) or not isinstance(df2, pd.DataFrame):
-        raise TypeError("Both inputs must be pandas DataFrames.")
-    
-    if df1.shape != df2.shape:
-        raise ValueError(f"DataFrames must have the same shape. Got {df1.shape} and {df2.shape}.")
-    
-    # Align indexes and columns just in case
-    df1, df2 = df1.align(df2, join='outer', fill_value=0)
-    
-    # Perform element-wise sum, treating NaN as 0
-    return df1.add(df2, fill_value=0)
-
-def combine_dataframes(file_dict, fcst):
-    # sum the dataframes together to get a total count in each cell
-    all_files = file_dict[fcst]
-
-    fdf = pd.read_csv(all_files[0])
-    cols = fdf.columns.to_list()
-    hist_df = pd.DataFrame(columns=CAT_COLUMNS, 
-                           index=["low", "moderate", "considerable"])
-    # fill with zeros
-    hist_df = hist_df.fillna(0)
-
-    count = 0
-    for file in all_files:
-        fdf = pd.read_csv(file)
-        fdf = fdf.set_index(cols[0])
-        hist_df = sum_dataframes(hist_df, fdf)
-
-    return hist_df
+    return counts.table(start, end)
 
 def create_distributions(df):
     # save an obs dateframe that is the column sums of the ver_df for each observed category
@@ -201,17 +105,18 @@ def plot_histogram(df1, df2, title_suffix, filename):
     plt.savefig(out_path, dpi=150, bbox_inches="tight")
     plt.close(fig)
 
-def compute_mean_stats(stats):
+def compute_mean_stats(rolling, span="all"):
     """
-    Compute mean validation statistics for d0 and d1.
+    Mean validation statistics for d0 and d1 over a window (default every
+    archived day, as cat_validation_mean_stats.csv always held),
+    taken from the running sums kept in the rolling prefix tables.
     """
-    return (
-        stats
-        .groupby("type")[STATS_COLUMNS]
-        .mean()
-        .round(2)
-        .to_dict(orient="index")
-    )
+    output = {}
+    for fcst, counts in rolling.items():
+        start, end = counts.window_bounds(span)
+        output[fcst] = counts.mean_stats(start, end)
+
+    return output
 
 def save_mean_stats(mean_stats, filename="cat_validation_mean_stats.json"):
     out_path = PLOTS_DIR / filename
@@ -222,22 +127,21 @@ def save_mean_stats(mean_stats, filename="cat_validation_mean_stats.json"):
 #%%
 ## main
 def main():
-    stats = load_all_validation_stats()
-    stats_long = melt_stats(stats)
-
-    files_season = list_all_validation_tables(200)
-    print(files_season)
+    # only the days added since the last run are read from the archive
+    rolling = sync_all()
 
-    d0_dff = combine_dataframes(files_season, "d0")
-    d1_dff = combine_dataframes(files_season, "d1")
+    for label, span in WINDOWS.items():
+        d0_dff = combine_dataframes(rolling, "d0", span)
+        d1_dff = combine_dataframes(rolling, "d1", span)
 
-    d0 = create_distributions(d0_dff)
-    d1 = create_distributions(d1_dff)
+        d0 = create_distributions(d0_dff)
+        d1 = create_distributions(d1_dff)
 
-    plot_histogram(d0, d1, "Full Season", "full_season_distribution")
+        title = label.replace("_", " ").title()
+        plot_histogram(d0, d1, title, f"{label}_distribution")
 
     # Mean stats
-    save_mean_stats(compute_mean_stats(stats))
+    save_mean_stats(compute_mean_stats(rolling))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+"""
+
+    Compact interactive output for the holdover lightning map.
+
+    Instead of one folium marker per strike the considerable-class strikes are
+    binned onto a regular lat/lon grid per holdover day. The bins are written as a
+    small static JSON bundle and drawn as a heatmap with a day slider
+    (folium HeatMapWithTime) plus an all-days heatmap layer, so the page size
+    depends on the number of occupied cells and not on how active the season is.
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import folium
+from folium import plugins
+
+#%%
+BIN_RESOLUTION = 0.09  # degrees, same spacing as the forecast raster
+
+
+def bin_strikes(df, resolution=BIN_RESOLUTION, day_col="Holdover Days"):
+    """
+    Count strikes per (day, grid cell).
+
+    Returns a dataframe with the day, cell centre lat/lon, strike count and
+    the fraction of positive strikes in each occupied cell.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=[day_col, "lat", "lon", "count", "positive_frac"])
+
+    lat = df["lat"].to_numpy(dtype=float)
+    lon = df["lon"].to_numpy(dtype=float)
+    binned = pd.DataFrame({
+        day_col: df[day_col].to_numpy(),
+        "iy": np.floor(lat / resolution).astype(np.int32),
+        "ix": np.floor(lon / resolution).astype(np.int32),
+        "positive": (df["peak_current"].to_numpy(dtype=float) > 0),
+    })
+
+    bins = (
+        binned
+        .groupby([day_col, "iy", "ix"], sort=True)
+        .agg(count=("positive", "size"), positive_frac=("positive", "mean"))
+        .reset_index()
+    )
+    bins["lat"] = np.round((bins["iy"] + 0.5) * resolution, 3)
+    bins["lon"] = np.round((bins["ix"] + 0.5) * resolution, 3)
+    bins["positive_frac"] = bins["positive_frac"].round(2)
+
+    return bins[[day_col, "lat", "lon", "count", "positive_frac"]]
+
+
+def write_bundle(bins, day_dates, out_path, resolution=BIN_RESOLUTION, day_col="Holdover Days"):
+    """
+    Write the per-day bins as a compact JSON bundle:
+    {"resolution": r, "days": {day: date}, "bins": {day: [[lat, lon, count, positive_frac], ...]}}
+    """
+    bundle = {
+        "resolution": resolution,
+        "days": {str(k): v for k, v in day_dates.items()},
+        "bins": {
+            str(day): g[["lat", "lon", "count", "positive_frac"]].values.tolist()
+            for day, g in bins.groupby(day_col)
+        },
+    }
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(bundle, f, separators=(",", ":"))
+
+    print(f"Saved holdover bundle to {out_path}")
+    return out_path
+
+
+def binned_holdover_map(bins, day_dates, out_path, day_col="Holdover Days"):
+    """
+    Folium map with a heatmap per holdover day (time slider) and an all-days layer.
+
+    day_dates: {holdover day: "YYYY-MM-DD"}
+    """
+    if bins.empty:
+        print("No binned strikes to map")
+        return None
+
+    max_count = float(bins["count"].max())
+    center = [bins["lat"].mean(), bins["lon"].mean()]
+    m = folium.Map(location=center, zoom_start=5, tiles="OpenStreetMap")
+
+    # oldest day first so the slider runs forward in time
+    days = sorted(day_dates, reverse=True)
+    frames = []
+    for day in days:
+        g = bins[bins[day_col] == day]
+        frames.append(
+            np.column_stack([g["lat"], g["lon"], g["count"] / max_count]).round(3).tolist()
+        )
+
+    plugins.HeatMapWithTime(
+        frames,
+        index=[f"{day_dates[day]} ({day} days ago)" for day in days],
+        name="Strikes by day",
+        radius=12,
+        auto_play=False,
+        max_opacity=0.8,
+    ).add_to(m)
+
+    totals = bins.groupby(["lat", "lon"], as_index=False)["count"].sum()
+    plugins.HeatMap(
+        np.column_stack([totals["lat"], totals["lon"], totals["count"] / totals["count"].max()]).round(3).tolist(),
+        name="All holdover days",
+        radius=12,
+        show=False,
+    ).add_to(m)
+
+    folium.LayerControl(position="topright").add_to(m)
+    m.fit_bounds([[bins["lat"].min(), bins["lon"].min()],
+                  [bins["lat"].max(), bins["lon"].max()]])
+
+    m.save(str(Path(out_path)))
+    print(f"Saved {out_path}")
+    return m
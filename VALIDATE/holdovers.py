@@ -6,8 +6,8 @@
 
 """
 #%%
+import os
 import pandas as pd
-import geopandas as gpd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
@@ -22,16 +22,20 @@ from datetime import datetime, timedelta
 from sshtunnel import SSHTunnelForwarder
 
 from context import forecast_dir
-from file_funcs import db_query, all_stn_cldn_query
+from file_funcs import cached_cldn_strikes, sample_raster_class, read_forecast_points, CLASS_TEXT
+from holdover_map import bin_strikes, write_bundle, binned_holdover_map
 
 #%%
 BASE_DIR = Path(__file__).parent
 PLOTS_DIR = BASE_DIR / "plots"
 TEMP_DIR = BASE_DIR / "temp"
+CACHE_DIR = TEMP_DIR / "cldn_cache"  # one csv of strikes per forecast day
 PLOTS_DIR.mkdir(exist_ok=True)
 
 extension = "lightning_forecast.gpkg"
+raster_extension = "lightning_forecast.tif"
 holdover_days = 20 # number of forecasts to pull up
+interactive_mode = "binned"  # ["binned", "markers"]
 
 date_base = datetime.today()
 
@@ -60,7 +64,7 @@ def plot_color(ii):
 #%%
 def assign_bin_to_strike(ldf, fcst_df):
     # ldf is a loaded csv file with lightning strike data
-    # fcst_df is a loaded .gpkg of the days forecast
+    # fcst_df is the loaded point forecast of the day (.parquet or .gpkg)
     # add a column to ldf named "category" that pulls the nearest
     # forecast point from fcst_df and assigns it
     # Use a KDTree on (lat, lon) to find nearest forecast point for each strike.
@@ -156,51 +160,53 @@ _colors_seen = {}
 # furthest back forecast day
 # ii also is counting the number of days so we can plot with perty colors
 
+# every forecast day in the window, oldest first
+holdover_dates = [(date_base + timedelta(days=ii)).strftime("%Y-%m-%d")
+                  for ii in range(-1*holdover_days, 0)]
+
+# one query for any days not already cached, everything else is read locally
+all_strikes = cached_cldn_strikes(holdover_dates, CACHE_DIR)
+print(f"{len(all_strikes)} strikes over the last {holdover_days} days")
+
 # single dataframe with each day
 all_plot_df = []
 all_pos_df = []
 all_neg_df = []
-count = 1
 for ii in range(-1*holdover_days, 0):
-    # start with todays forecast output and work backwards
+    # start with the oldest forecast and work forwards
     date = (date_base + timedelta(days=ii)).strftime("%Y-%m-%d")
 
-    # get the end of the d0 forecast period for lightning query
-    date_end = (date_base + timedelta(days=ii+1)).strftime("%Y-%m-%d")
-
-    # open the d0 forecast at "date"
-    full_file = f"d0_{date}_{extension}"
-    path = f"{forecast_dir}RESOURCES/{full_file}"
-    print(path)
-
-    # now go to next date before we might step out of the loop
-    count = count + 1
-    try:
-        fcst = gpd.read_file(path)
-
-    except Exception as e:
-        print(f"No forecast for {path}: {e}")
-        print("Skipping this forecast day")
+    lightning_df = all_strikes[all_strikes["day"] == date].copy()
+    if lightning_df.empty:
+        print(f"No strikes for {date}")
         continue
 
-    # skip if file read but contains no features
-    if fcst is None or len(fcst) == 0:
-        print(f"Forecast file empty: {path}")
-        continue
-    #print(fcst.head())
- 
-    # query the db for lightning in the forecast period
-    query = all_stn_cldn_query(date, date_end)
-    outfile = f"{TEMP_DIR}/holdover_lightning.csv"
-    db_query(query, csv_output=outfile)
-
-    lightning_df = pd.read_csv(outfile)
-    
     # append a column called Holdover Days
     lightning_df["Holdover Days"] = abs(ii)
 
-    plot_df = assign_bin_to_strike(lightning_df,
-                                   fcst)
+    # sample the day's forecast raster at every strike at once,
+    # fall back to the point forecast when there is no raster
+    tif_path = f"{forecast_dir}RESOURCES/d0_{date}_{raster_extension}"
+    path = f"{forecast_dir}RESOURCES/d0_{date}_{extension}"
+    if os.path.exists(tif_path):
+        classes = sample_raster_class(tif_path, lightning_df["lat"], lightning_df["lon"])
+        lightning_df["category"] = pd.Series(classes.astype(int), index=lightning_df.index).map(CLASS_TEXT)
+        plot_df = lightning_df[lightning_df["category"] == "considerable"]
+    else:
+        try:
+            fcst = read_forecast_points(path)
+        except Exception as e:
+            print(f"No forecast for {path}: {e}")
+            print("Skipping this forecast day")
+            continue
+
+        # skip if file read but contains no features
+        if fcst is None or len(fcst) == 0:
+            print(f"Forecast file empty: {path}")
+            continue
+
+        plot_df = assign_bin_to_strike(lightning_df,
+                                       fcst)
 
     # ***** NOTE ***** just looking
     # plot just the positive strikes
@@ -308,49 +314,62 @@ neg_df_all = neg_df_all[neg_df_all["lat"] >= 41.7]
 #    raise ValueError("No strike data available to plot.")
 
 #%%
-center_lat = plot_df_all["lat"].mean()
-center_lon = plot_df_all["lon"].mean()
-
-m = folium.Map(location=[center_lat, center_lon], zoom_start=5, tiles="OpenStreetMap")
-
-# Main layer: all strikes from plot_df
-main_fg = folium.FeatureGroup(name="All strikes", show=True)
-
-for _, row in plot_df_all.iterrows():
-    category = row.get("Holdover Days", "unknown")
-    pday = row.get("rep_date", "unknown")
-    lat = row["lat"]
-    lon = row["lon"]
-    pcolor, ptext = plot_color(int(category))
-
-    folium.CircleMarker(
-        location=[lat, lon],
-        radius=0.7,
-        color=pcolor,
-        fill=True,
-        fill_opacity=0.7,
-        popup=(
-            f"<b>{ptext}<br>"
-            f"<b>Occurred {pday}<br>"
-            f"<b>Peak current: {row.get('peak_current', 'n/a')}<br>"
-            f"<b>Lat: {lat:.3f}<br>"
-            f"<b>Lon: {lon:.3f}"
-        ),
-    ).add_to(main_fg)
-
-main_fg.add_to(m)
-
-# Add layer control and fit bounds
-folium.LayerControl(position="topright").add_to(m)
-
-bounds = [
-    [plot_df_all["lat"].min()+10, plot_df_all["lon"].min()],
-    [plot_df_all["lat"].max()+2, plot_df_all["lon"].max()-2],
-]
-m.fit_bounds(bounds)
-
-# Save to HTML
-outpath = PLOTS_DIR / "interactive_holdover_map.html"
-m.save(outpath)
-print("Saved holdover_map.html")
+# day number -> date for the binned layers and the bundle
+day_dates = {abs(ii): (date_base + timedelta(days=ii)).strftime("%Y-%m-%d")
+             for ii in range(-1*holdover_days, 0)}
+
+if interactive_mode == "binned":
+    # strikes binned per day: page size scales with occupied cells, not strikes
+    bins = bin_strikes(plot_df_all)
+    write_bundle(bins, day_dates, PLOTS_DIR / "holdover_bins.json")
+    binned_holdover_map(bins, day_dates, PLOTS_DIR / "interactive_holdover_map.html")
+
+elif interactive_mode == "markers":
+    # one marker per strike - only practical for quiet periods
+    center_lat = plot_df_all["lat"].mean()
+    center_lon = plot_df_all["lon"].mean()
+
+    m = folium.Map(location=[center_lat, center_lon], zoom_start=5, tiles="OpenStreetMap")
+
+    # Main layer: all strikes from plot_df
+    main_fg = folium.FeatureGroup(name="All strikes", show=True)
+
+    for _, row in plot_df_all.iterrows():
+        category = row.get("Holdover Days", "unknown")
+        pday = row.get("rep_date", "unknown")
+        lat = row["lat"]
+        lon = row["lon"]
+        pcolor, ptext = plot_color(int(category))
+
+        folium.CircleMarker(
+            location=[lat, lon],
+            radius=0.7,
+            color=pcolor,
+            fill=True,
+            fill_opacity=0.7,
+            popup=(
+                f"<b>{ptext}<br>"
+                f"<b>Occurred {pday}<br>"
+                f"<b>Peak current: {row.get('peak_current', 'n/a')}<br>"
+                f"<b>Lat: {lat:.3f}<br>"
+                f"<b>Lon: {lon:.3f}"
+            ),
+        ).add_to(main_fg)
+
+    main_fg.add_to(m)
+
+    # Add layer control and fit bounds
+    folium.LayerControl(position="topright").add_to(m)
+
+    bounds = [
+        [plot_df_all["lat"].min()+10, plot_df_all["lon"].min()],
+        [plot_df_all["lat"].max()+2, plot_df_all["lon"].max()-2],
+    ]
+    m.fit_bounds(bounds)
+
+    # Save to HTML
+    outpath = PLOTS_DIR / "interactive_holdover_map.html"
+    m.save(outpath)
+    print("Saved holdover_map.html")
+
 # %%
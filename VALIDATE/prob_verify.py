@@ -0,0 +1,299 @@
+"""
+
+    Probabilistic verification of the continuous dry lightning probability.
+
+    Each day is reduced to fixed-bin histograms of forecast probability:
+    per bin the number of points, the number with observed lightning,
+    and the sums of p, p^2 and p over observed points.
+    Only those sums are stored (one row per day), so reliability diagrams,
+    ROC/AUC and the Brier score decomposition can be produced for any set
+    of days without ever holding more than one day of data.
+
+    Sources:
+    - grid: the probability band of the forecast raster against binned CLDN strikes
+    - station: the probability at each SWOB station against observed dry lightning
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+from context import forecast_dir
+from file_funcs import cached_cldn_strikes
+from gridded_validate import read_forecast_raster, bin_to_raster, CACHE_DIR
+
+#%%
+BASE_DIR = Path(__file__).parent
+ARCHIVE_DIR = BASE_DIR / "archive"
+PLOTS_DIR = BASE_DIR / "plots"
+PLOTS_DIR.mkdir(exist_ok=True)
+
+N_BINS = 20
+BIN_EDGES = np.linspace(0.0, 1.0, N_BINS + 1)
+SUMS = ["n", "n_yes", "sum_p", "sum_p2", "sum_p_yes"]
+HIST_COLUMNS = [f"{s}_{k:02d}" for s in SUMS for k in range(N_BINS)]
+
+
+def day_histograms(prob, obs):
+    """
+    Fixed-bin sums for one day.
+
+    prob: forecast probabilities in [0, 1]
+    obs: observed event (bool / 0-1), same shape
+    Returns: dict {sum name: array (N_BINS,)}
+    """
+    prob = np.asarray(prob, dtype=float).ravel()
+    obs = np.asarray(obs, dtype=float).ravel()
+    ok = np.isfinite(prob) & np.isfinite(obs)
+    prob = np.clip(prob[ok], 0.0, 1.0)
+    obs = obs[ok]
+
+    idx = np.minimum((prob * N_BINS).astype(int), N_BINS - 1)
+
+    def binsum(weights=None):
+        return np.bincount(idx, weights=weights, minlength=N_BINS).astype(float)
+
+    return {
+        "n": binsum(),
+        "n_yes": binsum(obs),
+        "sum_p": binsum(prob),
+        "sum_p2": binsum(prob ** 2),
+        "sum_p_yes": binsum(prob * obs),
+    }
+
+
+def accumulator_path(lead, source, archive_dir=ARCHIVE_DIR):
+    return Path(archive_dir) / f"{lead}_{source}_prob_hist.csv"
+
+
+def add_day(lead, source, rep_date, prob, obs, archive_dir=ARCHIVE_DIR):
+    """
+    Reduce one day to histogram sums and store it, replacing any earlier
+    row for the same date so reruns are safe.
+    """
+    hist = day_histograms(prob, obs)
+    row = pd.DataFrame([np.concatenate([hist[s] for s in SUMS])], columns=HIST_COLUMNS)
+    row.insert(0, "rep_date", rep_date)
+
+    path = accumulator_path(lead, source, archive_dir)
+    if path.exists():
+        acc = pd.read_csv(path)
+        acc = acc[acc["rep_date"] != rep_date]
+        acc = pd.concat([acc, row], ignore_index=True).sort_values("rep_date")
+    else:
+        acc = row
+    acc.to_csv(path, index=False)
+    print(f"Added {rep_date} to {path.name} ({int(hist['n'].sum())} points)")
+
+    return path
+
+
+def load_totals(lead, source, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    """
+    Summed histograms over start <= rep_date <= end (YYYY-MM-DD strings, inclusive).
+    """
+    acc = pd.read_csv(accumulator_path(lead, source, archive_dir))
+    if start is not None:
+        acc = acc[acc["rep_date"] >= start]
+    if end is not None:
+        acc = acc[acc["rep_date"] <= end]
+
+    totals = acc[HIST_COLUMNS].to_numpy(dtype=float).sum(axis=0).reshape(len(SUMS), N_BINS)
+    return dict(zip(SUMS, totals)), len(acc)
+
+
+def reliability(totals):
+    """
+    Per bin mean forecast probability, observed frequency and count.
+    """
+    n = totals["n"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_p = np.where(n > 0, totals["sum_p"] / n, np.nan)
+        obs_freq = np.where(n > 0, totals["n_yes"] / n, np.nan)
+
+    return pd.DataFrame({
+        "bin_lower": BIN_EDGES[:-1],
+        "bin_upper": BIN_EDGES[1:],
+        "mean_forecast": mean_p,
+        "observed_frequency": obs_freq,
+        "count": n,
+    })
+
+
+def brier_decomposition(totals):
+    """
+    Brier score and its Murphy decomposition from the binned sums.
+
+    brier is exact (from the sums of p^2 and p*o), reliability/resolution/uncertainty
+    use the bin means so reliability - resolution + uncertainty differs from brier
+    by the within-bin term, which is reported separately.
+    """
+    n = totals["n"]
+    N = n.sum()
+    if N == 0:
+        return {k: np.nan for k in ["brier", "reliability", "resolution", "uncertainty", "within_bin", "BSS"]}
+
+    n_yes = totals["n_yes"]
+    obar = n_yes.sum() / N
+    brier = (totals["sum_p2"].sum() - 2 * totals["sum_p_yes"].sum() + n_yes.sum()) / N
+
+    used = n > 0
+    pbar_k = totals["sum_p"][used] / n[used]
+    obar_k = n_yes[used] / n[used]
+    rel = np.sum(n[used] * (pbar_k - obar_k) ** 2) / N
+    res = np.sum(n[used] * (obar_k - obar) ** 2) / N
+    unc = obar * (1 - obar)
+
+    return {
+        "brier": brier,
+        "reliability": rel,
+        "resolution": res,
+        "uncertainty": unc,
+        "within_bin": brier - (rel - res + unc),
+        "BSS": 1 - brier / unc if unc > 0 else np.nan,
+    }
+
+
+def roc_curve(totals):
+    """
+    POD and POFD for "event if p >= threshold" at every bin edge, plus the AUC.
+    """
+    n_yes = totals["n_yes"]
+    n_no = totals["n"] - n_yes
+
+    # cumulative from the top bin down: counts with p >= edge k
+    hits = np.cumsum(n_yes[::-1])[::-1]
+    false_alarms = np.cumsum(n_no[::-1])[::-1]
+
+    total_yes = n_yes.sum()
+    total_no = n_no.sum()
+    pod = hits / total_yes if total_yes > 0 else np.full(N_BINS, np.nan)
+    pofd = false_alarms / total_no if total_no > 0 else np.full(N_BINS, np.nan)
+
+    roc = pd.DataFrame({"threshold": BIN_EDGES[:-1], "POD": pod, "POFD": pofd})
+
+    # close the curve at (0, 0) and integrate
+    x = np.concatenate([pofd, [0.0]])[::-1]
+    y = np.concatenate([pod, [0.0]])[::-1]
+    auc = np.sum(np.diff(x) * (y[1:] + y[:-1]) / 2) if np.all(np.isfinite(x)) else np.nan
+
+    return roc, auc
+
+
+def plot_reliability_roc(totals, title, filename):
+    """
+    Reliability diagram (with a sharpness histogram) and ROC curve side by side.
+    """
+    rel = reliability(totals)
+    roc, auc = roc_curve(totals)
+    scores = brier_decomposition(totals)
+
+    fig, (ax0, ax1) = plt.subplots(1, 2, figsize=(12, 6))
+
+    ax0.plot([0, 1], [0, 1], "k--", linewidth=1)
+    ax0.plot(rel["mean_forecast"], rel["observed_frequency"], marker="o", color="#d6820b")
+    ax0.set_xlim(0, 1)
+    ax0.set_ylim(0, 1)
+    ax0.set_xlabel("Forecast probability", fontsize=14)
+    ax0.set_ylabel("Observed frequency", fontsize=14)
+    ax0.set_title(f"Reliability (BS={scores['brier']:.3f}, BSS={scores['BSS']:.2f})", fontsize=14)
+
+    inset = ax0.inset_axes([0.6, 0.08, 0.35, 0.25])
+    inset.bar(rel["bin_lower"], rel["count"], width=1 / N_BINS, align="edge", color="#a4a6a8")
+    inset.set_yscale("log")
+    inset.set_xticks([])
+    inset.set_title("Sharpness", fontsize=9)
+
+    ax1.plot([0, 1], [0, 1], "k--", linewidth=1)
+    ax1.plot(roc["POFD"], roc["POD"], marker="o", color="#2756D6")
+    ax1.set_xlim(0, 1)
+    ax1.set_ylim(0, 1)
+    ax1.set_xlabel("POFD", fontsize=14)
+    ax1.set_ylabel("POD", fontsize=14)
+    ax1.set_title(f"ROC (AUC={auc:.2f})", fontsize=14)
+
+    fig.suptitle(title, fontsize=16)
+    plt.tight_layout()
+    plt.savefig(PLOTS_DIR / filename, dpi=150, bbox_inches="tight")
+    plt.close(fig)
+
+
+def summarize(lead, source, start=None, end=None, archive_dir=ARCHIVE_DIR):
+    """
+    Brier decomposition, AUC, reliability and ROC tables over a window of days.
+    Tables are written to archive/{lead}_{source}_prob_summary_*.csv
+    """
+    totals, n_days = load_totals(lead, source, start, end, archive_dir)
+    rel = reliability(totals)
+    roc, auc = roc_curve(totals)
+    scores = brier_decomposition(totals)
+    scores.update({"AUC": auc, "n_days": n_days, "n_points": int(totals["n"].sum())})
+
+    pd.DataFrame([scores]).to_csv(Path(archive_dir) / f"{lead}_{source}_prob_summary_scores.csv", index=False)
+    rel.to_csv(Path(archive_dir) / f"{lead}_{source}_prob_summary_reliability.csv", index=False)
+    roc.to_csv(Path(archive_dir) / f"{lead}_{source}_prob_summary_roc.csv", index=False)
+
+    plot_reliability_roc(totals, f"{lead.upper()} {source} probability verification",
+                         f"{lead}_{source}_reliability_roc.png")
+
+    return scores, rel, roc
+
+
+def add_grid_day(lead, issue_date, verify_date):
+    """
+    Grid source: probability band of the forecast raster vs any lightning in the pixel.
+    """
+    tif_path = f"{forecast_dir}RESOURCES/{lead}_{issue_date}_lightning_forecast.tif"
+    fcst_class, prob, transform = read_forecast_raster(tif_path)
+    valid = (fcst_class > 0) & np.isfinite(prob)
+
+    strikes = cached_cldn_strikes([verify_date], CACHE_DIR)
+    obs = bin_to_raster(strikes["lat"], strikes["lon"], transform, prob.shape) > 0
+
+    return add_day(lead, "grid", verify_date, prob[valid], obs[valid])
+
+
+def add_station_day(lead, issue_date, verify_date, archive_dir=ARCHIVE_DIR):
+    """
+    Station source: the probability column of {lead}_validation_data_{issue_date}.csv
+    against observed dry lightning over verify 12Z to verify + 1 12Z, the same
+    window as the grid source.
+    The station scripts observe the 12Z day starting at the issue date, so
+    when verify_date is later (d1) the observations are taken from
+    d0_validation_data_{verify_date}.csv, matched on the station id.
+    """
+    df = pd.read_csv(Path(archive_dir) / f"{lead}_validation_data_{issue_date}.csv")
+    if "probability" not in df.columns:
+        raise KeyError("validation data has no 'probability' column")
+
+    if issue_date != verify_date:
+        obs = pd.read_csv(Path(archive_dir) / f"d0_validation_data_{verify_date}.csv")
+        df = df.drop(columns="dry_lightning").merge(obs[["id", "dry_lightning"]], on="id", how="inner")
+
+    return add_day(lead, "station", verify_date, df["probability"], df["dry_lightning"])
+
+
+if __name__ == "__main__":
+    date_base = datetime.today()
+    verify_date = (date_base + timedelta(days=-1)).strftime("%Y-%m-%d")
+    d1_issue = (date_base + timedelta(days=-2)).strftime("%Y-%m-%d")
+
+    for lead, issue_date in [("d0", verify_date), ("d1", d1_issue)]:
+        try:
+            add_grid_day(lead, issue_date, verify_date)
+            summarize(lead, "grid")
+        except Exception as e:
+            print(f"Grid probability verification failed for {lead}: {e}")
+
+        try:
+            add_station_day(lead, issue_date, verify_date)
+            summarize(lead, "station")
+        except Exception as e:
+            print(f"Station probability verification failed for {lead}: {e}")
@@ -0,0 +1,275 @@
+"""
+
+    Rolling categorical verification counts.
+
+    Keeps prefix (running) sums of the daily 3x3 categorical verification tables
+    and of the daily accuracy, HSS and HK scores, indexed by date.
+    Adding a new day is a single row addition and any window of days
+    (last 7, last 30, full season, ...) is answered with one subtraction,
+    so the histogram and mean statistics never have to re-read the archive.
+
+    The prefix table lives next to the daily tables as
+    categorical/rolling_prefix_d0.csv and categorical/rolling_prefix_d1.csv
+
+    Liam.Buchart@nrcan-rncan.gc.ca
+    October 19, 2026
+
+"""
+#%%
+from pathlib import Path
+from datetime import datetime, date, timedelta
+
+import numpy as np
+import pandas as pd
+
+#%%
+BASE_DIR = Path(__file__).parent
+ARCHIVE_DIR = BASE_DIR / "categorical"
+
+FCST_ROWS = ["low", "moderate", "considerable"]
+CAT_COLUMNS = ["no lightning", "moist lightning", "dry lightning"]
+STATS_COLUMNS = ["accuracy", "HSS", "HK"]
+
+# windows used for the dashboard plots, values are days or "season"
+WINDOWS = {"last_7_days": 7, "last_30_days": 30, "full_season": "season"}
+SEASON_START = (5, 1)  # month, day the fire season starts
+
+CELL_COLUMNS = [f"{row}|{col}" for row in FCST_ROWS for col in CAT_COLUMNS]
+VALUE_COLUMNS = (
+    CELL_COLUMNS
+    + [f"{stat}_sum" for stat in STATS_COLUMNS]
+    + [f"{stat}_count" for stat in STATS_COLUMNS]
+)
+
+
+def file_date(filepath):
+    """
+    Return the date at the end of an archive filename (..._YYYY-MM-DD.csv) or None.
+    """
+    try:
+        return datetime.strptime(filepath.stem.split("_")[-1], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def day_vector(table, stats=None):
+    """
+    Flatten one day's verification table (and optional stats row) into
+    the value vector stored in the prefix table.
+    """
+    table = table.reindex(index=FCST_ROWS, columns=CAT_COLUMNS).fillna(0)
+    cells = table.to_numpy(dtype=float).ravel()
+
+    stat_vals = np.zeros(len(STATS_COLUMNS))
+    stat_counts = np.zeros(len(STATS_COLUMNS))
+    if stats is not None:
+        vals = pd.to_numeric(pd.Series([stats.get(s) for s in STATS_COLUMNS]), errors="coerce").to_numpy()
+        ok = np.isfinite(vals)
+        stat_vals[ok] = vals[ok]
+        stat_counts[ok] = 1
+
+    return np.concatenate([cells, stat_vals, stat_counts])
+
+
+class RollingCounts:
+    """
+    Prefix sums of categorical verification counts for one lead time (d0/d1).
+
+    prefix[i] holds the totals of every day up to and including dates[i-1],
+    prefix[0] is all zeros, so the sum over dates[i:j] is prefix[j] - prefix[i].
+    """
+
+    def __init__(self, fcst, archive_dir=ARCHIVE_DIR):
+        self.fcst = fcst
+        self.archive_dir = Path(archive_dir)
+        self.path = self.archive_dir / f"rolling_prefix_{fcst}.csv"
+
+        self.dates = []
+        self.prefix = [np.zeros(len(VALUE_COLUMNS))]
+        self._unsaved = 0
+
+        if self.path.exists():
+            df = pd.read_csv(self.path, parse_dates=["rep_date"])
+            self.dates = [d.date() for d in df["rep_date"]]
+            self.prefix += list(df[VALUE_COLUMNS].to_numpy(dtype=float))
+
+    def add_day(self, rep_date, table, stats=None):
+        """
+        Append one day in O(1). Days must arrive in increasing date order.
+        """
+        if self.dates and rep_date <= self.dates[-1]:
+            raise ValueError(f"{rep_date} is not after the last stored day {self.dates[-1]}")
+
+        self.prefix.append(self.prefix[-1] + day_vector(table, stats))
+        self.dates.append(rep_date)
+        self._unsaved += 1
+
+    def save(self):
+        """
+        Append the rows added since the last save to the prefix csv.
+        """
+        if self._unsaved == 0:
+            return self.path
+
+        new_rows = pd.DataFrame(self.prefix[-self._unsaved:], columns=VALUE_COLUMNS)
+        new_rows.insert(0, "rep_date", [d.strftime("%Y-%m-%d") for d in self.dates[-self._unsaved:]])
+
+        file_exists = self.path.exists()
+        new_rows.to_csv(
+            self.path,
+            mode="a" if file_exists else "w",
+            header=not file_exists,
+            index=False
+        )
+        self._unsaved = 0
+        return self.path
+
+    def _daily_files(self):
+        # {date: (table_path, stats_path or None)} for everything in the archive
+        tables = {}
+        for f in self.archive_dir.glob(f"categorical_{self.fcst}_verification_table_*.csv"):
+            d = file_date(f)
+            if d is not None:
+                tables[d] = f
+
+        stats = {}
+        for f in self.archive_dir.glob(f"categorical_{self.fcst}_validation_stats_*.csv"):
+            d = file_date(f)
+            if d is not None:
+                stats[d] = f
+
+        return {d: (tables[d], stats.get(d)) for d in sorted(tables)}
+
+    def _add_file(self, rep_date, table_path, stats_path):
+        table = pd.read_csv(table_path, index_col=0)
+        stats = None
+        if stats_path is not None:
+            stats = pd.read_csv(stats_path).iloc[0].to_dict()
+        self.add_day(rep_date, table, stats)
+
+    def _changed_days(self, files):
+        # stored days whose table / stats were rewritten (or removed) since the prefix csv was written
+        if not self.path.exists():
+            return []
+        synced = self.path.stat().st_mtime
+        changed = []
+        for d in self.dates:
+            if d not in files:
+                changed.append(d)
+            elif any(f is not None and f.stat().st_mtime > synced for f in files[d]):
+                changed.append(d)
+        return changed
+
+    def sync(self):
+        """
+        Read only the daily tables newer than the last stored day and save.
+        If a day older than the last stored day shows up (a back-filled run)
+        or a stored day's files changed since the last sync (a re-run), the
+        prefix table is rebuilt from scratch.
+
+        Returns the number of days added.
+        """
+        files = self._daily_files()
+        known = set(self.dates)
+        last = self.dates[-1] if self.dates else None
+
+        missing = [d for d in files if d not in known]
+        if last is not None and any(d < last for d in missing):
+            print(f"Back-filled {self.fcst} tables found - rebuilding {self.path.name}")
+            return self.rebuild()
+
+        changed = self._changed_days(files)
+        if changed:
+            print(f"{len(changed)} re-run {self.fcst} day(s) found - rebuilding {self.path.name}")
+            return self.rebuild()
+
+        for d in missing:
+            self._add_file(d, *files[d])
+        self.save()
+
+        return len(missing)
+
+    def rebuild(self):
+        """
+        Recompute the prefix table from every daily table in the archive.
+        """
+        if self.path.exists():
+            self.path.unlink()
+        self.dates = []
+        self.prefix = [np.zeros(len(VALUE_COLUMNS))]
+        self._unsaved = 0
+
+        files = self._daily_files()
+        for d, (table_path, stats_path) in files.items():
+            self._add_file(d, table_path, stats_path)
+        self.save()
+
+        return len(files)
+
+    def window(self, start, end):
+        """
+        Summed value vector for start <= rep_date <= end (both datetime.date).
+        """
+        dates = np.array(self.dates, dtype="datetime64[D]")
+        i = np.searchsorted(dates, np.datetime64(start, "D"), side="left")
+        j = np.searchsorted(dates, np.datetime64(end, "D"), side="right")
+        return self.prefix[j] - self.prefix[i]
+
+    def window_bounds(self, span, end=None):
+        """
+        Convert a window spec (number of days, "season" or "all") into (start, end).
+        """
+        if end is None:
+            end = self.dates[-1] if self.dates else date.today()
+        if span == "all":
+            start = self.dates[0] if self.dates else end
+        elif span == "season":
+            start = date(end.year, *SEASON_START)
+        else:
+            start = end - timedelta(days=max(int(span) - 1, 0))
+        return start, end
+
+    def table(self, start, end):
+        """
+        3x3 verification table summed over the window.
+        """
+        cells = self.window(start, end)[:len(CELL_COLUMNS)]
+        return pd.DataFrame(cells.reshape(len(FCST_ROWS), len(CAT_COLUMNS)),
+                            index=FCST_ROWS, columns=CAT_COLUMNS)
+
+    def mean_stats(self, start, end):
+        """
+        Mean accuracy, HSS and HK over the window (days with missing scores are skipped).
+        """
+        values = self.window(start, end)
+        n = len(CELL_COLUMNS)
+        k = len(STATS_COLUMNS)
+        sums = values[n:n + k]
+        counts = values[n + k:]
+
+        return {
+            stat: (round(float(s / c), 2) if c > 0 else np.nan)
+            for stat, s, c in zip(STATS_COLUMNS, sums, counts)
+        }
+
+
+def sync_all(fcsts=("d0", "d1"), archive_dir=ARCHIVE_DIR):
+    """
+    Bring the prefix tables up to date and return {fcst: RollingCounts}.
+    """
+    counts = {}
+    for fcst in fcsts:
+        counts[fcst] = RollingCounts(fcst, archive_dir)
+        added = counts[fcst].sync()
+        print(f"{fcst}: added {added} day(s) to the rolling counts")
+
+    return counts
+
+
+if __name__ == "__main__":
+    for fcst, rc in sync_all().items():
+        for label, span in WINDOWS.items():
+            start, end = rc.window_bounds(span)
+            print(fcst, label, start, end)
+            print(rc.table(start, end))
+            print(rc.mean_stats(start, end))